@@ -1,8 +1,9 @@
 from datetime import datetime
 from services.time_violation_checker import TimeViolationChecker
+from src.services.bot_client import get_bot
 import logging
 
-time_checker = TimeViolationChecker()
+time_checker = TimeViolationChecker(get_bot())
 
 async def handle_action(user_id, action_type):
     current_time = datetime.now()
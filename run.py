@@ -15,25 +15,31 @@ from telegram.ext import (
     CommandHandler,
     MessageHandler,
     filters,
-    CallbackQueryHandler,
+    TypeHandler,
     ContextTypes
 )
 
-from src.services.violation_manager import ViolationManager
+from src.services.violation_manager import get_violation_manager
 from src.main import (
     start,
     handle_message,
-    button_callback,
-    periodic_check,
+    guard_update,
+    break_overdue,
     save_all_user_states,
+    flush_user_states,
+    on_startup,
+    handle_outbox,
     auto_end_shift,
     send_daily_report,
     load_user_states,
-    user_states,
-    handle_admin_action
+    user_states
 )
-from src.utils.config import VN_TIMEZONE, BOT_TOKEN
-from src.admin_handlers import AdminHandlers
+from src.utils.config import VN_TIMEZONE, BOT_TOKEN, CHECKPOINT_INTERVAL, UPDATE_MODE
+from src.services.break_deadlines import get_break_deadlines
+from src.services.bot_client import get_application
+from src.services.webhook_server import run_webhook
+from src.services.violation_digest import get_violation_digest
+from src.utils.button_router import get_button_router
 from src.commands.help_handler import help_command
 
 # Cấu hình base directory
@@ -63,55 +69,46 @@ file_handler.setFormatter(
 logger.addHandler(file_handler)
 
 # Khởi tạo violation manager
-violation_manager = ViolationManager()
+violation_manager = get_violation_manager()
 
 def run_bot():
     # Khởi tạo user_states
     load_user_states()
     
-    # Khởi tạo application
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Application dùng chung (src.main đã đăng ký handler admin trên cùng đối tượng)
+    application = get_application()
+    application.post_init = on_startup
+    application.post_shutdown = flush_user_states
     
-    # Khởi tạo AdminHandlers và đăng ký handlers
-    admin_handlers = AdminHandlers(application, user_states)
+    # Bỏ qua update trùng trước mọi handler khác
+    application.add_handler(TypeHandler(Update, guard_update), group=-1)
     
-    # Thêm handlers cơ bản
+    # Thêm handlers cơ bản (lệnh và nút bấm admin do AdminHandlers đăng ký
+    # trên cùng Application khi import src.main)
     application.add_handler(CommandHandler("start", start))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-    application.add_handler(CallbackQueryHandler(handle_admin_action))
-    
-    # Thêm handlers cho admin commands
-    application.add_handler(CommandHandler("admin", admin_handlers.admin_menu))
-    application.add_handler(CommandHandler("shift", admin_handlers.handle_shift_menu))
-    application.add_handler(CommandHandler("break", admin_handlers.handle_break_menu))
-    application.add_handler(CommandHandler("stats", admin_handlers.handle_stats_menu))
-    application.add_handler(CommandHandler("report", admin_handlers.handle_report_menu))
-    application.add_handler(CommandHandler("reset", admin_handlers.handle_reset_data))
-    
-    # Thêm handlers cho lệnh tắt
-    application.add_handler(CommandHandler("as", admin_handlers.handle_all_start_shift_command))
-    application.add_handler(CommandHandler("ae", admin_handlers.handle_all_end_shift_command))
-    application.add_handler(CommandHandler("fb", admin_handlers.handle_force_break_command))
-    application.add_handler(CommandHandler("eb", admin_handlers.handle_end_break_command))
-    application.add_handler(CommandHandler("ts", admin_handlers.handle_today_stats_command))
-    application.add_handler(CommandHandler("st", admin_handlers.handle_all_stats_command))
-    application.add_handler(CommandHandler("dr", admin_handlers.handle_daily_report_command))
-    application.add_handler(CommandHandler("wr", admin_handlers.handle_weekly_report_command))
+    application.add_handler(MessageHandler(get_button_router().filter, handle_message))
+    application.add_handler(CommandHandler("outbox", handle_outbox))
     
     # Thêm handler cho lệnh help
     application.add_handler(CommandHandler("help", help_command))
     
     # Khởi tạo job queue
     job_queue = application.job_queue
-    job_queue.run_repeating(periodic_check, interval=300)
-    job_queue.run_repeating(save_all_user_states, interval=300)
+    deadlines = get_break_deadlines()
+    deadlines.attach(job_queue, break_overdue)
+    deadlines.restore(user_states)
+    get_violation_digest().attach(job_queue)
+    job_queue.run_repeating(save_all_user_states, interval=CHECKPOINT_INTERVAL)
     job_queue.run_daily(auto_end_shift, time=time(hour=1, minute=0))
     job_queue.run_daily(send_daily_report, time=time(hour=1, minute=5))
     
     logger.info("Bot đã sẵn sàng và đang chạy...")
     
-    # Khởi động bot
-    application.run_polling(drop_pending_updates=True)
+    # Khởi động bot: các update dồn lại đã được xử lý bù trong post_init
+    if UPDATE_MODE == 'webhook':
+        run_webhook(application)
+    else:
+        application.run_polling(drop_pending_updates=False)
 
 if __name__ == "__main__":
     try:
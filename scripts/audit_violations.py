@@ -0,0 +1,198 @@
+"""Tính lại vi phạm trên dữ liệu chấm công cũ theo cấu hình hiện tại.
+
+Đọc attendance_history.json và các bảng chấm công trong attendance.db, chia
+theo ngày và chạy bộ luật vi phạm trên từng ngày trong một process pool.
+Kết quả ghi ra file CSV, kèm bảng tổng hợp in ra màn hình.
+
+Chạy: python -m scripts.audit_violations [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+          [--source all|json|db] [--out violations_audit.csv] [--workers N]
+
+Lưu ý: mỗi ngày được xét độc lập, lần nghỉ kéo qua nửa đêm không được tính
+thời lượng.
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from src.services.history_store import (
+    ATTENDANCE_DB,
+    ACTION_START_SHIFT,
+    ACTION_END_SHIFT,
+    ACTION_BREAK_START,
+    ACTION_BREAK_END
+)
+from src.services.violation_rules import (
+    get_violation_rules,
+    RuleEvent,
+    EVENT_SHIFT_START,
+    EVENT_SHIFT_END,
+    EVENT_BREAK_START,
+    EVENT_BREAK_END
+)
+from src.utils.config import VN_TIMEZONE
+
+JSON_FILES = [
+    BASE_DIR / 'attendance_history.json',
+    BASE_DIR / 'data' / 'attendance_history.json',
+]
+
+# Cột số lần nghỉ của bảng attendance cũ (mỗi ca một dòng), theo khóa loại nghỉ
+LEGACY_BREAK_COLUMNS = {
+    'an_com': 'lunch_breaks',
+    'hut_thuoc': 'smoke_breaks',
+    've_sinh': 'restroom_breaks',
+}
+
+CSV_FIELDS = ['date', 'user_id', 'user_name', 'violation_type', 'time', 'details']
+
+
+def _in_range(day: str, start: date, end: date) -> bool:
+    return (start is None or day >= start.isoformat()) and (end is None or day <= end.isoformat())
+
+
+def read_json_days(start: date, end: date) -> dict:
+    """Các hành động từ attendance_history.json, theo ngày"""
+    days = defaultdict(set)
+    for path in JSON_FILES:
+        if not path.exists():
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+        for day, entries in history.items():
+            if not _in_range(day, start, end):
+                continue
+            for entry in entries:
+                days[day].add((int(entry['user_id']), entry.get('user_name') or '', entry['action'],
+                               entry['timestamp'], entry.get('break_type')))
+    return days
+
+
+def read_db_days(days: dict, start: date, end: date):
+    """Thêm các hành động từ bảng attendance_history và ca từ bảng attendance cũ"""
+    if not ATTENDANCE_DB.exists():
+        return
+    conn = sqlite3.connect(f"file:{ATTENDANCE_DB}?mode=ro", uri=True)
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        if 'attendance_history' in tables:
+            for row in conn.execute(
+                "SELECT date, user_id, user_name, action, timestamp, break_type FROM attendance_history"
+            ):
+                if _in_range(row[0], start, end):
+                    days[row[0]].add((row[1], row[2] or '', row[3], row[4], row[5]))
+
+        if 'attendance' in tables:
+            # Bảng cũ chỉ có tổng theo ca: kiểm tra được giờ làm và số lần nghỉ
+            columns = ', '.join(LEGACY_BREAK_COLUMNS.values())
+            for row in conn.execute(f"SELECT user_id, user_name, start_time, end_time, {columns} FROM attendance"):
+                user_id, user_name, start_time, end_time = row[:4]
+                if not start_time:
+                    continue
+                start_dt = datetime.fromisoformat(start_time)
+                day = start_dt.strftime('%Y-%m-%d')
+                if not _in_range(day, start, end):
+                    continue
+                days[day].add((user_id, user_name or '', ACTION_START_SHIFT, start_dt.strftime('%H:%M:%S'), None))
+                for key, count in zip(LEGACY_BREAK_COLUMNS, row[4:]):
+                    # Không có giờ từng lần nghỉ: đặt mỗi lần cách nhau 1 giây để không bị gộp
+                    for i in range(count or 0):
+                        days[day].add((user_id, user_name or '', ACTION_BREAK_START,
+                                       (start_dt + timedelta(seconds=i + 1)).strftime('%H:%M:%S'), key))
+                if end_time:
+                    end_dt = datetime.fromisoformat(end_time)
+                    days[day].add((user_id, user_name or '', ACTION_END_SHIFT, end_dt.strftime('%H:%M:%S'), None))
+    finally:
+        conn.close()
+
+
+def audit_day(partition):
+    """Chạy lại một ngày: dựng sự kiện theo từng user rồi kiểm tra theo lô"""
+    day, entries = partition
+    rules = get_violation_rules()
+    day_date = date.fromisoformat(day)
+    users = defaultdict(list)
+    for entry in sorted(entries, key=lambda e: (e[3], e[0])):
+        users[entry[0]].append(entry)
+
+    rows = []
+    for user_id, user_entries in users.items():
+        events = []
+        counts = Counter()
+        open_breaks = {}
+        for _, user_name, action, timestamp, break_type in user_entries:
+            when = VN_TIMEZONE.localize(datetime.combine(day_date, datetime.strptime(timestamp, '%H:%M:%S').time()))
+            if action == ACTION_START_SHIFT:
+                counts.clear()
+                open_breaks.clear()
+                events.append(RuleEvent(EVENT_SHIFT_START, user_name, when))
+            elif action == ACTION_END_SHIFT:
+                events.append(RuleEvent(EVENT_SHIFT_END, user_name, when))
+            elif action == ACTION_BREAK_START:
+                break_id = rules.break_id(break_type)
+                counts[break_id] += 1
+                open_breaks[break_id] = when
+                events.append(RuleEvent(EVENT_BREAK_START, user_name, when, break_id, counts[break_id]))
+            elif action == ACTION_BREAK_END:
+                break_id = rules.break_id(break_type) if break_type else next(iter(open_breaks), None)
+                started = open_breaks.pop(break_id, None)
+                if started is not None:
+                    events.append(RuleEvent(EVENT_BREAK_END, user_name, when, break_id, duration=when - started))
+
+        for violation in rules.check_many(events):
+            rows.append((day, user_id, violation.user_name, violation.violation_type,
+                         violation.timestamp.strftime('%H:%M:%S'), violation.details))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tính lại vi phạm trên dữ liệu chấm công cũ")
+    parser.add_argument('--from', dest='start', type=date.fromisoformat, help="Ngày bắt đầu (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='end', type=date.fromisoformat, help="Ngày kết thúc (YYYY-MM-DD)")
+    parser.add_argument('--source', choices=['all', 'json', 'db'], default='all')
+    parser.add_argument('--out', type=Path, default=BASE_DIR / 'violations_audit.csv')
+    parser.add_argument('--workers', type=int, default=None, help="Số process (mặc định: số CPU)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    days = read_json_days(args.start, args.end) if args.source in ('all', 'json') else defaultdict(set)
+    if args.source in ('all', 'db'):
+        read_db_days(days, args.start, args.end)
+    partitions = [(day, list(entries)) for day, entries in sorted(days.items())]
+    total_entries = sum(len(entries) for _, entries in partitions)
+
+    by_type = Counter()
+    by_user = Counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor, \
+            open(args.out, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        chunksize = max(1, len(partitions) // ((args.workers or 4) * 4))
+        for rows in executor.map(audit_day, partitions, chunksize=chunksize):
+            writer.writerows(rows)
+            for row in rows:
+                by_type[row[3]] += 1
+                by_user[(row[1], row[2])] += 1
+
+    elapsed = time.perf_counter() - started
+    print(f"Đã xét {total_entries} hành động trong {len(partitions)} ngày ({elapsed:.2f}s)")
+    print(f"Tổng số vi phạm: {sum(by_type.values())} -> {args.out}")
+    for violation_type, count in by_type.most_common():
+        print(f"  {violation_type}: {count}")
+    if by_user:
+        print("Nhiều vi phạm nhất:")
+        for (user_id, user_name), count in by_user.most_common(10):
+            print(f"  {user_name} ({user_id}): {count}")
+
+
+if __name__ == "__main__":
+    main()
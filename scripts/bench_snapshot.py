@@ -0,0 +1,85 @@
+"""So sánh thời gian khởi động lạnh: snapshot nhị phân (StateStore) và file pickle cũ.
+
+Chạy: python -m scripts.bench_snapshot [số_user]
+"""
+import pickle
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from src.models import UserState
+from src.services.state_store import StateStore
+from src.utils.config import BREAK_DURATIONS, VN_TIMEZONE
+
+
+def make_states(count: int):
+    now = datetime.now(VN_TIMEZONE).replace(microsecond=0)
+    states = {}
+    for i in range(count):
+        state = UserState(
+            user_name=f"Nhân viên {i}",
+            is_working=i % 3 != 0,
+            start_time=now - timedelta(hours=i % 9),
+            breaks={k: timedelta(minutes=(i + n) % 40) for n, k in enumerate(BREAK_DURATIONS)},
+            break_counts={k: (i + n) % 4 for n, k in enumerate(BREAK_DURATIONS)}
+        )
+        if i % 7 == 0:
+            state.current_break = next(iter(BREAK_DURATIONS))
+            state.break_start_time = now - timedelta(minutes=3)
+        states[str(1000000000 + i)] = state
+    return states
+
+
+def timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    states = make_states(count)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        pickle_file = tmp / 'user_states.pkl'
+        with open(pickle_file, 'wb') as f:
+            pickle.dump(states, f)
+
+        store = StateStore(tmp / 'user_states.db')
+        store.save_many(states.items())
+        store.close()
+
+        def load_pickle():
+            with open(pickle_file, 'rb') as f:
+                return pickle.load(f)
+
+        def load_store():
+            # Mở store mới mỗi lần để đo cả việc đọc bảng chuỗi như lúc khởi động thật
+            cold_store = StateStore(tmp / 'user_states.db')
+            try:
+                return cold_store.load_all()
+            finally:
+                cold_store.close()
+
+        pickle_time, loaded_pickle = timed(load_pickle)
+        store_time, loaded_store = timed(load_store)
+        assert len(loaded_pickle) == len(loaded_store) == count
+
+        db_size = sum(p.stat().st_size for p in tmp.glob('user_states.db*'))
+        print(f"Số user: {count}")
+        print(f"pickle     : {pickle_time * 1000:8.1f} ms, {pickle_file.stat().st_size / 1024:8.0f} KB")
+        print(f"snapshot v3: {store_time * 1000:8.1f} ms, {db_size / 1024:8.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Đo thông lượng giờ cao điểm ăn trưa: xử lý update tuần tự và song song theo user.
+
+Giả lập `số_user` nhân viên mỗi người bấm lần lượt Ăn cơm -> Trở lại -> Hút
+thuốc -> Trở lại (mỗi handler chờ `độ_trễ` ms như một lần gọi Bot API), xen
+giữa là một báo cáo chậm của admin và một lệnh /ae cho toàn bộ nhân viên.
+Không gọi Telegram và không ghi vào dữ liệu thật.
+
+Chạy: python -m scripts.bench_updates [số_user] [độ_trễ_ms]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import SimpleUpdateProcessor
+
+from src.services.update_processor import UserOrderedUpdateProcessor
+from src.utils.config import ADMIN_ID, CONCURRENT_UPDATES, VN_TIMEZONE
+
+BUTTONS = ["🍚 Ăn cơm (吃饭)", "↩️ Trở lại chỗ ngồi (返回)", "🚬 Hút thuốc (抽烟)", "↩️ Trở lại chỗ ngồi (返回)"]
+REPORT_DELAY = 2.0
+
+
+def make_update(update_id: int, user_id: int, text: str) -> Update:
+    user = User(user_id, f"Nhân viên {user_id}", False)
+    message = Message(update_id, datetime.now(VN_TIMEZONE), Chat(user_id, Chat.PRIVATE), from_user=user, text=text)
+    return Update(update_id, message=message)
+
+
+def make_rush(users: int):
+    """Các update theo thứ tự đến: từng lượt bấm của mọi user, báo cáo admin xen giữa"""
+    admin = ADMIN_ID[0]
+    updates = []
+    for step, text in enumerate(BUTTONS):
+        if step == 1:
+            updates.append(make_update(len(updates), admin, "/wr"))
+        for user_id in range(1, users + 1):
+            updates.append(make_update(len(updates), 1000 + user_id, text))
+        if step == 2:
+            updates.append(make_update(len(updates), admin, "/ae"))
+    return updates
+
+
+async def run(processor, updates, latency: float, sequential: bool):
+    handled = defaultdict(list)
+    latencies = []
+    started = time.perf_counter()
+
+    async def handle(update: Update):
+        text = update.message.text
+        await asyncio.sleep(REPORT_DELAY if text == "/wr" else latency)
+        handled[update.effective_user.id].append(update.update_id)
+        if not text.startswith('/'):
+            # Cả đợt đến cùng lúc: tính từ lúc bắt đầu tới khi nhân viên nhận phản hồi
+            latencies.append(time.perf_counter() - started)
+
+    await processor.initialize()
+    tasks = []
+    for update in updates:
+        job = processor.process_update(update, handle(update))
+        if sequential:
+            await job
+        else:
+            tasks.append(asyncio.create_task(job))
+    await asyncio.gather(*tasks)
+    await processor.shutdown()
+
+    elapsed = time.perf_counter() - started
+    expected = defaultdict(list)
+    for update in updates:
+        expected[update.effective_user.id].append(update.update_id)
+    ordered = all(handled[user_id] == ids for user_id, ids in expected.items())
+    latencies.sort()
+    return {
+        'elapsed': elapsed,
+        'throughput': len(updates) / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'ordered': ordered,
+    }
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    updates = make_rush(users)
+    print(f"{len(updates)} update, {users} nhân viên, độ trễ handler {latency * 1000:.0f}ms, "
+          f"báo cáo {REPORT_DELAY:.0f}s")
+
+    results = [
+        ("Tuần tự (mặc định)", asyncio.run(run(SimpleUpdateProcessor(1), updates, latency, True))),
+        (f"Song song theo user ({CONCURRENT_UPDATES})",
+         asyncio.run(run(UserOrderedUpdateProcessor(), updates, latency, False))),
+    ]
+    for name, result in results:
+        print(f"{name:<30} {result['elapsed']:7.2f}s  {result['throughput']:8.1f} update/s  "
+              f"p50 {result['p50'] * 1000:8.0f}ms  p95 {result['p95'] * 1000:8.0f}ms  "
+              f"đúng thứ tự: {'có' if result['ordered'] else 'KHÔNG'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""So sánh độ trễ đầu-cuối: long polling và webhook, với một Bot API giả chạy local.
+
+Bot API giả nhận update theo nhịp `tốc_độ` update/giây từ `số_user` nhân
+viên, giao cho bot qua getUpdates (polling) hoặc POST tới webhook server
+nhúng (webhook), rồi đo thời gian tới khi nhận được sendMessage trả lời của
+bot. Mỗi lượt gọi mạng chịu thêm `trễ_mạng` ms mỗi chiều. Không gọi Telegram
+và không ghi vào dữ liệu thật.
+
+Chạy: python -m scripts.bench_webhook [số_update] [tốc_độ] [trễ_mạng_ms] [số_user]
+"""
+import asyncio
+import json
+import statistics
+import sys
+import time
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+import httpx
+from telegram import Update
+from telegram.ext import Application, ContextTypes, MessageHandler, filters
+from telegram.request import HTTPXRequest
+
+from src.services.update_processor import UserOrderedUpdateProcessor
+from src.services.webhook_server import HttpError, WebhookServer, read_request, write_response
+
+TOKEN = "123456:FAKE"
+SECRET = "bench-secret"
+HANDLER_DELAY = 0.005
+
+
+class FakeBotApi:
+    """Bot API tối giản: getMe, getUpdates, setWebhook, deleteWebhook, sendMessage"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.pending = []
+        self.arrived = asyncio.Event()
+        self.closed = False
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.received_at = {}
+        self.replied_at = {}
+        self.done = asyncio.Event()
+        self.expected = 0
+        self.retries = 0
+        self._server = None
+        self._client = None
+        self._deliveries = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self._client = httpx.AsyncClient(limits=httpx.Limits(max_connections=40))
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.closed = True
+        self.arrived.set()
+        for task in list(self._deliveries):
+            task.cancel()
+        await self._client.aclose()
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HttpError as e:
+                    write_response(writer, e.status, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                await asyncio.sleep(self.delay)
+                params = dict(parse_qsl(request.body.decode()))
+                result = await self._call(request.path.rsplit('/', 1)[-1], params)
+                await asyncio.sleep(self.delay)
+                body = json.dumps({'ok': True, 'result': result}).encode()
+                write_response(writer, HTTPStatus.OK, body, keep_alive=request.keep_alive)
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _call(self, method: str, params: dict):
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+        if method == 'deleteWebhook':
+            self.webhook_url = None
+            return True
+        if method == 'setWebhook':
+            self.webhook_url = params['url']
+            self.webhook_secret = params.get('secret_token')
+            return True
+        if method == 'getUpdates':
+            offset = int(params.get('offset', 0))
+            self.pending = [u for u in self.pending if u['update_id'] >= offset]
+            if not self.pending and not self.closed:
+                self.arrived.clear()
+                try:
+                    await asyncio.wait_for(self.arrived.wait(), float(params.get('timeout', 0)))
+                except asyncio.TimeoutError:
+                    pass
+            return self.pending[:int(params.get('limit', 100))]
+        if method == 'sendMessage':
+            update_id = int(params['text'])
+            self.replied_at[update_id] = time.perf_counter()
+            if len(self.replied_at) >= self.expected:
+                self.done.set()
+            return {'message_id': update_id, 'date': int(time.time()),
+                    'chat': {'id': int(params['chat_id']), 'type': 'private'}, 'text': params['text']}
+        raise ValueError(f"Bot API giả không hỗ trợ {method}")
+
+    def push(self, update: dict):
+        """Một nhân viên vừa bấm nút: giao update theo cách bot đã đăng ký"""
+        self.received_at[update['update_id']] = time.perf_counter()
+        if self.webhook_url:
+            task = asyncio.create_task(self._deliver(update))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+        else:
+            self.pending.append(update)
+            self.arrived.set()
+
+    async def _deliver(self, update: dict):
+        await asyncio.sleep(self.delay)
+        while True:
+            response = await self._client.post(
+                self.webhook_url, json=update,
+                headers={'X-Telegram-Bot-Api-Secret-Token': self.webhook_secret or ''}
+            )
+            if response.status_code == HTTPStatus.OK:
+                return
+            self.retries += 1
+            await asyncio.sleep(float(response.headers.get('Retry-After', 1)))
+
+
+def make_update(update_id: int, user_id: int) -> dict:
+    user = {'id': user_id, 'is_bot': False, 'first_name': f"Nhân viên {user_id}"}
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': int(time.time()), 'chat': {'id': user_id, 'type': 'private'},
+        'from': user, 'text': str(update_id),
+    }}
+
+
+async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await asyncio.sleep(HANDLER_DELAY)
+    await update.message.reply_text(update.message.text)
+
+
+def build_application(port: int) -> Application:
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(f"http://127.0.0.1:{port}/bot")
+        .request(HTTPXRequest(connection_pool_size=32))
+        .get_updates_request(HTTPXRequest(connection_pool_size=1, read_timeout=15))
+        .concurrent_updates(UserOrderedUpdateProcessor())
+        .job_queue(None)
+        .build()
+    )
+    application.add_handler(MessageHandler(filters.TEXT, echo))
+    return application
+
+
+async def run(mode: str, count: int, rate: float, delay: float, users: int):
+    api = FakeBotApi(delay)
+    port = await api.start()
+    api.expected = count
+    application = build_application(port)
+    await application.initialize()
+
+    server = None
+    if mode == 'webhook':
+        server = WebhookServer(application, listen='127.0.0.1', port=0, path='/hook',
+                               secret_token=SECRET, queue_size=256)
+        await server.start()
+        server.url = f"http://127.0.0.1:{server.port}{server.path}"
+        await application.start()
+        await server.set_webhook()
+        rejected = await api._client.post(server.url, json=make_update(0, 1),
+                                          headers={'X-Telegram-Bot-Api-Secret-Token': 'sai'})
+        assert rejected.status_code == HTTPStatus.FORBIDDEN
+    else:
+        await application.updater.start_polling(poll_interval=0, timeout=10)
+        await application.start()
+
+    started = time.perf_counter()
+    for update_id in range(1, count + 1):
+        api.push(make_update(update_id, 1000 + update_id % users))
+        await asyncio.sleep(1 / rate)
+    await asyncio.wait_for(api.done.wait(), timeout=60)
+    elapsed = time.perf_counter() - started
+
+    if server is not None:
+        await server.stop()
+    if application.updater.running:
+        api.arrived.set()
+        await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    await api.stop()
+
+    latencies = sorted(api.replied_at[i] - api.received_at[i] for i in api.replied_at)
+    return {
+        'elapsed': elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'max': latencies[-1],
+        'retries': api.retries,
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+    delay = (int(sys.argv[3]) if len(sys.argv) > 3 else 25) / 1000
+    users = int(sys.argv[4]) if len(sys.argv) > 4 else 200
+    print(f"{count} update, {rate:.0f} update/s, {users} nhân viên, trễ mạng {delay * 1000:.0f}ms mỗi chiều, "
+          f"handler {HANDLER_DELAY * 1000:.0f}ms")
+    for mode in ('polling', 'webhook'):
+        result = asyncio.run(run(mode, count, rate, delay, users))
+        print(f"{mode:<10} {result['elapsed']:7.2f}s  p50 {result['p50'] * 1000:7.0f}ms  "
+              f"p95 {result['p95'] * 1000:7.0f}ms  max {result['max'] * 1000:7.0f}ms  "
+              f"gửi lại {result['retries']}")
+
+
+if __name__ == "__main__":
+    main()
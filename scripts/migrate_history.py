@@ -0,0 +1,34 @@
+"""Chuyển attendance_history.json cũ sang bảng attendance_history (chạy một lần).
+
+Chạy: python -m scripts.migrate_history [đường_dẫn_json ...]
+"""
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from src.services.history_store import get_history_store
+
+DEFAULT_FILES = [
+    BASE_DIR / 'attendance_history.json',
+    BASE_DIR / 'data' / 'attendance_history.json',
+]
+
+
+def main():
+    paths = [Path(p) for p in sys.argv[1:]] or DEFAULT_FILES
+    store = get_history_store()
+    total = 0
+    for path in paths:
+        if not path.exists():
+            print(f"Bỏ qua {path}: không tồn tại")
+            continue
+        count = store.migrate_json(path)
+        print(f"Đã chuyển {count} dòng từ {path}")
+        total += count
+    print(f"Tổng cộng: {total} dòng, {len(store.days())} ngày có dữ liệu")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,7 @@ from pathlib import Path
 BASE_DIR = Path(__file__).parent.parent
 sys.path.append(str(BASE_DIR))
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Message, CallbackQuery
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Message
 from telegram.ext import Application, ContextTypes, CommandHandler, CallbackQueryHandler
 from datetime import datetime, timedelta
 from typing import Dict
@@ -15,7 +15,38 @@ import json
 
 from src.utils.config import ADMIN_ID, VN_TIMEZONE, BREAK_DURATIONS, BREAK_FREQUENCIES
 from src.models import UserState
-from src.utils.helpers import generate_today_stats, generate_weekly_report, save_user_states, generate_daily_report
+from src.utils.helpers import (
+    generate_today_stats,
+    generate_all_stats,
+    generate_weekly_report,
+    generate_monthly_report,
+    save_user_state,
+    save_user_states,
+    record_history,
+    record_history_many,
+    record_closed_shift,
+    generate_daily_report
+)
+from src.utils.report_sender import reply_report
+from src.services.history_store import (
+    get_history_store,
+    ACTION_START_SHIFT,
+    ACTION_END_SHIFT,
+    ACTION_BREAK_START,
+    ACTION_BREAK_END
+)
+from src.services.shift_ledger import get_shift_ledger
+from src.services.daily_aggregates import get_daily_aggregates
+from src.services.break_deadlines import get_break_deadlines
+from src.services.overtime_alerts import get_overtime_alerts
+from src.services.violation_manager import get_violation_manager
+from src.services.journal import (
+    EVENT_ADMIN_START_SHIFT,
+    EVENT_ADMIN_END_SHIFT,
+    EVENT_ADMIN_BREAK_START,
+    EVENT_ADMIN_BREAK_END,
+    EVENT_ADMIN_RESET
+)
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +85,7 @@ class AdminHandlers:
             "st": self.handle_all_stats_command,
             "dr": self.handle_daily_report_command,
             "wr": self.handle_weekly_report_command,
+            "mr": self.handle_monthly_report_command,
         }
         
         for command, handler in commands.items():
@@ -111,6 +143,7 @@ class AdminHandlers:
 /st - Thống kê tổng
 /dr - Báo cáo ngày
 /wr - Báo cáo tuần
+/mr - Báo cáo tháng
 
 *Menu chính:*
 /admin - Hiện menu này
@@ -196,7 +229,8 @@ class AdminHandlers:
         
         now = datetime.now(VN_TIMEZONE)
         count = 0
-        for state in self.user_states.values():
+        changed = {}
+        for user_id, state in self.user_states.items():
             if not state.is_working:
                 state.is_working = True
                 state.start_time = now
@@ -204,8 +238,11 @@ class AdminHandlers:
                 state.break_counts = {k: 0 for k in BREAK_DURATIONS.keys()}
                 state.current_break = None
                 state.break_start_time = None
+                changed[user_id] = state
+                get_daily_aggregates().on_shift_start(user_id, state.user_name, now)
                 count += 1
-        save_user_states(self.user_states)
+        save_user_states(changed, EVENT_ADMIN_START_SHIFT)
+        record_history_many(changed, ACTION_START_SHIFT, now)
         await update.message.reply_text(f"✅ Đã cho {count} nhân viên lên ca")
 
     async def handle_all_end_shift(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -216,12 +253,18 @@ class AdminHandlers:
         
         now = datetime.now(VN_TIMEZONE)
         count = 0
-        for state in self.user_states.values():
+        changed = {}
+        for user_id, state in self.user_states.items():
             if state.is_working and not state.current_break:
                 state.is_working = False
                 state.end_time = now
+                changed[user_id] = state
+                record_closed_shift(user_id, state)
+                get_daily_aggregates().on_shift_end(user_id, now)
+                get_break_deadlines().cancel(user_id)
                 count += 1
-        save_user_states(self.user_states)
+        save_user_states(changed, EVENT_ADMIN_END_SHIFT)
+        record_history_many(changed, ACTION_END_SHIFT, now)
         await update.message.reply_text(f"✅ Đã cho {count} nhân viên xuống ca")
 
     async def handle_force_break(self, query):
@@ -246,32 +289,7 @@ class AdminHandlers:
             await update.message.reply_text("⛔️ Bạn không có quyền!")
             return
         
-        now = datetime.now(VN_TIMEZONE)
-        stats = f"📊 Thống kê ngày {now.strftime('%d/%m/%Y')}:\n\n"
-        
-        for state in self.user_states.values():
-            if state.start_time and state.start_time.date() == now.date():
-                stats += f"👤 {state.user_name}:\n"
-                if state.is_working:
-                    work_time = now - state.start_time
-                    total_breaks = sum(state.breaks.values(), timedelta())
-                    actual_work = work_time - total_breaks
-                    stats += f"⏱ Đã làm: {str(actual_work).split('.')[0]}\n"
-                    if state.current_break:
-                        stats += f"🚽 Đang nghỉ: {state.current_break}\n"
-                else:
-                    stats += "🔴 Đã xuống ca\n"
-                    if state.end_time:
-                        work_time = state.end_time - state.start_time
-                        total_breaks = sum(state.breaks.values(), timedelta())
-                        actual_work = work_time - total_breaks
-                        stats += f"⏱ Thời gian làm: {str(actual_work).split('.')[0]}\n"
-                stats += "\n"
-        
-        if update.callback_query:
-            await update.callback_query.edit_message_text(stats)
-        else:
-            await update.message.reply_text(stats)
+        await reply_report(update, generate_today_stats(), 'thong_ke_hom_nay')
 
     async def handle_all_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Hiển thị thống kê tổng"""
@@ -279,23 +297,7 @@ class AdminHandlers:
             await update.message.reply_text("⛔️ Bạn không có quyền xem thống kê!")
             return
         
-        stats = "📊 Thống kê tổng:\n\n"
-        has_data = False
-        
-        for state in self.user_states.values():
-            has_data = True
-            stats += f"👤 {state.user_name}:\n"
-            stats += f"🟢 Trạng thái: {'Đang làm' if state.is_working else 'Không làm'}\n"
-            if state.current_break:
-                stats += f"🚽 Đang nghỉ: {state.current_break}\n"
-            if state.start_time:
-                stats += f"⏰ Bắt đầu ca: {state.start_time.strftime('%H:%M:%S')}\n"
-            stats += "\n"
-        
-        if not has_data:
-            stats += "Chưa có dữ liệu"
-        
-        await update.message.reply_text(stats)
+        await reply_report(update, generate_all_stats(self.user_states), 'thong_ke_tong')
 
     async def handle_daily_report(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Hiển thị báo cáo ngày"""
@@ -303,12 +305,7 @@ class AdminHandlers:
             await update.message.reply_text("⛔️ Bạn không có quyền xem báo cáo!")
             return
         
-        report = generate_daily_report(self.user_states)
-        
-        if update.callback_query:
-            await update.callback_query.edit_message_text(report)
-        else:
-            await update.message.reply_text(report)
+        await reply_report(update, generate_daily_report(), 'bao_cao_ngay')
 
     async def handle_weekly_report(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Hiển thị báo cáo tuần"""
@@ -316,33 +313,7 @@ class AdminHandlers:
             await update.message.reply_text("⛔️ Bạn không có quyền!")
             return
         
-        now = datetime.now(VN_TIMEZONE)
-        start_of_week = now - timedelta(days=now.weekday())
-        report = f"📑 Báo cáo tuần {start_of_week.strftime('%d/%m')} - {now.strftime('%d/%m/%Y')}:\n\n"
-        
-        for state in self.user_states.values():
-            if state.start_time and state.start_time.date() >= start_of_week.date():
-                report += f"👤 {state.user_name}:\n"
-                total_work = timedelta()
-                total_breaks = timedelta()
-                
-                if state.end_time:
-                    total_work = state.end_time - state.start_time
-                    total_breaks = sum(state.breaks.values(), timedelta())
-                    actual_work = total_work - total_breaks
-                    report += f"⏱ Thời gian làm thực tế: {str(actual_work).split('.')[0]}\n"
-                elif state.is_working:
-                    total_work = now - state.start_time
-                    total_breaks = sum(state.breaks.values(), timedelta())
-                    actual_work = total_work - total_breaks
-                    report += f"⏱ Đang làm: {str(actual_work).split('.')[0]}\n"
-                
-                report += f"🚽 Tổng thời gian nghỉ: {str(total_breaks).split('.')[0]}\n\n"
-        
-        if update.callback_query:
-            await update.callback_query.edit_message_text(report)
-        else:
-            await update.message.reply_text(report)
+        await reply_report(update, generate_weekly_report(self.user_states), 'bao_cao_tuan')
 
     async def handle_end_break(self, query):
         """Kết thúc giờ nghỉ cho nhân viên"""
@@ -362,28 +333,39 @@ class AdminHandlers:
 
     async def handle_force_break_type(self, query, break_type):
         """Xử l bắt đầu nghỉ theo loại"""
+        now = datetime.now(VN_TIMEZONE)
         count = 0
-        for state in self.user_states.values():
+        changed = {}
+        for user_id, state in self.user_states.items():
             if state.is_working and check_break_frequency(state, break_type):
-                state.break_start_time = datetime.now(VN_TIMEZONE)
+                state.break_start_time = now
                 state.current_break = break_type
+                changed[user_id] = state
+                get_daily_aggregates().on_break_start(user_id, break_type, state.break_start_time)
+                get_break_deadlines().schedule(user_id, break_type, state.break_start_time)
                 count += 1
-        save_user_states(self.user_states)
+        save_user_states(changed, EVENT_ADMIN_BREAK_START)
+        record_history_many(changed, ACTION_BREAK_START, now, break_type)
         await query.edit_message_text(f"✅ Đã cho {count} nhân viên bắt đầu {break_type}")
 
     async def handle_end_break_type(self, query, break_type):
         """Xử lý kết thúc nghỉ theo loại"""
         now = datetime.now(VN_TIMEZONE)
         count = 0
-        for state in self.user_states.values():
+        changed = {}
+        for user_id, state in self.user_states.items():
             if state.is_working and state.current_break == break_type:
                 break_duration = now - state.break_start_time
                 state.breaks[break_type] += break_duration
                 state.break_counts[break_type] += 1
                 state.current_break = None
                 state.break_start_time = None
+                changed[user_id] = state
+                get_daily_aggregates().on_break_end(user_id, break_type, break_duration)
+                get_break_deadlines().cancel(user_id)
                 count += 1
-        save_user_states(self.user_states)
+        save_user_states(changed, EVENT_ADMIN_BREAK_END)
+        record_history_many(changed, ACTION_BREAK_END, now, break_type)
         await query.edit_message_text(f"✅ Đã cho {count} nhân viên kết thúc {break_type}")
 
     async def handle_shift_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -403,12 +385,9 @@ class AdminHandlers:
         if update.effective_user.id not in ADMIN_ID:
             await update.message.reply_text("⛔️ Bạn không có quyền quản lý giờ nghỉ!")
             return
-        help_text = (
-            "🔰 Quản lý giờ nghỉ:\n\n"
-            "Các loại nghỉ:\n"
-            "- 🚻 Vệ sinh (厕所)\n"
-            "- 🍱 Ăn trưa (午饭)\n"
-            "- ☕️ Giải lao (休息)"
+        help_text = "🔰 Quản lý giờ nghỉ:\n\nCác loại nghỉ:\n" + "\n".join(
+            f"- {break_type} ({BREAK_DURATIONS[break_type]} phút, {BREAK_FREQUENCIES[break_type]} lần/ca)"
+            for break_type in BREAK_DURATIONS
         )
         await update.message.reply_text(help_text)
 
@@ -500,9 +479,6 @@ class AdminHandlers:
         
         if query.data == "confirm_reset":
             try:
-                data_dir = BASE_DIR / 'data'
-                data_dir.mkdir(exist_ok=True)
-                
                 # Reset user states
                 for state in self.user_states.values():
                     state.is_working = False
@@ -514,19 +490,17 @@ class AdminHandlers:
                     state.break_start_time = None
                 
                 # Xóa lịch sử chấm công
-                attendance_file = data_dir / 'attendance_history.json'
-                if attendance_file.exists():
-                    with open(attendance_file, 'w', encoding='utf-8') as f:
-                        json.dump({}, f, ensure_ascii=False, indent=4)
+                get_history_store().clear()
+                get_shift_ledger().clear()
+                get_daily_aggregates().clear()
+                get_break_deadlines().clear()
+                get_overtime_alerts().clear()
                 
                 # Xóa lịch sử vi phạm
-                violations_file = data_dir / 'violations.json'
-                if violations_file.exists():
-                    with open(violations_file, 'w', encoding='utf-8') as f:
-                        json.dump([], f, ensure_ascii=False, indent=4)
+                get_violation_manager().clear()
                 
                 # Lưu trạng thái đã reset
-                save_user_states(self.user_states)
+                save_user_states(self.user_states, EVENT_ADMIN_RESET)
                 
                 await query.edit_message_text("✅ Đã reset toàn bộ dữ liệu thành công!")
                 logger.info("Admin đã reset toàn bộ dữ liệu")
@@ -538,38 +512,6 @@ class AdminHandlers:
         elif query.data == "cancel_reset":
             await query.edit_message_text("🚫 Đã hủy thao tác reset dữ liệu!")
 
-    async def handle_callback_query(self, query: CallbackQuery):
-        """X lý các callback query"""
-        if query.data == "today_stats":
-            stats = generate_today_stats(self.user_states)
-            await query.edit_message_text(stats)
-            
-        elif query.data == "all_stats":
-            stats = self.generate_all_stats()
-            await query.edit_message_text(stats)
-            
-        elif query.data == "daily_report":
-            report = self.generate_daily_report()
-            await query.edit_message_text(report)
-            
-        elif query.data == "weekly_report":
-            report = generate_weekly_report(self.user_states)
-            await query.edit_message_text(report)
-
-    def generate_all_stats(self):
-        """Tạo thống kê tổng"""
-        stats = "📊 Thống kê tổng:\n\n"
-        for state in self.user_states.values():
-            stats += f"👤 {state.user_name}:\n"
-            if state.is_working:
-                stats += "🟢 Đang làm việc\n"
-                if state.current_break:
-                    stats += f"🚽 Đang nghỉ: {state.current_break}\n"
-            else:
-                stats += "🔴 Không trong ca\n"
-            stats += "\n"
-        return stats
-
     async def handle_all_start_shift_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Lệnh tắt: /as - Tất cả lên ca"""
         if update.effective_user.id not in ADMIN_ID:
@@ -604,8 +546,7 @@ class AdminHandlers:
             await update.message.reply_text("⛔️ Bạn không có quyền!")
             return
         
-        stats = generate_today_stats(self.user_states)
-        await update.message.reply_text(stats)
+        await reply_report(update, generate_today_stats(), 'thong_ke_hom_nay')
 
     async def handle_daily_report_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Lệnh tắt: /dr - Xem báo cáo ngày"""
@@ -613,8 +554,7 @@ class AdminHandlers:
             await update.message.reply_text("⛔️ Bạn không có quyền xem báo cáo!")
             return
         
-        report = generate_daily_report(self.user_states)
-        await update.message.reply_text(report)
+        await reply_report(update, generate_daily_report(), 'bao_cao_ngay')
 
     async def handle_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Hiển thị trợ giúp về các lệnh"""
@@ -637,6 +577,7 @@ class AdminHandlers:
 /st - Thống kê tổng
 /dr - Báo cáo ngày
 /wr - Báo cáo tuần
+/mr - Báo cáo tháng
 
 *Menu chính:*
 /admin - Mở menu admin
@@ -673,6 +614,10 @@ class AdminHandlers:
         # Bắt đầu nghỉ
         state.current_break = "break"  # hoặc loại nghỉ phù hợp
         state.break_start_time = datetime.now(VN_TIMEZONE)
+        save_user_state(user_id, state, EVENT_ADMIN_BREAK_START)
+        record_history(user_id, state.user_name, ACTION_BREAK_START, state.break_start_time, state.current_break)
+        get_daily_aggregates().on_break_start(user_id, state.current_break, state.break_start_time)
+        get_break_deadlines().schedule(user_id, state.current_break, state.break_start_time)
         await update.message.reply_text(f"✅ Đã cho phép {state.user_name} bắt đầu nghỉ")
 
     async def handle_end_break_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -699,8 +644,12 @@ class AdminHandlers:
         now = datetime.now(VN_TIMEZONE)
         break_duration = now - state.break_start_time
         state.breaks[state.current_break] += break_duration
+        get_daily_aggregates().on_break_end(user_id, state.current_break, break_duration)
+        get_break_deadlines().cancel(user_id)
+        record_history(user_id, state.user_name, ACTION_BREAK_END, now, state.current_break)
         state.current_break = None
         state.break_start_time = None
+        save_user_state(user_id, state, EVENT_ADMIN_BREAK_END)
 
         await update.message.reply_text(
             f"✅ Đã kết thúc nghỉ cho {state.user_name}\n"
@@ -713,15 +662,7 @@ class AdminHandlers:
             await update.message.reply_text("⛔️ Bạn không có quyền!")
             return
         
-        stats = "📊 Thống kê tổng:\n\n"
-        for state in self.user_states.values():
-            stats += f"👤 {state.user_name}:\n"
-            stats += f"🟢 Trạng thái: {'Đang làm' if state.is_working else 'Không làm'}\n"
-            if state.current_break:
-                stats += f"🚽 Đang nghỉ: {state.current_break}\n"
-            stats += "\n"
-        
-        await update.message.reply_text(stats)
+        await reply_report(update, generate_all_stats(self.user_states), 'thong_ke_tong')
 
     async def handle_weekly_report_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Lệnh tắt: /wr - Xem báo cáo tuần"""
@@ -729,17 +670,15 @@ class AdminHandlers:
             await update.message.reply_text("⛔️ Bạn không có quyền xem báo cáo!")
             return
         
-        now = datetime.now(VN_TIMEZONE)
-        start_of_week = now - timedelta(days=now.weekday())
-        report = f"📊 Báo cáo tuần ({start_of_week.strftime('%d/%m')} - {now.strftime('%d/%m')}):\n\n"
-        
-        for state in self.user_states.values():
-            if state.start_time and state.start_time.date() >= start_of_week.date():
-                report += f"👤 {state.user_name}:\n"
-                report += f"🕒 Tổng giờ làm: {calculate_work_hours(state)}\n"
-                report += f"🚽 Tổng thời gian nghỉ: {sum(state.breaks.values(), timedelta())}\n\n"
+        await reply_report(update, generate_weekly_report(self.user_states), 'bao_cao_tuan')
+
+    async def handle_monthly_report_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Lệnh tắt: /mr - Xem báo cáo tháng"""
+        if update.effective_user.id not in ADMIN_ID:
+            await update.message.reply_text("⛔️ Bạn không có quyền xem báo cáo!")
+            return
         
-        await update.message.reply_text(report)
+        await reply_report(update, generate_monthly_report(self.user_states), 'bao_cao_thang')
 
 def check_break_frequency(state, break_type):
     """Kiểm tra tần suất nghỉ"""
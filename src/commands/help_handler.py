@@ -1,19 +1,19 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from src.utils.config import config
+from src.utils.config import config, BREAK_DURATIONS, BREAK_FREQUENCIES
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Đọc thông tin từ config
     start_time = config['working_hours']['start_time']
     end_time = config['working_hours']['end_time']
     
-    ve_sinh_duration = config['break_durations']['ve_sinh']
-    hut_thuoc_duration = config['break_durations']['hut_thuoc']
-    an_com_duration = config['break_durations']['an_com']
-    
-    ve_sinh_freq = config['break_frequencies']['ve_sinh']
-    hut_thuoc_freq = config['break_frequencies']['hut_thuoc']
-    an_com_freq = config['break_frequencies']['an_com']
+    # Mỗi loại nghỉ trong [break_types] một mục
+    break_sections = "".join(
+        f"*{break_type}:*\n"
+        f"• Thời lượng: {BREAK_DURATIONS[break_type]} phút/lần\n"
+        f"• Số lần cho phép: {BREAK_FREQUENCIES[break_type]} lần/ca\n\n"
+        for break_type in BREAK_DURATIONS
+    )
 
     help_text = f"""
 🕒 *THỜI GIAN LÀM VIỆC VÀ NGHỈ NGƠI*
@@ -22,19 +22,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • Bắt đầu ca: {start_time}
 • Kết thúc ca: {end_time}
 
-🚻 *Thời gian vệ sinh:*
-• Thời lượng: {ve_sinh_duration} phút/lần
-• Số lần cho phép: {ve_sinh_freq} lần/ca
-
-🚬 *Thời gian hút thuốc:*
-• Thời lượng: {hut_thuoc_duration} phút/lần
-• Số lần cho phép: {hut_thuoc_freq} lần/ca
-
-🍚 *Thời gian ăn cơm:*
-• Thời lượng: {an_com_duration} phút/lần
-• Số lần cho phép: {an_com_freq} lần/ca
-
-📝 *Lưu ý:*
+{break_sections}📝 *Lưu ý:*
 • Vui lòng tuân thủ thời gian quy định
 • Báo cáo trước khi bắt đầu nghỉ
 • Báo cáo khi trở lại làm việc
@@ -9,7 +9,8 @@ from telegram.ext import (
     MessageHandler,
     filters,
     ContextTypes,
-    CallbackQueryHandler
+    CallbackQueryHandler,
+    ApplicationHandlerStop
 )
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta, date, time
@@ -38,9 +39,51 @@ import sys
 import codecs
 from typing import Dict
 from .models import UserState, Violation
-from src.services.violation_manager import ViolationManager
+from src.services.violation_manager import get_violation_manager
+from src.services.violation_rules import get_violation_rules
+from src.services.journal import (
+    EVENT_START_SHIFT,
+    EVENT_END_SHIFT,
+    EVENT_BREAK_START,
+    EVENT_BREAK_END,
+    EVENT_AUTO_END_SHIFT,
+    EVENT_ADMIN_START_SHIFT
+)
+from src.services.history_store import (
+    ACTION_START_SHIFT,
+    ACTION_END_SHIFT,
+    ACTION_BREAK_START,
+    ACTION_BREAK_END
+)
+from src.services.daily_aggregates import get_daily_aggregates
+from src.services.report_cache import get_report_cache
+from src.services.break_deadlines import get_break_deadlines
+from src.services.outbox import get_outbox, PRIORITY_HIGH, PRIORITY_NORMAL
+from src.services.bot_client import get_application, pool_stats
+from src.services.update_guard import get_update_guard
+from src.services.catch_up import get_catch_up, get_update_offset
+from src.services.violation_digest import (
+    get_violation_digest,
+    VIOLATION_LABELS,
+    DEFAULT_LABEL
+)
+from src.services.overtime_alerts import (
+    get_overtime_alerts,
+    LEVEL_WARNING,
+    LEVEL_REMINDER,
+    LEVEL_ESCALATED,
+    LEVEL_FINAL
+)
 from src.utils.helpers import (
+    record_history,
+    record_history_many,
+    rebuild_daily_aggregates,
+    record_closed_shift,
+    save_user_state,
     save_user_states,
+    checkpoint_user_states,
+    close_user_states,
+    load_user_states as load_stored_user_states,
     generate_today_stats,
     generate_weekly_report,
     generate_daily_report
@@ -50,6 +93,14 @@ from src.utils.helpers import (
 BASE_DIR = Path(__file__).parent.parent
 sys.path.append(str(BASE_DIR))
 
+from src.utils.report_sender import reply_report, queue_report
+from src.utils.button_router import (
+    get_button_router,
+    ROUTE_START_SHIFT,
+    ROUTE_END_SHIFT,
+    ROUTE_BREAK,
+    ROUTE_END_BREAK
+)
 from src.admin_handlers import AdminHandlers
 from src.utils.config import (
     BOT_TOKEN, 
@@ -57,7 +108,8 @@ from src.utils.config import (
     MAIN_ADMIN_ID,
     VN_TIMEZONE,
     BREAK_DURATIONS,
-    BREAK_FREQUENCIES
+    BREAK_FREQUENCIES,
+    DIGEST_URGENT_OVERTIME
 )
 
 # Load environment variables
@@ -88,32 +140,25 @@ file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelnam
 logger.addHandler(file_handler)
 
 # Khởi tạo violation manager
-violation_manager = ViolationManager()
+violation_manager = get_violation_manager()
 
 # Khởi tạo biến user_states toàn cục
 user_states: Dict[str, UserState] = {}
 
-def save_user_states(state: dict) -> None:
-    """Lưu trạng thái người dùng"""
+def load_user_states():
+    """Đọc trạng thái người dùng từ StateStore"""
+    # Cập nhật tại chỗ để các module đã import user_states dùng chung dict
     try:
-        # Giữ nguyên code xử lý hiện tại của bạn
-        pass
+        states = load_stored_user_states()
     except Exception as e:
-        logging.error(f"Lỗi khi lưu user states: {str(e)}")
+        logger.error(f"Lỗi khi đọc user states: {e}")
+        states = {}
+    user_states.clear()
+    user_states.update(states)
+    rebuild_daily_aggregates(user_states)
 
-def load_user_states():
-    """Đọc trạng thái người dùng từ file"""
-    global user_states
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, 'rb') as f:
-                user_states = pickle.load(f)
-        except Exception as e:
-            logger.error(f"Lỗi khi đọc user states: {e}")
-            user_states = {}
-
-# Initialize bot application
-application = Application.builder().token(BOT_TOKEN).build()
+# Application dùng chung (một Bot, một pool kết nối) với run.py
+application = get_application()
 
 # Load user states
 load_user_states()
@@ -130,80 +175,89 @@ async def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Xử lý lệnh /start"""
-    keyboard = [
-        [
-            KeyboardButton("🚀 Lên ca (上班)"),
-            KeyboardButton("🏁 Xuống ca (下班)")
-        ],
-        [
-            KeyboardButton("🍚 Ăn cơm (吃饭)"),
-            KeyboardButton("🚬 Hút thuốc (抽烟)")
-        ],
-        [
-            KeyboardButton("↩️ Trở lại chỗ ngồi (返回)"),
-            KeyboardButton("🚽 Vệ sinh (厕所)")
-        ]
-    ]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     await update.message.reply_text(
         "Chào mừng! Vui lòng chọn thao tác:",
-        reply_markup=reply_markup
+        reply_markup=get_button_router().keyboard()
     )
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    text = update.message.text
+    """Xử lý nút bấm của nhân viên (filter của MessageHandler đã loại tin khác)"""
+    route = get_button_router().route(update.message.text)
+    if route is None:
+        return
     user = update.effective_user
     user_id = str(user.id)
     
+    # Giờ bấm nút (khi xử lý bù backlog là lúc gửi tin, không phải bây giờ)
+    now = get_catch_up().event_time(update)
+    
+    # Bấm lại cùng nút ngay sau đó (mạng chậm): trả lời như lần trước, không xử lý lại
+    cached = get_update_guard().debounce(update.update_id, user_id, route, now.timestamp())
+    if cached is not None:
+        await replay_replies(update, cached)
+        return
+    
     if user_id not in user_states:
         user_states[user_id] = UserState(user_name=user.full_name)
+        get_report_cache().invalidate()
     
     state = user_states[user_id]
-    now = datetime.now(VN_TIMEZONE)
-    
-    # Xử lý các nút chính
-    if text == "🚀 Lên ca (上班)":
-        await handle_start_shift(update, state, now)
-    
-    elif text == "🏁 Xuống ca (下班)":
-        await handle_end_shift(update, state, now)
-        
-    elif text == "🍚 Ăn cơm (吃饭)":
-        await handle_break(update, state, now, "🍚 Ăn cơm (吃饭)", context)
-        
-    elif text == "🚬 Hút thuốc (抽烟)":
-        await handle_break(update, state, now, "🚬 Hút thuốc (抽烟)", context)
-        
-    elif text == "🚽 Vệ sinh (厕所)":
-        await handle_break(update, state, now, "🚽 Vệ sinh (厕所)", context)
-        
-    elif text == "↩️ Trở lại chỗ ngồi (返回)":
-        await handle_end_break(update, state, now, context)
+    await BUTTON_ACTIONS[route.action](update, context, state, now, route)
+
+async def reply(update: Update, text: str, **kwargs):
+    """Trả lời nhân viên và lưu lại để trả lời y hệt nếu update bị gửi trùng"""
+    get_update_guard().record(update.update_id, text, **kwargs)
+    await send_reply(update, text, **kwargs)
+
+async def send_reply(update: Update, text: str, **kwargs):
+    """Gửi tin trả lời, hoặc gom lại nếu đang xử lý bù backlog"""
+    if get_catch_up().collect(update.effective_chat.id, text):
+        return
+    await update.message.reply_text(text, **kwargs)
+
+async def replay_replies(update: Update, replies):
+    """Gửi lại các tin trả lời đã lưu của lần xử lý trước"""
+    if update.message is None:
+        return
+    for text, kwargs in replies:
+        await send_reply(update, text, **kwargs)
+
+async def guard_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Chạy trước mọi handler (group -1): bỏ qua update_id đã xử lý"""
+    guard = get_update_guard()
+    replies = guard.seen(update.update_id)
+    if replies is not None:
+        await replay_replies(update, replies)
+        raise ApplicationHandlerStop
+    guard.begin(update.update_id)
 
 async def handle_start_shift(update, state, now):
     """Xử lý lên ca"""
     if state.is_working:
-        await update.message.reply_text("❌ Bạn đã bắt đầu ca làm việc rồi!")
+        await reply(update, "❌ Bạn đã bắt đầu ca làm việc rồi!")
         return
         
     state.is_working = True
     state.start_time = now
     state.breaks = {k: timedelta(0) for k in BREAK_DURATIONS.keys()}
     state.break_counts = {k: 0 for k in BREAK_DURATIONS.keys()}
-    save_user_states(state)
+    save_user_state(str(update.effective_user.id), state, EVENT_START_SHIFT)
+    record_history(update.effective_user.id, state.user_name, ACTION_START_SHIFT, now)
+    get_daily_aggregates().on_shift_start(str(update.effective_user.id), state.user_name, now)
     
-    await update.message.reply_text(
+    await reply(
+        update,
         f"✅ Đã bắt đầu ca làm việc lúc {now.strftime('%H:%M:%S')}"
     )
 
 async def handle_end_shift(update, state, now):
     """Xử lý xuống ca"""
     if not state.is_working:
-        await update.message.reply_text("❌ Bạn chưa bắt đầu ca làm việc!")
+        await reply(update, "❌ Bạn chưa bắt đầu ca làm việc!")
         return
             
     if state.current_break:
-        await update.message.reply_text("❌ Vui lòng kết thúc giờ nghỉ trước khi kết thúc ca!")
+        await reply(update, "❌ Vui lòng kết thúc giờ nghỉ trước khi kết thúc ca!")
         return
         
     state.is_working = False
@@ -226,74 +280,88 @@ async def handle_end_shift(update, state, now):
         if duration > timedelta(0):
             report += f"\n{break_type}: {str(duration).split('.')[0]}"
     
-    save_user_states(state)
-    await update.message.reply_text(report)
+    save_user_state(str(update.effective_user.id), state, EVENT_END_SHIFT)
+    record_closed_shift(update.effective_user.id, state)
+    get_daily_aggregates().on_shift_end(str(update.effective_user.id), now)
+    record_history(update.effective_user.id, state.user_name, ACTION_END_SHIFT, now)
+    await reply(update, report)
 
 async def handle_break(update, state, now, break_type, context: ContextTypes.DEFAULT_TYPE):
     """Xử lý các loại nghỉ"""
     if not state.is_working:
-        await update.message.reply_text("❌ Bạn chưa bắt đầu ca làm việc!")
+        await reply(update, "❌ Bạn chưa bắt đầu ca làm việc!")
         return
         
     if state.current_break:
-        await update.message.reply_text("❌ Bạn đang trong giờ nghỉ!")
+        await reply(update, "❌ Bạn đang trong giờ nghỉ!")
         return
         
     current_count = state.break_counts.get(break_type, 0)
     state.current_break = break_type
     state.break_start_time = now
     state.break_counts[break_type] = current_count + 1
-    save_user_states(state)
+    save_user_state(str(update.effective_user.id), state, EVENT_BREAK_START)
+    record_history(update.effective_user.id, state.user_name, ACTION_BREAK_START, now, break_type)
+    get_daily_aggregates().on_break_start(str(update.effective_user.id), break_type, now)
+    get_break_deadlines().schedule(str(update.effective_user.id), break_type, now)
     
     duration = BREAK_DURATIONS[break_type]
     message = f"✅ Bắt đầu {break_type}\n⏰ Thời gian cho phép: {duration} phút\n"
     message += f"📊 Số lần đã nghỉ: {current_count + 1}/{BREAK_FREQUENCIES[break_type]}"
     
-    if current_count >= BREAK_FREQUENCIES[break_type]:
+    violations = get_violation_rules().break_started(state.user_name, break_type, now, current_count + 1)
+    if violations:
         # Thêm cảnh báo nếu vượt số lần cho phép
         message = "⚠️ CẢNH BÁO: " + message
         message += f"\n❌ Bạn đã vượt quá số lần {break_type} cho phép!"
         
         # Thông báo admin
-        await notify_admins_violation(
-            context,
-            state.user_name,
-            f"❌ Vượt số lần {break_type} ({current_count + 1}/{BREAK_FREQUENCIES[break_type]})"
-        )
+        await record_violations(context, str(update.effective_user.id), state, violations)
     
-    await update.message.reply_text(message)
+    await reply(update, message)
 
 async def handle_end_break(update, state, now, context):
     """Xử lý kết thúc nghỉ"""
     if not state.current_break:
-        await update.message.reply_text("❌ Bạn không trong giờ nghỉ!")
+        await reply(update, "❌ Bạn không trong giờ nghỉ!")
         return
         
     break_duration = now - state.break_start_time
     state.breaks[state.current_break] += break_duration
-    allowed_duration = timedelta(minutes=BREAK_DURATIONS[state.current_break])
     
-    if break_duration > allowed_duration:
-        overtime = break_duration - allowed_duration
-        await update.message.reply_text(
+    violations = get_violation_rules().break_ended(state.user_name, state.current_break, now, break_duration)
+    if violations:
+        overtime = violations[0].duration
+        await reply(
+            update,
             f"⚠️ Cảnh báo: Bạn đã nghỉ quá giờ {str(overtime).split('.')[0]}"
         )
         # Thông báo admin khi quá giờ
-        await notify_admins_violation(
-            context,
-            state.user_name,
-            f"⏰ Nghỉ quá giờ {str(overtime).split('.')[0]} (cho phép {BREAK_DURATIONS[state.current_break]} phút)"
-        )
+        await record_violations(context, str(update.effective_user.id), state, violations)
     
+    ended_break = state.current_break
+    get_daily_aggregates().on_break_end(str(update.effective_user.id), ended_break, break_duration)
+    get_break_deadlines().cancel(str(update.effective_user.id))
     state.current_break = None
     state.break_start_time = None
-    save_user_states(state)
+    save_user_state(str(update.effective_user.id), state, EVENT_BREAK_END)
+    record_history(update.effective_user.id, state.user_name, ACTION_BREAK_END, now, ended_break)
     
-    await update.message.reply_text(
+    await reply(
+        update,
         f"✅ Đã kết thúc nghỉ\n"
         f"⏱ Thời gian nghỉ: {str(break_duration).split('.')[0]}"
     )
 
+# Hành động nút bấm -> handler
+BUTTON_ACTIONS = {
+    ROUTE_START_SHIFT: lambda update, context, state, now, route: handle_start_shift(update, state, now),
+    ROUTE_END_SHIFT: lambda update, context, state, now, route: handle_end_shift(update, state, now),
+    ROUTE_BREAK: lambda update, context, state, now, route: handle_break(
+        update, state, now, route.break_type, context),
+    ROUTE_END_BREAK: lambda update, context, state, now, route: handle_end_break(update, state, now, context),
+}
+
 async def handle_admin_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Xử lý các action từ menu admin"""
     query = update.callback_query
@@ -364,51 +432,111 @@ async def handle_violation_report(update: Update, context: ContextTypes.DEFAULT_
     )
     report = violation_manager.generate_violation_report(start_of_day)
     
-    await update.message.reply_text(report)
+    await reply_report(update, report, 'bao_cao_vi_pham')
 
-async def periodic_check(context: ContextTypes.DEFAULT_TYPE):
-    """Kiểm tra định kỳ các vi phạm"""
+async def break_overdue(context: ContextTypes.DEFAULT_TYPE):
+    """Chạy ở mỗi mức cảnh báo của một lần nghỉ quá giờ"""
+    deadlines = get_break_deadlines()
+    deadline = deadlines.take(context.job)
+    if deadline is None:
+        return
+    state = user_states.get(deadline.user_id)
+    if not state or state.current_break != deadline.break_type or state.break_start_time != deadline.start:
+        return
+    
     now = datetime.now(VN_TIMEZONE)
-    for user_id, state in user_states.items():
-        if state.is_working and state.current_break:
-            break_duration = now - state.break_start_time
-            allowed_duration = timedelta(minutes=BREAK_DURATIONS[state.current_break])
-            if break_duration > allowed_duration:
-                try:
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text=f"⚠️ Cảnh báo: Bạn đã nghỉ quá giờ {str(break_duration - allowed_duration).split('.')[0]}"
-                    )
-                except (Forbidden, BadRequest):
-                    logger.warning(f"Không thể gửi cảnh báo tới user {user_id}")
+    alerts = get_overtime_alerts()
+    allowed_duration = timedelta(minutes=BREAK_DURATIONS[deadline.break_type])
+    break_deadline = deadline.start + allowed_duration
+    level = alerts.due_level(deadline.user_id, deadline.start, break_deadline, now)
+    if level is not None:
+        # Ghi nhận trước khi gửi để không gửi lại mức này nếu gửi lỗi giữa chừng
+        alerts.mark_sent(deadline.user_id, deadline.start, level)
+        await send_overtime_alert(context, deadline.user_id, state, level,
+                                  str(now - break_deadline).split('.')[0])
+    
+    next_due = alerts.next_due(deadline.user_id, deadline.start, break_deadline)
+    if next_due is not None:
+        deadlines.schedule(deadline.user_id, deadline.break_type, deadline.start, due=next_due)
+
+async def send_overtime_alert(context: ContextTypes.DEFAULT_TYPE, user_id: str,
+                              state: UserState, level: int, overtime: str):
+    """Gửi cảnh báo nghỉ quá giờ theo mức"""
+    if level == LEVEL_WARNING:
+        user_message = f"⚠️ Cảnh báo: Bạn đã nghỉ quá giờ {overtime}"
+    elif level == LEVEL_REMINDER:
+        user_message = f"⏰ Nhắc lại: Bạn đã nghỉ quá giờ {overtime}, vui lòng trở lại chỗ ngồi"
+    elif level == LEVEL_FINAL:
+        user_message = f"🚨 Bạn đã nghỉ quá giờ {overtime}, admin đã được thông báo"
+    else:
+        user_message = None
+    
+    key = f"overtime:{user_id}:{int(state.break_start_time.timestamp())}:{level}"
+    if user_message:
+        get_outbox().enqueue(user_id, user_message, priority=PRIORITY_HIGH, key=key)
+    
+    if level in (LEVEL_ESCALATED, LEVEL_FINAL):
+        prefix = "🚨 Vẫn chưa trở lại" if level == LEVEL_FINAL else "⏰ Chưa trở lại"
+        await notify_admins_violation(
+            context,
+            state.user_name,
+            f"{prefix}: {state.current_break} quá giờ {overtime}",
+            key=f"{key}:admin"
+        )
 
 async def save_all_user_states(context: ContextTypes.DEFAULT_TYPE):
-    """Lưu trạng thái tất cả users định kỳ"""
+    """Tạo snapshot định kỳ (chỉ ghi các users có thay đổi) và ghi update offset"""
     try:
-        active_users = len([u for u in user_states.values() if u.is_working])
-        logger.info(f"Đang lưu trạng thái: {len(user_states)} users, {active_users} đang hoạt động")
-        save_user_states(user_states)
+        saved = checkpoint_user_states(user_states)
+        get_update_offset().flush()
+        if saved:
+            logger.info(f"Đã lưu trạng thái: {saved}/{len(user_states)} users thay đổi")
+        cache_stats = get_report_cache().stats()
+        logger.debug(f"Cache báo cáo: {cache_stats['hits']} hit, {cache_stats['misses']} miss")
+        pool = pool_stats()
+        logger.debug(
+            f"Pool HTTP: đỉnh {pool['peak']} request đồng thời/{pool['pool_size']} kết nối, {pool['requests']} request "
+            f"(TB {pool['avg_ms']}ms), {pool['errors']} lỗi, {pool['pool_timeouts']} lần hết kết nối"
+        )
     except Exception as e:
         logger.error(f"Lỗi khi lưu user states: {e}")
 
+async def on_startup(application: Application):
+    """Khởi động các worker gửi tin rồi xử lý bù các update dồn lại (post_init)"""
+    get_outbox().start(application.bot)
+    await get_catch_up().run(application)
+
+async def flush_user_states(application: Application):
+    """Dừng hàng đợi gửi tin và ghi nốt trạng thái khi tắt bot (post_shutdown)"""
+    get_violation_digest().flush()
+    get_update_offset().flush()
+    await get_outbox().stop()
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, close_user_states, user_states)
+
 async def auto_end_shift(context: ContextTypes.DEFAULT_TYPE):
     """Tự động kết thúc ca làm việc lúc 1h sáng"""
     now = datetime.now(VN_TIMEZONE)
     count = 0
+    ended = {}
     for user_id, state in user_states.items():
         if state.is_working:
             state.is_working = False
             state.end_time = now
+            ended[user_id] = state
+            record_closed_shift(user_id, state)
+            get_daily_aggregates().on_shift_end(user_id, now)
+            get_break_deadlines().cancel(user_id)
             count += 1
-            try:
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text="🔔 Ca làm việc của bạn đã được tự động kết thúc"
-                )
-            except (Forbidden, BadRequest):
-                logger.warning(f"Không thể gửi thông báo tới user {user_id}")
-    
-    save_user_states()
+            get_outbox().enqueue(
+                user_id,
+                "🔔 Ca làm việc của bạn đã được tự động kết thúc",
+                priority=PRIORITY_NORMAL,
+                key=f"auto_end:{user_id}:{now.date().isoformat()}"
+            )
+    
+    save_user_states(ended, EVENT_AUTO_END_SHIFT)
+    record_history_many(ended, ACTION_END_SHIFT, now)
     logger.info(f"Đã tự động kết thúc ca cho {count} người")
 
 async def send_daily_report(context: ContextTypes.DEFAULT_TYPE):
@@ -419,33 +547,79 @@ async def send_daily_report(context: ContextTypes.DEFAULT_TYPE):
     violation_report = violation_manager.generate_violation_report(yesterday)
     
     # Tạo báo cáo tổng hợp
-    daily_report = generate_daily_report(user_states)
+    daily_report = generate_daily_report(yesterday.date())
+    get_daily_aggregates().prune()
+    violation_manager.prune()
+    get_outbox().prune()
     
     final_report = f"📊 Báo cáo ngày {yesterday.strftime('%d/%m/%Y')}:\n\n"
     final_report += daily_report + "\n\n"
     final_report += "🚫 Báo cáo vi phạm:\n" + violation_report
     
+    # Job chạy lại trong cùng ngày (khởi động lại bot) không gửi báo cáo lần hai
+    day_key = yesterday.date().isoformat()
     for admin_id in ADMIN_ID:
-        try:
-            await context.bot.send_message(
-                chat_id=admin_id,
-                text=final_report
-            )
-        except (Forbidden, BadRequest):
-            logger.warning(f"Không thể gửi báo cáo tới admin {admin_id}")
+        queue_report(admin_id, final_report, 'bao_cao_ngay', key=f"daily_report:{day_key}:{admin_id}")
 
-async def notify_admins_violation(context: ContextTypes.DEFAULT_TYPE, user_name: str, violation_msg: str):
-    """Gửi thông báo vi phạm tới admin"""
+async def record_violations(context: ContextTypes.DEFAULT_TYPE, user_id: str, state: UserState,
+                            violations: list):
+    """Lưu các vi phạm vừa phát hiện và thông báo admin"""
+    if not violations:
+        return
+    violation_manager.add_violations(violations)
+    for violation in violations:
+        get_daily_aggregates().on_violation(user_id, state.user_name, violation.timestamp)
+        key = f"violation:{user_id}:{violation.violation_type}:{int(violation.timestamp.timestamp())}"
+        if is_urgent_violation(violation):
+            icon, _ = VIOLATION_LABELS.get(violation.violation_type, DEFAULT_LABEL)
+            await notify_admins_violation(
+                context,
+                state.user_name,
+                f"{icon} {violation.details}",
+                key=key
+            )
+        else:
+            get_violation_digest().add(state.user_name, violation.violation_type, violation.details, key)
+
+def is_urgent_violation(violation: Violation) -> bool:
+    """Vi phạm nặng (nghỉ quá giờ lâu) được báo admin ngay, không chờ gom"""
+    return (violation.violation_type == "overtime_break"
+            and violation.duration is not None
+            and violation.duration >= timedelta(minutes=DIGEST_URGENT_OVERTIME))
+
+async def notify_admins_violation(context: ContextTypes.DEFAULT_TYPE, user_name: str, violation_msg: str,
+                                  key: str = None):
+    """Đưa thông báo vi phạm tới admin vào hàng đợi gửi tin"""
     message = f"⚠️ VI PHẠM\n {user_name}\n{violation_msg}"
+    get_outbox().enqueue_many(ADMIN_ID, message, priority=PRIORITY_HIGH, key=key)
+
+async def handle_outbox(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Xem tin gửi lỗi (dead-letter); `/outbox retry [id]` để gửi lại"""
+    if update.effective_user.id not in ADMIN_ID:
+        await update.message.reply_text("⛔️ Bạn không có quyền sử dụng lệnh này!")
+        return
     
-    for admin_id in ADMIN_ID:
-        try:
-            await context.bot.send_message(
-                chat_id=admin_id,
-                text=message
-            )
-        except (Forbidden, BadRequest):
-            logger.warning(f"Không thể gửi thông báo vi phạm tới admin {admin_id}")
+    outbox = get_outbox()
+    args = context.args or []
+    if args and args[0] == 'retry':
+        dead_id = int(args[1]) if len(args) > 1 and args[1].isdigit() else None
+        count = outbox.requeue_dead(dead_id)
+        await update.message.reply_text(f"🔁 Đã đưa {count} tin vào hàng đợi gửi lại")
+        return
+    
+    report = (
+        f"📤 Hàng đợi gửi tin\n"
+        f"Đang chờ: {outbox.pending_count()}\n"
+        f"Gửi lỗi: {outbox.dead_count()}\n"
+    )
+    for letter in outbox.dead_letters():
+        failed = datetime.fromtimestamp(letter['failed'], VN_TIMEZONE).strftime('%d/%m %H:%M')
+        report += (
+            f"\n#{letter['id']} → {letter['chat_id']} ({failed}, {letter['attempts']} lần)\n"
+            f"  {letter['text'][:80]}\n"
+            f"  Lỗi: {letter['error']}\n"
+        )
+    await reply_report(update, report, 'outbox')
 
 async def get_chat_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Lấy danh sách thành viên trong group"""
@@ -480,7 +654,7 @@ async def handle_all_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 }
                 count += 1
         
-        save_user_states(user_states)
+        save_user_states(user_states, EVENT_ADMIN_START_SHIFT)
         await update.message.reply_text(f"✅ Đã cho {count} người lên ca!")
         
     except Exception as e:
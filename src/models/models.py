@@ -19,4 +19,57 @@ class UserState:
     current_break: Optional[str] = None
     break_start_time: Optional[datetime] = None
     breaks: Dict[str, timedelta] = field(default_factory=lambda: {})
-    break_counts: Dict[str, int] = field(default_factory=lambda: {})
\ No newline at end of file
+    break_counts: Dict[str, int] = field(default_factory=lambda: {})
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if not name.startswith('_'):
+            self.mark_dirty()
+
+    @property
+    def version(self) -> int:
+        """Số lần trạng thái đã thay đổi"""
+        return self.__dict__.get('_version', 0)
+
+    @property
+    def dirty(self) -> bool:
+        """True nếu có thay đổi chưa được ghi vào snapshot"""
+        return self.version != self.__dict__.get('_saved_version', 0)
+
+    def mark_dirty(self):
+        """Đánh dấu thay đổi (dùng khi sửa trực tiếp breaks/break_counts)"""
+        object.__setattr__(self, '_version', self.version + 1)
+
+    def mark_clean(self, version: Optional[int] = None):
+        """Đánh dấu đã lưu tới phiên bản `version` (mặc định: hiện tại)"""
+        object.__setattr__(self, '_saved_version', self.version if version is None else version)
+
+    def to_dict(self) -> dict:
+        """Chuyển trạng thái sang dict để lưu (JSON)"""
+        return {
+            'user_name': self.user_name,
+            'is_working': self.is_working,
+            'start_time': self.start_time.isoformat() if self.start_time else None,
+            'end_time': self.end_time.isoformat() if self.end_time else None,
+            'current_break': self.current_break,
+            'break_start_time': self.break_start_time.isoformat() if self.break_start_time else None,
+            'breaks': {k: v.total_seconds() for k, v in self.breaks.items()},
+            'break_counts': dict(self.break_counts)
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'UserState':
+        """Tạo trạng thái từ dict đã lưu"""
+        def parse_time(value):
+            return datetime.fromisoformat(value) if value else None
+
+        return cls(
+            user_name=data['user_name'],
+            is_working=data.get('is_working', False),
+            start_time=parse_time(data.get('start_time')),
+            end_time=parse_time(data.get('end_time')),
+            current_break=data.get('current_break'),
+            break_start_time=parse_time(data.get('break_start_time')),
+            breaks={k: timedelta(seconds=v) for k, v in data.get('breaks', {}).items()},
+            break_counts=dict(data.get('break_counts', {}))
+        )
\ No newline at end of file
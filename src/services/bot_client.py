@@ -0,0 +1,124 @@
+import logging
+import time
+from typing import Dict, Optional
+
+import httpx
+from telegram import Bot
+from telegram.error import TimedOut
+from telegram.ext import Application
+from telegram.request import HTTPXRequest
+
+from src.services.catch_up import get_update_offset
+from src.services.update_processor import UserOrderedUpdateProcessor
+from src.utils.config import (
+    BOT_TOKEN,
+    HTTP_POOL_SIZE,
+    HTTP_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_WRITE_TIMEOUT,
+    HTTP_POOL_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PooledRequest(HTTPXRequest):
+    """HTTPXRequest có cấu hình pool/keep-alive từ config.ini và đếm mức sử dụng pool"""
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, **kwargs):
+        limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=min(HTTP_KEEPALIVE_CONNECTIONS, pool_size),
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+        super().__init__(
+            connection_pool_size=pool_size,
+            connect_timeout=HTTP_CONNECT_TIMEOUT,
+            read_timeout=HTTP_READ_TIMEOUT,
+            write_timeout=HTTP_WRITE_TIMEOUT,
+            pool_timeout=HTTP_POOL_TIMEOUT,
+            httpx_kwargs={'limits': limits},
+            **kwargs
+        )
+        self.pool_size = pool_size
+        self.in_flight = 0
+        self.peak = 0
+        self.requests = 0
+        self.errors = 0
+        self.pool_timeouts = 0
+        self.total_time = 0.0
+
+    async def do_request(self, *args, **kwargs):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        started = time.perf_counter()
+        try:
+            return await super().do_request(*args, **kwargs)
+        except TimedOut as e:
+            self.errors += 1
+            if isinstance(e.__cause__, httpx.PoolTimeout):
+                self.pool_timeouts += 1
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.requests += 1
+            self.total_time += time.perf_counter() - started
+
+    def stats(self) -> Dict:
+        """Mức sử dụng pool từ lúc khởi động.
+
+        `in_flight`/`peak` tính cả request đang chờ kết nối rảnh, nên đỉnh vượt
+        `pool_size` nghĩa là pool đang thiếu. Đỉnh được đặt lại sau mỗi lần đọc.
+        """
+        stats = {
+            'pool_size': self.pool_size,
+            'in_flight': self.in_flight,
+            'peak': self.peak,
+            'requests': self.requests,
+            'errors': self.errors,
+            'pool_timeouts': self.pool_timeouts,
+            'avg_ms': round(self.total_time / self.requests * 1000, 1) if self.requests else 0.0,
+        }
+        self.peak = self.in_flight
+        return stats
+
+
+_application: Optional[Application] = None
+_request: Optional[PooledRequest] = None
+
+
+def get_application() -> Application:
+    """Application dùng chung: một Bot và một pool kết nối cho toàn bộ bot.
+
+    Long polling dùng một request riêng một kết nối để không chiếm pool gửi tin.
+    Update được xử lý song song, giữ thứ tự trong từng user; update offset
+    ghi nhận update nào đã xử lý xong.
+    """
+    global _application, _request
+    if _application is None:
+        _request = PooledRequest()
+        _application = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .request(_request)
+            .get_updates_request(HTTPXRequest(connection_pool_size=1, read_timeout=HTTP_READ_TIMEOUT))
+            .concurrent_updates(UserOrderedUpdateProcessor(tracker=get_update_offset()))
+            .build()
+        )
+    return _application
+
+
+def get_bot() -> Bot:
+    """Bot dùng chung của Application, truyền vào các thành phần cần gửi tin"""
+    return get_application().bot
+
+
+def pool_stats() -> Dict:
+    """Số liệu sử dụng pool kết nối gửi tin"""
+    get_application()
+    return _request.stats()
@@ -0,0 +1,101 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, NamedTuple, Optional
+
+from telegram.ext import Job, JobQueue
+
+from src.models import UserState
+from src.utils.config import BREAK_DURATIONS
+
+logger = logging.getLogger(__name__)
+
+
+class BreakDeadline(NamedTuple):
+    user_id: str
+    break_type: str
+    start: datetime
+    due: datetime
+
+
+class BreakDeadlines:
+    """Hẹn giờ hết giờ nghỉ cho từng user trên JobQueue.
+
+    Mỗi lần bắt đầu nghỉ đăng ký một job chạy đúng lúc hết thời gian cho
+    phép, kết thúc nghỉ thì hủy job đó. Không còn phải quét toàn bộ user
+    định kỳ để tìm người nghỉ quá giờ.
+    """
+
+    def __init__(self):
+        self._job_queue: Optional[JobQueue] = None
+        self._callback: Optional[Callable] = None
+        self._jobs: Dict[str, Job] = {}
+
+    def attach(self, job_queue: JobQueue, callback: Callable):
+        """Gắn JobQueue và hàm xử lý khi hết giờ (gọi lúc khởi động)"""
+        self._job_queue = job_queue
+        self._callback = callback
+
+    def schedule(self, user_id: str, break_type: str, start: datetime,
+                 due: Optional[datetime] = None):
+        """Đăng ký hạn cho lần nghỉ vừa bắt đầu, thay hạn cũ nếu có"""
+        user_id = str(user_id)
+        self.cancel(user_id)
+        if self._job_queue is None:
+            return
+        if due is None:
+            minutes = BREAK_DURATIONS.get(break_type)
+            if minutes is None:
+                # Loại nghỉ không có trong cấu hình (vd. nghỉ do admin cho phép)
+                return
+            due = start + timedelta(minutes=minutes)
+        # Hạn đã qua (vd. sau khi khởi động lại) thì chạy ngay
+        delay = max((due - datetime.now(due.tzinfo)).total_seconds(), 0)
+        self._jobs[user_id] = self._job_queue.run_once(
+            self._callback,
+            when=delay,
+            data=BreakDeadline(user_id, break_type, start, due),
+            name=f"break_deadline:{user_id}"
+        )
+
+    def cancel(self, user_id: str):
+        """Hủy hạn của user (khi kết thúc nghỉ hoặc xuống ca)"""
+        job = self._jobs.pop(str(user_id), None)
+        if job is not None:
+            job.schedule_removal()
+
+    def take(self, job: Job) -> Optional[BreakDeadline]:
+        """Lấy hạn của job vừa chạy, None nếu hạn đó đã bị hủy hoặc thay thế"""
+        deadline = job.data
+        if self._jobs.get(deadline.user_id) is not job:
+            return None
+        del self._jobs[deadline.user_id]
+        return deadline
+
+    def restore(self, user_states: Dict[str, UserState]) -> int:
+        """Đăng ký lại hạn cho các user đang nghỉ sau khi khởi động lại"""
+        count = 0
+        for user_id, state in user_states.items():
+            if state.is_working and state.current_break and state.break_start_time:
+                self.schedule(user_id, state.current_break, state.break_start_time)
+                count += 1
+        if count:
+            logger.info(f"Đã đăng ký lại hạn nghỉ cho {count} user")
+        return count
+
+    def clear(self):
+        for user_id in list(self._jobs):
+            self.cancel(user_id)
+
+    def __len__(self):
+        return len(self._jobs)
+
+
+_default_deadlines: Optional[BreakDeadlines] = None
+
+
+def get_break_deadlines() -> BreakDeadlines:
+    """Trả về BreakDeadlines dùng chung cho toàn ứng dụng"""
+    global _default_deadlines
+    if _default_deadlines is None:
+        _default_deadlines = BreakDeadlines()
+    return _default_deadlines
@@ -0,0 +1,176 @@
+import heapq
+import logging
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from telegram import Update
+from telegram.ext import Application
+
+from src.services.history_store import ATTENDANCE_DB
+from src.services.outbox import PRIORITY_NORMAL
+from src.utils.config import VN_TIMEZONE, CATCH_UP_BATCH, CATCH_UP_MAX_AGE
+from src.utils.report_sender import queue_report
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateOffset:
+    """update_id đã xử lý xong liên tục, lưu trong SQLite để còn sau khi khởi động lại.
+
+    Update chạy song song nên có thể xong không theo thứ tự. `begin` đánh
+    dấu update bắt đầu xử lý (theo thứ tự nhận), `complete` khi xong; `last`
+    chỉ tiến tới update xong lớn nhất còn nhỏ hơn mọi update đang xử lý, nên
+    update xong trước không kéo `last` vượt qua update đến trước nó còn đang chạy.
+
+    `complete` chỉ cập nhật bộ nhớ; `flush` ghi xuống SQLite (gọi từ job
+    checkpoint và khi tắt bot). Nếu bot chết giữa hai lần flush, các update
+    Telegram chưa được xác nhận trong khoảng đó có thể bị xử lý lại.
+    """
+
+    def __init__(self, db_path: Path = ATTENDANCE_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS update_offset ("
+            "id INTEGER PRIMARY KEY CHECK (id = 0), update_id INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+        row = self._conn.execute("SELECT update_id FROM update_offset WHERE id = 0").fetchone()
+        self.last: Optional[int] = row[0] if row else None
+        self._saved = self.last
+        # Update đang xử lý và update đã xong nhưng còn update nhỏ hơn đang chạy
+        self._in_flight: Set[int] = set()
+        self._done: List[int] = []
+
+    def begin(self, update_id: int):
+        """Ghi nhận update bắt đầu xử lý"""
+        if self.last is None or update_id > self.last:
+            self._in_flight.add(update_id)
+
+    def complete(self, update_id: int):
+        """Ghi nhận update đã xử lý xong (hoặc bỏ qua) và tiến `last` nếu được"""
+        self._in_flight.discard(update_id)
+        if self.last is not None and update_id <= self.last:
+            return
+        heapq.heappush(self._done, update_id)
+        floor = min(self._in_flight) if self._in_flight else None
+        while self._done and (floor is None or self._done[0] < floor):
+            self.last = heapq.heappop(self._done)
+
+    def flush(self) -> bool:
+        """Ghi `last` xuống SQLite nếu đã đổi, trả về True nếu có ghi"""
+        last = self.last
+        if last is None or last == self._saved:
+            return False
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO update_offset (id, update_id) VALUES (0, ?)", (last,)
+            )
+        self._saved = last
+        return True
+
+
+class CatchUp:
+    """Xử lý các update dồn lại trong lúc bot ngừng, trước khi bắt đầu polling.
+
+    Backlog được lấy theo lô lớn và chạy qua các handler như bình thường,
+    nhưng giờ chấm công lấy theo `message.date` (lúc nhân viên bấm) thay vì
+    lúc xử lý. Tin trả lời cho nhân viên được gom lại, mỗi chat nhận một tin
+    qua hàng đợi gửi tin khi xử lý xong.
+    """
+
+    def __init__(self, offset: Optional[UpdateOffset] = None, batch: int = CATCH_UP_BATCH,
+                 max_age: int = CATCH_UP_MAX_AGE):
+        self.offset = offset or get_update_offset()
+        self.batch = batch
+        self.max_age = timedelta(minutes=max_age)
+        self.active = False
+        self._replies: Dict[int, List[str]] = defaultdict(list)
+
+    def event_time(self, update: Update) -> datetime:
+        """Thời điểm của thao tác: lúc gửi tin khi đang xử lý backlog, còn lại là bây giờ"""
+        if self.active and update.effective_message is not None:
+            return update.effective_message.date.astimezone(VN_TIMEZONE)
+        return datetime.now(VN_TIMEZONE)
+
+    def collect(self, chat_id: int, text: str) -> bool:
+        """Giữ lại tin trả lời khi đang xử lý backlog; False nếu cần gửi ngay"""
+        if not self.active:
+            return False
+        self._replies[chat_id].append(text)
+        return True
+
+    async def run(self, application: Application) -> int:
+        """Lấy và xử lý toàn bộ backlog, trả về số update đã xử lý"""
+        bot = application.bot
+        next_offset = self.offset.last + 1 if self.offset.last is not None else None
+        oldest = datetime.now(VN_TIMEZONE) - self.max_age
+        processed = skipped = 0
+        started = time.perf_counter()
+        # getUpdates không dùng được khi đang đặt webhook; update chờ vẫn được giữ lại
+        await bot.delete_webhook(drop_pending_updates=False)
+        self.active = True
+        try:
+            while True:
+                updates = await bot.get_updates(offset=next_offset, limit=self.batch, timeout=0,
+                                                allowed_updates=Update.ALL_TYPES)
+                if not updates:
+                    break
+                for update in updates:
+                    message = update.effective_message
+                    if message is not None and message.date < oldest:
+                        self.offset.complete(update.update_id)
+                        skipped += 1
+                        continue
+                    try:
+                        await application.process_update(update)
+                    finally:
+                        self.offset.complete(update.update_id)
+                    processed += 1
+                next_offset = updates[-1].update_id + 1
+        finally:
+            self.active = False
+            replies, self._replies = self._replies, defaultdict(list)
+            self.offset.flush()
+
+        for chat_id, texts in replies.items():
+            text = "⏳ Bot vừa khởi động lại, các thao tác của bạn lúc bot ngừng đã được ghi nhận:\n\n"
+            text += "\n\n".join(texts)
+            queue_report(chat_id, text, 'thao_tac_bu', key=f"catch_up:{next_offset}:{chat_id}",
+                         priority=PRIORITY_NORMAL)
+        if processed or skipped:
+            logger.info(
+                f"Đã xử lý bù {processed} update ({skipped} update quá cũ bị bỏ qua) "
+                f"trong {time.perf_counter() - started:.2f}s, trả lời {len(replies)} chat"
+            )
+        return processed
+
+
+_default_offset: Optional[UpdateOffset] = None
+
+
+def get_update_offset() -> UpdateOffset:
+    """Trả về update offset dùng chung (bộ xử lý update và xử lý bù)"""
+    global _default_offset
+    if _default_offset is None:
+        _default_offset = UpdateOffset()
+    return _default_offset
+
+
+_default_catch_up: Optional[CatchUp] = None
+
+
+def get_catch_up() -> CatchUp:
+    """Trả về bộ xử lý backlog dùng chung cho toàn ứng dụng"""
+    global _default_catch_up
+    if _default_catch_up is None:
+        _default_catch_up = CatchUp()
+    return _default_catch_up
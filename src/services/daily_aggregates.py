@@ -0,0 +1,219 @@
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from src.models import UserState
+from src.utils.config import VN_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+# Số ngày trước hôm nay được giữ trong bộ nhớ
+KEEP_DAYS = 7
+
+
+@dataclass
+class DayTotals:
+    """Tổng cộng dồn của một user trong một ngày (theo ngày bắt đầu ca)"""
+    user_id: str
+    user_name: str
+    work_seconds: int = 0
+    break_seconds: Dict[str, int] = field(default_factory=dict)
+    break_counts: Dict[str, int] = field(default_factory=dict)
+    violation_count: int = 0
+    # Ca đang mở
+    shift_start: Optional[datetime] = None
+    shift_break_seconds: int = 0
+    current_break: Optional[str] = None
+    break_start: Optional[datetime] = None
+
+    @property
+    def is_working(self) -> bool:
+        return self.shift_start is not None
+
+    @property
+    def total_break_seconds(self) -> int:
+        return sum(self.break_seconds.values())
+
+    @property
+    def total_break_count(self) -> int:
+        return sum(self.break_counts.values())
+
+    def live_work_seconds(self, now: datetime) -> int:
+        """Thời gian làm thực tế tính tới `now`, gồm cả ca đang mở"""
+        if self.shift_start is None:
+            return self.work_seconds
+        open_shift = int((now - self.shift_start).total_seconds()) - self.shift_break_seconds
+        return self.work_seconds + open_shift
+
+
+class DailyAggregates:
+    """Tổng theo user theo ngày, cập nhật O(1) ở mỗi lần bắt đầu/kết thúc nghỉ và ca.
+
+    Báo cáo /ts, /dr chỉ đọc các tổng này thay vì cộng lại breaks của mọi user.
+    """
+
+    def __init__(self):
+        self._days: Dict[date, Dict[str, DayTotals]] = {}
+        # user_id -> ngày của ca đang mở
+        self._open_days: Dict[str, date] = {}
+        # Tăng ở mỗi lần thay đổi ca/nghỉ, dùng làm khóa cho cache báo cáo
+        self.version = 0
+
+    def _totals(self, day: date, user_id: str, user_name: str) -> DayTotals:
+        users = self._days.setdefault(day, {})
+        totals = users.get(user_id)
+        if totals is None:
+            totals = users[user_id] = DayTotals(user_id=user_id, user_name=user_name)
+        else:
+            totals.user_name = user_name
+        return totals
+
+    def _open_totals(self, user_id: str) -> Optional[DayTotals]:
+        day = self._open_days.get(user_id)
+        if day is None:
+            return None
+        return self._days.get(day, {}).get(user_id)
+
+    def on_shift_start(self, user_id: str, user_name: str, start: datetime):
+        self.version += 1
+        totals = self._totals(start.date(), str(user_id), user_name)
+        totals.shift_start = start
+        totals.shift_break_seconds = 0
+        totals.current_break = None
+        totals.break_start = None
+        self._open_days[str(user_id)] = start.date()
+
+    def on_break_start(self, user_id: str, break_type: str, start: datetime):
+        self.version += 1
+        totals = self._open_totals(str(user_id))
+        if totals is None:
+            return
+        totals.break_counts[break_type] = totals.break_counts.get(break_type, 0) + 1
+        totals.current_break = break_type
+        totals.break_start = start
+
+    def on_break_end(self, user_id: str, break_type: str, duration: timedelta):
+        self.version += 1
+        totals = self._open_totals(str(user_id))
+        if totals is None:
+            return
+        seconds = int(duration.total_seconds())
+        totals.break_seconds[break_type] = totals.break_seconds.get(break_type, 0) + seconds
+        totals.shift_break_seconds += seconds
+        totals.current_break = None
+        totals.break_start = None
+
+    def on_shift_end(self, user_id: str, end: datetime):
+        self.version += 1
+        totals = self._open_totals(str(user_id))
+        self._open_days.pop(str(user_id), None)
+        if totals is None or totals.shift_start is None:
+            return
+        totals.work_seconds = totals.live_work_seconds(end)
+        totals.shift_start = None
+        totals.shift_break_seconds = 0
+
+    def on_violation(self, user_id: str, user_name: str, when: datetime):
+        self.version += 1
+        day = self._open_days.get(str(user_id), when.date())
+        self._totals(day, str(user_id), user_name).violation_count += 1
+
+    def day(self, day: Optional[date] = None) -> List[DayTotals]:
+        """Các tổng của một ngày (mặc định hôm nay)"""
+        if day is None:
+            day = datetime.now(VN_TIMEZONE).date()
+        return list(self._days.get(day, {}).values())
+
+    def clear(self):
+        self.version += 1
+        self._days.clear()
+        self._open_days.clear()
+
+    def prune(self, keep_days: int = KEEP_DAYS):
+        """Bỏ các ngày cũ để giới hạn bộ nhớ"""
+        cutoff = datetime.now(VN_TIMEZONE).date() - timedelta(days=keep_days)
+        open_days = set(self._open_days.values())
+        for day in [d for d in self._days if d < cutoff and d not in open_days]:
+            del self._days[day]
+
+    def rebuild(self, user_states: Dict[str, UserState], ledger, violation_log=None,
+                days: int = KEEP_DAYS):
+        """Dựng lại các tổng lúc khởi động từ sổ ca, các ca đang mở và nhật ký vi phạm.
+
+        Dựng lại đủ `days` ngày (bằng cửa sổ của `prune`) để báo cáo ngày hôm
+        qua gửi sau nửa đêm vẫn đúng dù bot vừa khởi động lại.
+        """
+        self.clear()
+        today = datetime.now(VN_TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+        # Cùng mốc với `prune`: giữ các ngày từ hôm nay - `days`
+        first = today - timedelta(days=days)
+        for offset in range(days + 1):
+            start = first + timedelta(days=offset)
+            for row in ledger.aggregate(start, start + timedelta(days=1)).values():
+                totals = self._totals(start.date(), str(row.user_id), row.user_name)
+                totals.work_seconds = row.work_seconds
+                totals.break_seconds = dict(row.break_seconds_by_type)
+                totals.break_counts = dict(row.break_counts_by_type)
+
+        for user_id, state in user_states.items():
+            if not state.is_working or not state.start_time:
+                continue
+            totals = self._totals(state.start_time.date(), str(user_id), state.user_name)
+            totals.shift_start = state.start_time
+            totals.shift_break_seconds = 0
+            for break_type, duration in state.breaks.items():
+                seconds = int(duration.total_seconds())
+                totals.break_seconds[break_type] = totals.break_seconds.get(break_type, 0) + seconds
+                totals.shift_break_seconds += seconds
+            for break_type, count in state.break_counts.items():
+                totals.break_counts[break_type] = totals.break_counts.get(break_type, 0) + count
+            totals.current_break = state.current_break
+            totals.break_start = state.break_start_time
+            self._open_days[str(user_id)] = state.start_time.date()
+
+        if violation_log is not None:
+            self._rebuild_violations(user_states, ledger, violation_log, first, today)
+
+    def _rebuild_violations(self, user_states: Dict[str, UserState], ledger, violation_log,
+                            first: datetime, today: datetime):
+        """Đếm lại vi phạm theo ngày của ca chứa vi phạm, như `on_violation` lúc chạy"""
+        # Nhật ký vi phạm chỉ có tên: tìm user_id và các ca theo tên
+        shifts: Dict[str, List[Tuple[str, datetime, Optional[datetime]]]] = {}
+        # Lấy thêm các ca bắt đầu hôm trước cửa sổ nhưng kết thúc trong cửa sổ
+        for user_id, user_name, start_ts, end_ts in ledger.shifts(first - timedelta(days=1),
+                                                                  today + timedelta(days=1)):
+            shifts.setdefault(user_name, []).append((
+                str(user_id),
+                datetime.fromtimestamp(start_ts, VN_TIMEZONE),
+                datetime.fromtimestamp(end_ts, VN_TIMEZONE)
+            ))
+        for user_id, state in user_states.items():
+            if state.is_working and state.start_time:
+                shifts.setdefault(state.user_name, []).append((str(user_id), state.start_time, None))
+
+        unresolved = 0
+        for user_name, _, when, _, _ in violation_log.iter_range(first.date(), today.date()):
+            user_shifts = shifts.get(user_name)
+            if not user_shifts:
+                unresolved += 1
+                continue
+            user_id, day = user_shifts[-1][0], when.date()
+            for shift_user_id, start, end in user_shifts:
+                if start <= when and (end is None or when <= end):
+                    user_id, day = shift_user_id, start.date()
+                    break
+            self._totals(day, user_id, user_name).violation_count += 1
+        if unresolved:
+            logger.debug(f"Bỏ qua {unresolved} vi phạm không tìm được ca khi dựng lại tổng theo ngày")
+
+
+_default_aggregates: Optional[DailyAggregates] = None
+
+
+def get_daily_aggregates() -> DailyAggregates:
+    """Trả về DailyAggregates dùng chung cho toàn ứng dụng"""
+    global _default_aggregates
+    if _default_aggregates is None:
+        _default_aggregates = DailyAggregates()
+    return _default_aggregates
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from telegram.error import RetryAfter
+
+from src.utils.config import (
+    DISPATCH_GLOBAL_RATE,
+    DISPATCH_PER_CHAT_RATE,
+    DISPATCH_MAX_RETRIES
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Giới hạn tốc độ kiểu token bucket: `rate` lần/giây, dồn tối đa `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Dispatcher:
+    """Gửi tin ra ngoài song song, trong giới hạn tốc độ của Telegram.
+
+    Mọi lần gọi Bot API đi qua một bucket chung cho cả bot và một bucket
+    riêng cho từng chat. Lỗi RetryAfter được chờ đúng thời gian yêu cầu rồi
+    gửi lại.
+    """
+
+    def __init__(self, global_rate: float = DISPATCH_GLOBAL_RATE,
+                 per_chat_rate: float = DISPATCH_PER_CHAT_RATE,
+                 max_retries: int = DISPATCH_MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate)
+        return bucket
+
+    async def call(self, target, method: Callable[..., Awaitable], /, *args, **kwargs) -> Any:
+        """Gọi một hàm Bot API gửi tới chat `target`, có giới hạn tốc độ và tự thử lại"""
+        attempt = 0
+        while True:
+            await self._chat_bucket(target).acquire()
+            await self.global_bucket.acquire()
+            try:
+                return await method(*args, **kwargs)
+            except RetryAfter as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                logger.warning(f"Telegram yêu cầu chờ {delay}s trước khi gửi tới {target}")
+                await asyncio.sleep(delay)
+
+    async def send_message(self, bot, chat_id, text: str, **kwargs):
+        return await self.call(chat_id, bot.send_message, chat_id=chat_id, text=text, **kwargs)
+
+
+_default_dispatcher: Optional[Dispatcher] = None
+
+
+def get_dispatcher() -> Dispatcher:
+    """Trả về Dispatcher dùng chung cho toàn ứng dụng"""
+    global _default_dispatcher
+    if _default_dispatcher is None:
+        _default_dispatcher = Dispatcher()
+    return _default_dispatcher
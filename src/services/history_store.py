@@ -0,0 +1,155 @@
+import json
+import logging
+import sqlite3
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cấu hình base directory
+BASE_DIR = Path(__file__).parent.parent.parent
+ATTENDANCE_DB = BASE_DIR / 'attendance.db'
+
+# Các hành động ghi vào lịch sử chấm công
+ACTION_START_SHIFT = 'Lên ca'
+ACTION_END_SHIFT = 'Xuống ca'
+ACTION_BREAK_START = 'Nghỉ'
+ACTION_BREAK_END = 'Trở lại'
+
+
+class HistoryEntry(NamedTuple):
+    date: str
+    user_id: int
+    user_name: str
+    action: str
+    timestamp: str
+    break_type: Optional[str] = None
+
+
+class HistoryStore:
+    """Lịch sử chấm công trong SQLite, phân vùng theo ngày.
+
+    Mỗi hành động là một dòng, có index trên (date, user_id) nên ghi thêm
+    là O(1) và đọc một ngày hoặc một khoảng ngày không phải đọc toàn bộ
+    lịch sử.
+    """
+
+    def __init__(self, db_path: Path = ATTENDANCE_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS attendance_history ("
+            "id INTEGER PRIMARY KEY, date TEXT NOT NULL, user_id INTEGER NOT NULL, "
+            "user_name TEXT, action TEXT NOT NULL, timestamp TEXT NOT NULL, break_type TEXT)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_attendance_history_date_user "
+            "ON attendance_history (date, user_id)"
+        )
+        self._conn.commit()
+
+    def append(self, user_id: int, user_name: str, action: str, when: datetime,
+               break_type: Optional[str] = None):
+        """Ghi thêm một hành động"""
+        self.append_many([(user_id, user_name, action, when, break_type)])
+
+    def append_many(self, entries: Iterable[Tuple[int, str, str, datetime, Optional[str]]]):
+        """Ghi nhiều hành động (user_id, user_name, action, when, break_type) trong một transaction"""
+        rows = [
+            (when.strftime('%Y-%m-%d'), int(user_id), user_name, action,
+             when.strftime('%H:%M:%S'), break_type)
+            for user_id, user_name, action, when, break_type in entries
+        ]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO attendance_history "
+                "(date, user_id, user_name, action, timestamp, break_type) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def iter_day(self, day: date, user_id: Optional[int] = None) -> Iterator[HistoryEntry]:
+        """Đọc lần lượt các hành động trong một ngày"""
+        return self.iter_range(day, day, user_id)
+
+    def iter_range(self, start: date, end: date,
+                   user_id: Optional[int] = None) -> Iterator[HistoryEntry]:
+        """Đọc lần lượt các hành động từ ngày `start` tới `end` (tính cả hai đầu)"""
+        query = ("SELECT date, user_id, user_name, action, timestamp, break_type "
+                 "FROM attendance_history WHERE date BETWEEN ? AND ?")
+        params = [start.isoformat(), end.isoformat()]
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(int(user_id))
+        query += " ORDER BY date, id"
+        # Cursor riêng để đọc dần từng dòng, không nạp cả khoảng vào bộ nhớ
+        cursor = self._conn.cursor()
+        with self._lock:
+            cursor.execute(query, params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(500)
+            if not rows:
+                return
+            for row in rows:
+                yield HistoryEntry(*row)
+
+    def days(self) -> list:
+        """Danh sách các ngày có dữ liệu"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT date FROM attendance_history ORDER BY date"
+            )]
+
+    def clear(self):
+        """Xóa toàn bộ lịch sử chấm công"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM attendance_history")
+
+    def migrate_json(self, json_path: Path) -> int:
+        """Chuyển file attendance_history.json cũ (dict theo ngày) vào bảng.
+
+        Chỉ chạy một lần: sau khi chuyển, file được đổi tên thành
+        `*.json.migrated`. Trả về số dòng đã chuyển.
+        """
+        if not json_path.exists():
+            return 0
+        with open(json_path, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+
+        rows = [
+            (day, int(entry['user_id']), entry.get('user_name'), entry['action'],
+             entry['timestamp'], entry.get('break_type'))
+            for day, entries in sorted(history.items())
+            for entry in entries
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO attendance_history "
+                "(date, user_id, user_name, action, timestamp, break_type) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        json_path.rename(json_path.with_name(json_path.name + '.migrated'))
+        logger.info(f"Đã chuyển {len(rows)} dòng lịch sử từ {json_path.name}")
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_store: Optional[HistoryStore] = None
+
+
+def get_history_store() -> HistoryStore:
+    """Trả về HistoryStore dùng chung cho toàn ứng dụng"""
+    global _default_store
+    if _default_store is None:
+        _default_store = HistoryStore()
+    return _default_store
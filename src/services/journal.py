@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+from src.models import UserState
+
+logger = logging.getLogger(__name__)
+
+# Cấu hình base directory
+BASE_DIR = Path(__file__).parent.parent.parent
+JOURNAL_FILE = BASE_DIR / 'data' / 'journal.jsonl'
+
+# Các loại sự kiện ghi vào journal
+EVENT_START_SHIFT = 'start_shift'
+EVENT_END_SHIFT = 'end_shift'
+EVENT_BREAK_START = 'break_start'
+EVENT_BREAK_END = 'break_end'
+EVENT_AUTO_END_SHIFT = 'auto_end_shift'
+EVENT_ADMIN_START_SHIFT = 'admin_start_shift'
+EVENT_ADMIN_END_SHIFT = 'admin_end_shift'
+EVENT_ADMIN_BREAK_START = 'admin_break_start'
+EVENT_ADMIN_BREAK_END = 'admin_break_end'
+EVENT_ADMIN_RESET = 'admin_reset'
+
+
+class EventJournal:
+    """Journal chỉ ghi nối (append-only) các thay đổi trạng thái.
+
+    Mỗi dòng là một bản ghi JSON gồm số thứ tự, loại sự kiện và trạng thái
+    của user sau sự kiện. fsync được gom theo lô: tối đa `sync_batch` bản
+    ghi hoặc `sync_interval` giây mới fsync một lần.
+    """
+
+    def __init__(self, path: Path = JOURNAL_FILE,
+                 sync_interval: float = 1.0, sync_batch: int = 50):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.sync_batch = sync_batch
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.last_seq = max((seq for seq, _, _, _ in self.replay()), default=0)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if self._file.tell() and not self._ends_with_newline():
+            # Kết thúc dòng ghi dở để bản ghi mới không dính vào dòng hỏng
+            self._file.write('\n')
+            self._file.flush()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, event: str, user_id: str, state: UserState) -> int:
+        """Ghi một sự kiện, trả về số thứ tự của bản ghi"""
+        return self.append_records([(event, user_id, state.to_dict())])
+
+    def append_many(self, event: str, items: List[Tuple[str, UserState]]) -> int:
+        """Ghi nhiều bản ghi cùng loại sự kiện trong một lần write"""
+        return self.append_records([(event, user_id, state.to_dict()) for user_id, state in items])
+
+    def append_records(self, records: List[Tuple[str, str, dict]]) -> int:
+        """Ghi các bản ghi (sự kiện, user_id, trạng thái dạng dict) trong một lần write"""
+        if not records:
+            return self.last_seq
+        with self._lock:
+            lines = []
+            now = datetime.now().isoformat()
+            for event, user_id, data in records:
+                self.last_seq += 1
+                lines.append(json.dumps({
+                    'seq': self.last_seq,
+                    'ts': now,
+                    'event': event,
+                    'user_id': str(user_id),
+                    'state': data
+                }, ensure_ascii=False) + '\n')
+            self._file.write(''.join(lines))
+            self._file.flush()
+            self._pending += len(records)
+            if (self._pending >= self.sync_batch or
+                    time.monotonic() - self._last_sync >= self.sync_interval):
+                self._sync_locked()
+            return self.last_seq
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def sync(self):
+        """fsync các bản ghi chưa được đồng bộ xuống đĩa"""
+        with self._lock:
+            if self._pending:
+                self._sync_locked()
+
+    def _sync_locked(self):
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def _records(self) -> Iterator[Tuple[dict, str]]:
+        """Đọc từng bản ghi hợp lệ kèm dòng gốc trong file"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Dòng cuối có thể bị ghi dở khi crash
+                    logger.warning(f"Bỏ qua bản ghi journal hỏng: {line[:80]!r}")
+                    continue
+                yield record, line if line.endswith('\n') else line + '\n'
+
+    def replay(self, after_seq: int = 0) -> Iterator[Tuple[int, str, str, dict]]:
+        """Đọc lại các bản ghi có số thứ tự lớn hơn `after_seq`"""
+        for record, _ in self._records():
+            if record['seq'] > after_seq:
+                yield record['seq'], record['event'], record['user_id'], record['state']
+
+    def truncate(self, upto_seq: int):
+        """Xóa các bản ghi đã được gộp vào snapshot"""
+        with self._lock:
+            if upto_seq < self.last_seq:
+                # Vẫn còn bản ghi mới hơn snapshot, giữ nguyên các dòng đuôi (kể cả `ts`)
+                tail = [line for record, line in self._records() if record['seq'] > upto_seq]
+            else:
+                tail = []
+            self._file.close()
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(''.join(tail))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._pending = 0
+
+    def close(self):
+        with self._lock:
+            if self._pending:
+                self._sync_locked()
+            self._file.close()
@@ -0,0 +1,331 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from telegram.error import BadRequest, Forbidden
+
+from src.services.dispatcher import get_dispatcher
+from src.services.history_store import ATTENDANCE_DB
+from src.utils.config import (
+    OUTBOX_WORKERS,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_BACKOFF_BASE,
+    OUTBOX_BACKOFF_MAX,
+    OUTBOX_SENT_RETENTION_DAYS
+)
+
+logger = logging.getLogger(__name__)
+
+# Độ ưu tiên: số nhỏ gửi trước
+PRIORITY_HIGH = 0      # Vi phạm, cảnh báo quá giờ
+PRIORITY_NORMAL = 1    # Thông báo cho nhân viên
+PRIORITY_LOW = 2       # Báo cáo
+
+STATUS_PENDING = 'pending'
+STATUS_SENT = 'sent'
+
+# Lỗi không thể tự hết khi gửi lại (bị chặn, chat không tồn tại, nội dung sai)
+PERMANENT_ERRORS = (Forbidden, BadRequest)
+
+# Số tin chờ tối đa xét mỗi lần chọn tin để gửi
+CLAIM_SCAN_LIMIT = 500
+
+
+class Outbox:
+    """Hàng đợi tin gửi đi lưu trong SQLite.
+
+    Dùng cho tin gửi nền, không phải trả lời trực tiếp một thao tác: thông
+    báo vi phạm, cảnh báo quá giờ, báo cáo định kỳ, thông báo thao tác bù.
+    Nơi gửi chỉ ghi tin vào hàng đợi rồi trả về ngay; một nhóm worker chạy
+    nền lấy tin theo độ ưu tiên và gửi qua dispatcher. Tin lỗi được gửi
+    lại với thời gian chờ tăng dần, quá số lần cho phép (hoặc lỗi vĩnh viễn)
+    thì chuyển sang bảng `outbox_dead` để admin xem và gửi lại.
+
+    Tin có `key` chỉ được nhận một lần: ghi lại cùng key (job chạy lại sau
+    khi khởi động lại bot...) không tạo tin mới. Tin của cùng một chat được
+    gửi đúng thứ tự, mỗi lúc chỉ một tin.
+
+    Trả lời lệnh và nút bấm (`reply_text`, `edit_message_text`, `reply_report`)
+    không đi qua hàng đợi: người dùng đang chờ nên gửi ngay, tin lỗi (trừ
+    RetryAfter do dispatcher xử lý) không được gửi lại và không vào dead-letter.
+    """
+
+    def __init__(self, db_path: Path = ATTENDANCE_DB, workers: int = OUTBOX_WORKERS,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS, backoff_base: float = OUTBOX_BACKOFF_BASE,
+                 backoff_max: float = OUTBOX_BACKOFF_MAX):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY, key TEXT UNIQUE, chat_id INTEGER NOT NULL, "
+            "method TEXT NOT NULL, payload TEXT NOT NULL, priority INTEGER NOT NULL, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt REAL NOT NULL, created REAL NOT NULL, last_error TEXT)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (status, priority, id)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox_dead ("
+            "id INTEGER PRIMARY KEY, key TEXT, chat_id INTEGER NOT NULL, "
+            "method TEXT NOT NULL, payload TEXT NOT NULL, priority INTEGER NOT NULL, "
+            "attempts INTEGER NOT NULL, created REAL NOT NULL, failed REAL NOT NULL, "
+            "last_error TEXT)"
+        )
+        self._conn.commit()
+
+        self._bot = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._busy_chats: Set[int] = set()
+        self._next_due: Optional[float] = None
+
+    # Ghi tin
+
+    def enqueue(self, chat_id: int, text: Optional[str] = None, *, method: str = 'send_message',
+                priority: int = PRIORITY_NORMAL, key: Optional[str] = None, **kwargs) -> bool:
+        """Thêm một tin vào hàng đợi.
+
+        `kwargs` là tham số của hàm Bot API (`parse_mode`, `document`...);
+        với `send_document`, `document` là chuỗi, được mã hóa UTF-8 khi gửi.
+        Trả về False nếu `key` đã có trong hàng đợi.
+        """
+        payload = dict(kwargs)
+        if text is not None:
+            payload['text'] = text
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox "
+                "(key, chat_id, method, payload, priority, status, next_attempt, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, int(chat_id), method, json.dumps(payload, ensure_ascii=False),
+                 priority, STATUS_PENDING, now, now)
+            )
+        if not cursor.rowcount:
+            logger.debug(f"Bỏ qua tin trùng key {key}")
+            return False
+        self._wake()
+        return True
+
+    def enqueue_many(self, chat_ids, text: str, **kwargs) -> int:
+        """Gửi cùng một tin tới nhiều chat; key (nếu có) được thêm chat_id"""
+        key = kwargs.pop('key', None)
+        return sum(
+            self.enqueue(chat_id, text, key=f"{key}:{chat_id}" if key else None, **kwargs)
+            for chat_id in chat_ids
+        )
+
+    # Worker
+
+    def start(self, bot):
+        """Khởi động các worker gửi tin (gọi trong event loop của bot)"""
+        if self._tasks:
+            return
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"outbox-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Hàng đợi gửi tin: {self.workers} worker, {self.pending_count()} tin đang chờ")
+
+    async def stop(self):
+        """Dừng các worker; tin chưa gửi vẫn nằm trong hàng đợi cho lần chạy sau"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._busy_chats.clear()
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self, index: int):
+        while True:
+            self._wakeup.clear()
+            row = self._claim()
+            if row is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._idle_timeout())
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._deliver(row)
+            except Exception as e:
+                logger.error(f"Worker gửi tin {index} lỗi với tin {row[0]}: {e}")
+            finally:
+                self._busy_chats.discard(row[1])
+                self._wake()
+
+    def _claim(self) -> Optional[tuple]:
+        """Chọn tin tiếp theo: ưu tiên cao trước, giữ thứ tự trong từng chat"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, chat_id, method, payload, attempts, next_attempt FROM outbox "
+                "WHERE status = ? ORDER BY priority, id LIMIT ?",
+                (STATUS_PENDING, CLAIM_SCAN_LIMIT)
+            ).fetchall()
+        blocked = set(self._busy_chats)
+        self._next_due = None
+        for row in rows:
+            chat_id, next_attempt = row[1], row[5]
+            if chat_id in blocked:
+                continue
+            if next_attempt > now:
+                # Tin đang chờ gửi lại chặn các tin sau nó của cùng chat
+                blocked.add(chat_id)
+                if self._next_due is None or next_attempt < self._next_due:
+                    self._next_due = next_attempt
+                continue
+            self._busy_chats.add(chat_id)
+            return row[:5]
+        return None
+
+    def _idle_timeout(self) -> float:
+        """Thời gian ngủ tới lần gửi lại gần nhất.
+
+        Tin đang chờ chat bận không cần hẹn giờ: worker gửi xong sẽ đánh thức.
+        """
+        if self._next_due is None:
+            return self.backoff_max
+        return min(self.backoff_max, max(0.0, self._next_due - time.time()))
+
+    async def _deliver(self, row: tuple):
+        message_id, chat_id, method, payload, attempts = row
+        kwargs = json.loads(payload)
+        if method == 'send_document' and isinstance(kwargs.get('document'), str):
+            kwargs['document'] = kwargs['document'].encode('utf-8')
+        try:
+            await get_dispatcher().call(chat_id, getattr(self._bot, method), chat_id=chat_id, **kwargs)
+        except PERMANENT_ERRORS as e:
+            logger.warning(f"Không thể gửi tin {message_id} tới {chat_id}: {e}")
+            self._bury(message_id, attempts + 1, str(e))
+        except Exception as e:
+            attempts += 1
+            if attempts >= self.max_attempts:
+                logger.error(f"Tin {message_id} tới {chat_id} lỗi {attempts} lần, chuyển sang dead-letter: {e}")
+                self._bury(message_id, attempts, str(e))
+            else:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+                logger.warning(f"Gửi tin {message_id} tới {chat_id} lỗi ({e}), thử lại sau {delay:.0f}s")
+                with self._lock, self._conn:
+                    self._conn.execute(
+                        "UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                        (attempts, time.time() + delay, str(e), message_id)
+                    )
+        else:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, payload = '{}' WHERE id = ?",
+                    (STATUS_SENT, attempts + 1, message_id)
+                )
+
+    def _bury(self, message_id: int, attempts: int, error: str):
+        """Chuyển tin sang bảng dead-letter"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO outbox_dead "
+                "(key, chat_id, method, payload, priority, attempts, created, failed, last_error) "
+                "SELECT key, chat_id, method, payload, priority, ?, created, ?, ? FROM outbox WHERE id = ?",
+                (attempts, time.time(), error, message_id)
+            )
+            self._conn.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+
+    # Quản trị
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status = ?", (STATUS_PENDING,)
+            ).fetchone()[0]
+
+    def dead_letters(self, limit: int = 20) -> List[Dict]:
+        """Các tin gửi lỗi gần nhất"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, key, chat_id, method, payload, attempts, failed, last_error "
+                "FROM outbox_dead ORDER BY id DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        letters = []
+        for dead_id, key, chat_id, method, payload, attempts, failed, error in rows:
+            payload = json.loads(payload)
+            letters.append({
+                'id': dead_id,
+                'key': key,
+                'chat_id': chat_id,
+                'method': method,
+                'text': payload.get('text') or payload.get('caption') or '',
+                'attempts': attempts,
+                'failed': failed,
+                'error': error,
+            })
+        return letters
+
+    def dead_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox_dead").fetchone()[0]
+
+    def requeue_dead(self, dead_id: Optional[int] = None) -> int:
+        """Đưa tin dead-letter (một tin hoặc tất cả) trở lại hàng đợi"""
+        where, params = ("WHERE id = ?", (dead_id,)) if dead_id is not None else ("", ())
+        now = time.time()
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                f"SELECT id, key, chat_id, method, payload, priority, created FROM outbox_dead {where}",
+                params
+            ).fetchall()
+            for _, key, chat_id, method, payload, priority, created in rows:
+                # Nếu đã có tin mới cùng key thì giữ tin mới
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO outbox "
+                    "(key, chat_id, method, payload, priority, status, next_attempt, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, chat_id, method, payload, priority, STATUS_PENDING, now, created)
+                )
+            self._conn.executemany("DELETE FROM outbox_dead WHERE id = ?", [(row[0],) for row in rows])
+        if rows:
+            self._wake()
+        return len(rows)
+
+    def prune(self, keep_days: int = OUTBOX_SENT_RETENTION_DAYS) -> int:
+        """Xóa các tin đã gửi cũ (chỉ còn giữ key để chống trùng)"""
+        cutoff = time.time() - keep_days * 86400
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM outbox WHERE status = ? AND created < ?", (STATUS_SENT, cutoff)
+            )
+        return cursor.rowcount
+
+    def clear(self):
+        """Xóa toàn bộ hàng đợi và dead-letter"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM outbox")
+            self._conn.execute("DELETE FROM outbox_dead")
+
+
+_default_outbox: Optional[Outbox] = None
+
+
+def get_outbox() -> Outbox:
+    """Trả về hàng đợi gửi tin dùng chung cho toàn ứng dụng"""
+    global _default_outbox
+    if _default_outbox is None:
+        _default_outbox = Outbox()
+    return _default_outbox
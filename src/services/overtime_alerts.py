@@ -0,0 +1,121 @@
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from src.services.history_store import ATTENDANCE_DB
+from src.utils.config import (
+    OVERTIME_REMINDER_AFTER,
+    OVERTIME_ESCALATE_AFTER,
+    OVERTIME_FINAL_AFTER
+)
+
+logger = logging.getLogger(__name__)
+
+# Các mức cảnh báo nghỉ quá giờ, gửi lần lượt và mỗi mức đúng một lần
+LEVEL_NONE = 0
+LEVEL_WARNING = 1      # Hết giờ nghỉ: nhắc nhân viên
+LEVEL_REMINDER = 2     # Nhắc lại nhân viên
+LEVEL_ESCALATED = 3    # Báo admin
+LEVEL_FINAL = 4        # Thông báo cuối cho nhân viên và admin
+
+# Số phút sau khi hết giờ nghỉ thì tới mỗi mức
+DEFAULT_OFFSETS = {
+    LEVEL_WARNING: 0,
+    LEVEL_REMINDER: OVERTIME_REMINDER_AFTER,
+    LEVEL_ESCALATED: OVERTIME_ESCALATE_AFTER,
+    LEVEL_FINAL: OVERTIME_FINAL_AFTER,
+}
+
+
+class OvertimeAlerts:
+    """Máy trạng thái cảnh báo nghỉ quá giờ cho từng lần nghỉ.
+
+    Mức đã gửi được giữ trong bộ nhớ và ghi xuống SQLite, nên khởi động lại
+    giữa chừng cũng không gửi lại một mức đã gửi.
+    """
+
+    def __init__(self, db_path: Path = ATTENDANCE_DB, offsets: Optional[Dict[int, int]] = None):
+        self.db_path = db_path
+        self.offsets = dict(offsets or DEFAULT_OFFSETS)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS overtime_alerts ("
+            "user_id INTEGER PRIMARY KEY, break_start INTEGER NOT NULL, level INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+        # user_id -> (thời điểm bắt đầu nghỉ, mức đã gửi)
+        self._levels: Dict[str, Tuple[int, int]] = {
+            str(user_id): (break_start, level)
+            for user_id, break_start, level in self._conn.execute(
+                "SELECT user_id, break_start, level FROM overtime_alerts"
+            )
+        }
+
+    def sent_level(self, user_id: str, break_start: datetime) -> int:
+        """Mức cao nhất đã gửi cho lần nghỉ bắt đầu lúc `break_start`"""
+        entry = self._levels.get(str(user_id))
+        if entry is None or entry[0] != int(break_start.timestamp()):
+            return LEVEL_NONE
+        return entry[1]
+
+    def due_at(self, deadline: datetime, level: int) -> datetime:
+        return deadline + timedelta(minutes=self.offsets[level])
+
+    def due_level(self, user_id: str, break_start: datetime, deadline: datetime,
+                  now: datetime) -> Optional[int]:
+        """Mức cần gửi bây giờ, None nếu chưa tới mức tiếp theo.
+
+        Nếu đã trễ qua nhiều mức (vd. bot vừa khởi động lại) thì chỉ gửi mức
+        cao nhất, các mức thấp hơn coi như đã qua.
+        """
+        sent = self.sent_level(user_id, break_start)
+        due = None
+        for level in range(sent + 1, LEVEL_FINAL + 1):
+            if self.due_at(deadline, level) <= now:
+                due = level
+        return due
+
+    def next_due(self, user_id: str, break_start: datetime,
+                 deadline: datetime) -> Optional[datetime]:
+        """Thời điểm của mức tiếp theo, None nếu đã gửi mức cuối"""
+        sent = self.sent_level(user_id, break_start)
+        if sent >= LEVEL_FINAL:
+            return None
+        return self.due_at(deadline, sent + 1)
+
+    def mark_sent(self, user_id: str, break_start: datetime, level: int):
+        """Ghi nhận đã gửi mức `level`"""
+        start_ts = int(break_start.timestamp())
+        self._levels[str(user_id)] = (start_ts, level)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO overtime_alerts (user_id, break_start, level) VALUES (?, ?, ?)",
+                (int(user_id), start_ts, level)
+            )
+
+    def clear(self):
+        """Xóa toàn bộ trạng thái cảnh báo"""
+        self._levels.clear()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM overtime_alerts")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_alerts: Optional[OvertimeAlerts] = None
+
+
+def get_overtime_alerts() -> OvertimeAlerts:
+    """Trả về OvertimeAlerts dùng chung cho toàn ứng dụng"""
+    global _default_alerts
+    if _default_alerts is None:
+        _default_alerts = OvertimeAlerts()
+    return _default_alerts
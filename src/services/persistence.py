@@ -0,0 +1,189 @@
+import logging
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from src.models import UserState
+from src.services.journal import EventJournal
+from src.services.state_store import StateStore, get_state_store
+from src.utils.config import (
+    JOURNAL_SYNC_BATCH,
+    JOURNAL_SYNC_INTERVAL,
+    PERSISTENCE_QUEUE_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+# Các loại việc trong hàng đợi của worker
+_TASK_RECORDS = 'records'
+_TASK_CHECKPOINT = 'checkpoint'
+_TASK_STOP = 'stop'
+
+
+class StatePersistence:
+    """Ghép journal (ghi từng sự kiện) với snapshot trong StateStore.
+
+    Mỗi sự kiện chỉ tốn một lần ghi nối vào journal. `checkpoint` định kỳ
+    gộp trạng thái vào StateStore rồi cắt ngắn journal; lúc khởi động
+    `load` đọc snapshot và replay phần đuôi journal.
+
+    Việc ghi đĩa do một thread nền đảm nhận: handler chỉ chụp trạng thái
+    thành dict và đưa vào hàng đợi có giới hạn, thread nền gom các sự kiện
+    đến dồn dập thành một lần ghi.
+    """
+
+    def __init__(self, store: StateStore, journal: EventJournal,
+                 queue_size: int = 10000):
+        self.store = store
+        self.journal = journal
+        self._snapshot_seq = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Khởi động thread ghi nền"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='state-persistence', daemon=True)
+            self._thread.start()
+
+    def record(self, event: str, user_id: str, state: UserState):
+        """Ghi nhận thay đổi trạng thái của một user"""
+        state.mark_dirty()
+        self._submit((_TASK_RECORDS, [(event, str(user_id), state.to_dict())]))
+
+    def record_many(self, event: str, user_states: Dict[str, UserState]):
+        """Ghi nhận thay đổi của nhiều user (thao tác hàng loạt của admin)"""
+        records = []
+        for user_id, state in user_states.items():
+            state.mark_dirty()
+            records.append((event, str(user_id), state.to_dict()))
+        if records:
+            self._submit((_TASK_RECORDS, records))
+
+    def sync(self):
+        """fsync các sự kiện đang chờ trong journal"""
+        self.journal.sync()
+
+    def checkpoint(self, user_states: Dict[str, UserState]) -> int:
+        """Gộp các trạng thái thay đổi vào snapshot và cắt ngắn journal.
+
+        Chỉ ghi các user có thay đổi; nếu không có gì thay đổi thì bỏ qua
+        hoàn toàn, không đụng tới đĩa. Trả về số user được đưa đi ghi.
+        """
+        # Chụp trạng thái ngay trên event loop, thread nền chỉ ghi bản chụp
+        dirty = [(user_id, state, state.version, state.to_dict())
+                 for user_id, state in user_states.items() if state.dirty]
+        if not dirty and self.journal.last_seq == self._snapshot_seq and self._queue.empty():
+            return 0
+        self._submit((_TASK_CHECKPOINT, dirty))
+        return len(dirty)
+
+    def load(self) -> Dict[str, UserState]:
+        """Đọc snapshot mới nhất và replay các sự kiện sau snapshot"""
+        states = self.store.load_all()
+        for state in states.values():
+            state.mark_clean()
+        snapshot_seq = self.store.get_journal_seq()
+        replayed = 0
+        for seq, event, user_id, data in self.journal.replay(snapshot_seq):
+            try:
+                # Trạng thái replay chưa có trong snapshot nên vẫn là dirty
+                states[user_id] = UserState.from_dict(data)
+                replayed += 1
+            except Exception as e:
+                logger.error(f"Lỗi khi replay sự kiện #{seq} ({event}): {e}")
+        # Journal đã bị cắt ngắn thì tiếp tục đánh số sau snapshot
+        self.journal.last_seq = max(self.journal.last_seq, snapshot_seq)
+        self._snapshot_seq = snapshot_seq
+        if replayed:
+            logger.info(f"Đã replay {replayed} sự kiện từ journal")
+        return states
+
+    def close(self):
+        """Ghi nốt hàng đợi, fsync journal và dừng thread nền"""
+        if self._thread is not None:
+            self._queue.put((_TASK_STOP, None))
+            self._thread.join()
+            self._thread = None
+        else:
+            self._drain_inline()
+        self.journal.close()
+
+    def _submit(self, task):
+        if self._thread is None:
+            # Chưa khởi động thread nền (script, migrate) thì ghi trực tiếp
+            self._process([task])
+            return
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            logger.warning("Hàng đợi ghi trạng thái đầy, chờ thread nền ghi xong")
+            self._queue.put(task)
+
+    def _drain_inline(self):
+        tasks = []
+        while not self._queue.empty():
+            tasks.append(self._queue.get_nowait())
+        self._process(tasks)
+
+    def _run(self):
+        while True:
+            try:
+                task = self._queue.get(timeout=self.journal.sync_interval)
+            except queue.Empty:
+                self._safe(self.journal.sync)
+                continue
+            # Gom mọi việc đang chờ để ghi một lần
+            tasks = [task]
+            while True:
+                try:
+                    tasks.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(kind == _TASK_STOP for kind, _ in tasks)
+            self._process([t for t in tasks if t[0] != _TASK_STOP])
+            if stop:
+                return
+
+    def _process(self, tasks: List[Tuple[str, object]]):
+        records = []
+        for kind, payload in tasks:
+            if kind == _TASK_RECORDS:
+                records.extend(payload)
+            elif kind == _TASK_CHECKPOINT:
+                # Ghi các sự kiện xếp trước checkpoint rồi mới tạo snapshot
+                self._safe(self.journal.append_records, records)
+                records = []
+                self._safe(self._write_checkpoint, payload)
+        self._safe(self.journal.append_records, records)
+
+    def _write_checkpoint(self, dirty):
+        seq = self.journal.last_seq
+        self.store.save_records(((user_id, data) for user_id, _, _, data in dirty),
+                                journal_seq=seq)
+        for _, state, version, _ in dirty:
+            state.mark_clean(version)
+        self.journal.truncate(seq)
+        self._snapshot_seq = seq
+        logger.debug(f"Đã tạo snapshot tới sự kiện #{seq} ({len(dirty)} user thay đổi)")
+
+    def _safe(self, func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"Lỗi khi ghi trạng thái: {e}")
+
+
+_default_persistence: Optional[StatePersistence] = None
+
+
+def get_persistence() -> StatePersistence:
+    """Trả về StatePersistence dùng chung cho toàn ứng dụng"""
+    global _default_persistence
+    if _default_persistence is None:
+        _default_persistence = StatePersistence(
+            get_state_store(),
+            EventJournal(sync_interval=JOURNAL_SYNC_INTERVAL, sync_batch=JOURNAL_SYNC_BATCH),
+            queue_size=PERSISTENCE_QUEUE_SIZE
+        )
+    return _default_persistence
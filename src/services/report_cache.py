@@ -0,0 +1,72 @@
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Hashable, List, Optional, Union
+
+from src.utils.config import VN_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+# Một đoạn báo cáo: chuỗi cố định, hoặc hàm nhận `now` trả về chuỗi
+# (dùng cho các thời lượng "đang làm"/"đang nghỉ" thay đổi theo giờ)
+Segment = Union[str, Callable[[datetime], str]]
+
+
+def render(segments: List[Segment], now: Optional[datetime] = None) -> str:
+    """Ghép các đoạn báo cáo, điền các giá trị sống theo `now`"""
+    now = now or datetime.now(VN_TIMEZONE)
+    return ''.join(s if isinstance(s, str) else s(now) for s in segments)
+
+
+class ReportCache:
+    """Cache báo cáo theo (loại báo cáo, khoảng ngày) và phiên bản trạng thái.
+
+    Phiên bản tăng ở mỗi lần lên/xuống ca, bắt đầu/kết thúc nghỉ, nên giữa
+    hai lần thay đổi trạng thái, gọi lại cùng báo cáo chỉ tốn một lần tra dict.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, List[Segment]] = {}
+        self._version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: int,
+            build: Callable[[], List[Segment]]) -> str:
+        """Trả về báo cáo đã render, chỉ dựng lại khi chưa có hoặc trạng thái đã đổi"""
+        if version != self._version:
+            # Trạng thái đã đổi: mọi báo cáo cũ đều hết hạn
+            self._entries.clear()
+            self._version = version
+
+        segments = self._entries.get(key)
+        if segments is None:
+            self.misses += 1
+            segments = self._entries[key] = build()
+        else:
+            self.hits += 1
+        return render(segments)
+
+    def invalidate(self):
+        """Bỏ toàn bộ báo cáo đã cache"""
+        self._entries.clear()
+        self._version = None
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+_default_cache: Optional[ReportCache] = None
+
+
+def get_report_cache() -> ReportCache:
+    """Trả về ReportCache dùng chung cho toàn ứng dụng"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ReportCache()
+    return _default_cache
@@ -0,0 +1,145 @@
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from src.models import UserState
+from src.services.history_store import ATTENDANCE_DB
+
+logger = logging.getLogger(__name__)
+
+
+class ShiftTotals(NamedTuple):
+    user_id: int
+    user_name: str
+    shifts: int
+    work_seconds: int
+    break_seconds: int
+    break_seconds_by_type: Dict[str, int]
+    break_counts_by_type: Dict[str, int]
+
+
+class ShiftLedger:
+    """Sổ ghi các ca đã kết thúc, mỗi ca một dòng.
+
+    Báo cáo tuần/tháng là phép tổng hợp theo khoảng thời gian trên cột
+    `start_ts` có index, không phụ thuộc trạng thái hiện tại của user.
+    """
+
+    def __init__(self, db_path: Path = ATTENDANCE_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS shift_ledger (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                user_name TEXT,
+                start_ts INTEGER NOT NULL,
+                end_ts INTEGER NOT NULL,
+                work_seconds INTEGER NOT NULL,
+                break_seconds INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_shift_ledger_start ON shift_ledger (start_ts);
+            CREATE INDEX IF NOT EXISTS idx_shift_ledger_user_start ON shift_ledger (user_id, start_ts);
+            CREATE TABLE IF NOT EXISTS shift_ledger_breaks (
+                shift_id INTEGER NOT NULL REFERENCES shift_ledger (id) ON DELETE CASCADE,
+                break_type TEXT NOT NULL,
+                seconds INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (shift_id, break_type)
+            );
+        """)
+        self._conn.commit()
+
+    def record_shift(self, user_id, state: UserState) -> Optional[int]:
+        """Ghi một ca vừa kết thúc, trả về id của ca"""
+        if not state.start_time or not state.end_time:
+            return None
+        break_seconds = {k: int(v.total_seconds()) for k, v in state.breaks.items()}
+        total_breaks = sum(break_seconds.values())
+        work_seconds = int((state.end_time - state.start_time).total_seconds()) - total_breaks
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO shift_ledger "
+                "(user_id, user_name, start_ts, end_ts, work_seconds, break_seconds) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (int(user_id), state.user_name, int(state.start_time.timestamp()),
+                 int(state.end_time.timestamp()), work_seconds, total_breaks)
+            )
+            shift_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO shift_ledger_breaks (shift_id, break_type, seconds, count) "
+                "VALUES (?, ?, ?, ?)",
+                [(shift_id, break_type, break_seconds.get(break_type, 0),
+                  state.break_counts.get(break_type, 0))
+                 for break_type in set(break_seconds) | set(state.break_counts)]
+            )
+        return shift_id
+
+    def aggregate(self, start: datetime, end: datetime,
+                  user_id: Optional[int] = None) -> Dict[int, ShiftTotals]:
+        """Tổng hợp các ca bắt đầu trong khoảng [start, end) theo từng user"""
+        params = [int(start.timestamp()), int(end.timestamp())]
+        user_filter = ""
+        if user_id is not None:
+            user_filter = " AND user_id = ?"
+            params.append(int(user_id))
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, MAX(user_name), COUNT(*), SUM(work_seconds), SUM(break_seconds) "
+                "FROM shift_ledger WHERE start_ts >= ? AND start_ts < ?" + user_filter +
+                " GROUP BY user_id",
+                params
+            ).fetchall()
+            break_rows = self._conn.execute(
+                "SELECT s.user_id, b.break_type, SUM(b.seconds), SUM(b.count) "
+                "FROM shift_ledger s JOIN shift_ledger_breaks b ON b.shift_id = s.id "
+                "WHERE s.start_ts >= ? AND s.start_ts < ?" + user_filter.replace('user_id', 's.user_id') +
+                " GROUP BY s.user_id, b.break_type",
+                params
+            ).fetchall()
+
+        totals = {
+            uid: ShiftTotals(uid, name, shifts, work or 0, breaks or 0, {}, {})
+            for uid, name, shifts, work, breaks in rows
+        }
+        for uid, break_type, seconds, count in break_rows:
+            totals[uid].break_seconds_by_type[break_type] = seconds
+            totals[uid].break_counts_by_type[break_type] = count
+        return totals
+
+    def shifts(self, start: datetime, end: datetime) -> List[Tuple[int, str, int, int]]:
+        """Các ca bắt đầu trong khoảng [start, end): (user_id, user_name, start_ts, end_ts)"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT user_id, user_name, start_ts, end_ts FROM shift_ledger "
+                "WHERE start_ts >= ? AND start_ts < ? ORDER BY start_ts",
+                (int(start.timestamp()), int(end.timestamp()))
+            ).fetchall()
+
+    def clear(self):
+        """Xóa toàn bộ sổ ca"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM shift_ledger_breaks")
+            self._conn.execute("DELETE FROM shift_ledger")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_ledger: Optional[ShiftLedger] = None
+
+
+def get_shift_ledger() -> ShiftLedger:
+    """Trả về ShiftLedger dùng chung cho toàn ứng dụng"""
+    global _default_ledger
+    if _default_ledger is None:
+        _default_ledger = ShiftLedger()
+    return _default_ledger
@@ -0,0 +1,206 @@
+import gc
+import logging
+import struct
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.models import UserState
+from src.utils.config import VN_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+# Phiên bản định dạng snapshot. 1 = JSON text (cũ), 2 = bản ghi nhị phân cố định
+# 8 loại nghỉ, 3 = bản ghi nhị phân với số loại nghỉ thay đổi
+FORMAT_VERSION = 3
+
+# Số loại nghỉ tối đa lưu trong một bản ghi (số slot lưu bằng 1 byte)
+MAX_BREAK_SLOTS = 255
+
+NO_TIME = -1
+NO_CODE = 0xFFFF
+
+# Bản ghi v2 (little-endian, không padding):
+#   user_id q | flags B | name I | start q | end q | break_start q | current_break H
+#   + 8 x (break_code H | count H | seconds I)
+_HEADER_V2 = '<qBIqqqH'
+_SLOT_V2 = 'HHI'
+_RECORD_V2 = struct.Struct(_HEADER_V2 + _SLOT_V2 * 8)
+
+# Bản ghi v3 (độ dài thay đổi):
+#   user_id q | flags B | start q | end q | break_start q | current_break H
+#   | số slot B | độ dài tên H + tên UTF-8 + số slot x (break_code H | count H | seconds i)
+# Tên nhân viên hầu như không trùng nên lưu ngay trong bản ghi; bảng chuỗi
+# chỉ còn dùng cho tên loại nghỉ. seconds có dấu (lệch giờ có thể cho số âm).
+_HEADER_V3 = struct.Struct('<qBqqqHBH')
+_SLOT_V3 = 'HHi'
+_SLOTS_V3 = [struct.Struct('<' + _SLOT_V3 * n) for n in range(MAX_BREAK_SLOTS + 1)]
+
+COUNT_MAX = 0xFFFF
+SECONDS_MIN = -2 ** 31
+SECONDS_MAX = 2 ** 31 - 1
+
+FLAG_WORKING = 0x01
+
+
+class StringTable:
+    """Bảng chuỗi dùng chung: tên nhân viên và tên loại nghỉ được lưu bằng mã số"""
+
+    def __init__(self, rows: Iterable[Tuple[int, str]] = ()):
+        self.values: List[str] = []
+        self.ids: Dict[str, int] = {}
+        for string_id, value in sorted(rows):
+            self.values.append(value)
+            self.ids[value] = string_id
+        self.new_rows: List[Tuple[int, str]] = []
+
+    def code(self, value: str) -> int:
+        """Mã của chuỗi, thêm mới nếu chưa có"""
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = len(self.values)
+            self.values.append(value)
+            self.ids[value] = string_id
+            self.new_rows.append((string_id, value))
+        return string_id
+
+    def pending_rows(self) -> List[Tuple[int, str]]:
+        """Các chuỗi mới chưa ghi xuống bảng state_strings"""
+        return list(self.new_rows)
+
+    def mark_saved(self, count: int):
+        """Bỏ `count` chuỗi đầu khỏi danh sách chờ (gọi sau khi transaction đã commit).
+
+        Nếu transaction lỗi thì không gọi: các chuỗi vẫn chờ và được ghi ở lần
+        lưu sau, nên mã đã cấp trong bộ nhớ luôn khớp với bảng state_strings.
+        """
+        del self.new_rows[:count]
+
+
+def _to_epoch(value: Optional[str]) -> int:
+    if not value:
+        return NO_TIME
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def _clamp(value: int, low: int, high: int, what: str, user_id: str) -> int:
+    if low <= value <= high:
+        return value
+    logger.warning(f"{what} ngoài khoảng cho user {user_id}: {value}, lưu thành giá trị biên")
+    return max(low, min(high, value))
+
+
+def encode_record(user_id: str, data: dict, strings: StringTable) -> bytes:
+    """Mã hóa trạng thái (dạng `UserState.to_dict()`) thành bản ghi v3"""
+    breaks = data.get('breaks', {})
+    counts = data.get('break_counts', {})
+    break_types = list(dict.fromkeys(list(breaks) + list(counts)))
+    if len(break_types) > MAX_BREAK_SLOTS:
+        raise ValueError(f"Quá {MAX_BREAK_SLOTS} loại nghỉ cho user {user_id}")
+
+    slots = []
+    for break_type in break_types:
+        slots += [
+            strings.code(break_type),
+            _clamp(counts.get(break_type, 0), 0, COUNT_MAX, "Số lần nghỉ", user_id),
+            _clamp(int(breaks.get(break_type, 0)), SECONDS_MIN, SECONDS_MAX, "Thời gian nghỉ", user_id)
+        ]
+
+    current_break = data.get('current_break')
+    name = data['user_name'].encode('utf-8')
+    header = _HEADER_V3.pack(
+        int(user_id),
+        FLAG_WORKING if data.get('is_working') else 0,
+        _to_epoch(data.get('start_time')),
+        _to_epoch(data.get('end_time')),
+        _to_epoch(data.get('break_start_time')),
+        strings.code(current_break) if current_break else NO_CODE,
+        len(break_types),
+        len(name)
+    )
+    return header + name + _SLOTS_V3[len(break_types)].pack(*slots)
+
+
+def _iter_v2(buffer: bytes, names: List[str]):
+    for fields in _RECORD_V2.iter_unpack(buffer):
+        user_id, flags, name, start, end, break_start, current_break = fields[:7]
+        slots = []
+        for i in range(7, len(fields), 3):
+            if fields[i] == NO_CODE:
+                break
+            slots += fields[i:i + 3]
+        yield (user_id, flags, names[name], start, end, break_start, current_break), slots
+
+
+def _iter_v3(buffer: bytes, names: List[str]):
+    header_size = _HEADER_V3.size
+    unpack_header = _HEADER_V3.unpack_from
+    slot_formats = _SLOTS_V3
+    offset = 0
+    size = len(buffer)
+    while offset < size:
+        user_id, flags, start, end, break_start, current_break, slot_count, name_size = \
+            unpack_header(buffer, offset)
+        offset += header_size
+        name = buffer[offset:offset + name_size].decode('utf-8')
+        offset += name_size
+        slot_format = slot_formats[slot_count]
+        yield ((user_id, flags, name, start, end, break_start, current_break),
+               slot_format.unpack_from(buffer, offset))
+        offset += slot_format.size
+
+
+_RECORD_READERS = {
+    2: _iter_v2,
+    3: _iter_v3,
+}
+
+
+def decode_records(buffer: bytes, strings: StringTable,
+                   version: int = FORMAT_VERSION) -> Dict[str, UserState]:
+    """Giải mã một dãy bản ghi liền nhau.
+
+    Tắt GC trong lúc giải mã: hàng trăm nghìn dict/timedelta mới làm GC
+    quét lại toàn bộ heap nhiều lần mà không thu hồi được gì.
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _decode(buffer, strings.values, version)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _decode(buffer: bytes, names: List[str], version: int) -> Dict[str, UserState]:
+    times = {NO_TIME: None}
+    durations = {}
+    new_state = UserState.__new__
+    set_dict = object.__setattr__
+    states = {}
+    for (user_id, flags, name, start, end, break_start, current_break), slots in _RECORD_READERS[version](buffer, names):
+        for value in (start, end, break_start):
+            if value not in times:
+                times[value] = datetime.fromtimestamp(value, VN_TIMEZONE)
+        breaks = {}
+        break_counts = {}
+        for code, count, seconds in zip(slots[0::3], slots[1::3], slots[2::3]):
+            duration = durations.get(seconds)
+            if duration is None:
+                duration = durations[seconds] = timedelta(seconds=seconds)
+            break_type = names[code]
+            breaks[break_type] = duration
+            break_counts[break_type] = count
+        # Gán thẳng __dict__ (giống pickle) để không qua __setattr__ đánh dấu dirty
+        state = new_state(UserState)
+        set_dict(state, '__dict__', {
+            'user_name': name,
+            'is_working': bool(flags & FLAG_WORKING),
+            'start_time': times[start],
+            'end_time': times[end],
+            'current_break': names[current_break] if current_break != NO_CODE else None,
+            'break_start_time': times[break_start],
+            'breaks': breaks,
+            'break_counts': break_counts
+        })
+        states[str(user_id)] = state
+    return states
@@ -0,0 +1,231 @@
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from src.models import UserState
+from src.services.snapshot_codec import (
+    FORMAT_VERSION,
+    StringTable,
+    decode_records,
+    encode_record
+)
+
+logger = logging.getLogger(__name__)
+
+# Cấu hình base directory
+BASE_DIR = Path(__file__).parent.parent.parent
+STATE_DB = BASE_DIR / 'user_states.db'
+
+# Khóa chính là id nên không cần rowid và chỉ mục khóa riêng
+_CREATE_USER_STATES = (
+    "CREATE TABLE IF NOT EXISTS {table} "
+    "(hashed_user_id TEXT PRIMARY KEY, user_data BLOB) WITHOUT ROWID"
+)
+
+
+class StateStore:
+    """Lưu trạng thái người dùng vào SQLite (WAL), mỗi user một dòng.
+
+    Mỗi lần ghi chỉ upsert đúng những user thay đổi nên chi phí không
+    phụ thuộc vào tổng số nhân viên. Dữ liệu mỗi dòng là bản ghi nhị phân
+    gọn (xem `snapshot_codec`), tên được lưu trong bảng chuỗi
+    `state_strings`; phiên bản định dạng nằm trong `state_meta`.
+    """
+
+    def __init__(self, db_path: Path = STATE_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_CREATE_USER_STATES.format(table='user_states'))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state_meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state_strings (id INTEGER PRIMARY KEY, value TEXT UNIQUE)"
+        )
+        self._conn.commit()
+        self._strings = StringTable(self._conn.execute("SELECT id, value FROM state_strings"))
+        self._migrate()
+
+    def save(self, user_id: str, state: UserState):
+        """Upsert trạng thái của một user"""
+        self.save_many([(user_id, state)])
+
+    def save_many(self, items: Iterable[Tuple[str, UserState]],
+                  journal_seq: Optional[int] = None):
+        """Upsert nhiều user trong cùng một transaction.
+
+        Nếu có `journal_seq`, số thứ tự journal đã gộp vào snapshot được ghi
+        cùng transaction để lúc khởi động chỉ cần replay phần đuôi.
+        """
+        self.save_records(((user_id, state.to_dict()) for user_id, state in items),
+                          journal_seq=journal_seq)
+
+    def save_records(self, items: Iterable[Tuple[str, dict]],
+                     journal_seq: Optional[int] = None):
+        """Như `save_many` nhưng nhận trạng thái đã chuyển sang dict"""
+        with self._lock:
+            rows = [(str(user_id), encode_record(user_id, data, self._strings))
+                    for user_id, data in items]
+            if not rows and journal_seq is None:
+                return
+            new_strings = self._strings.pending_rows()
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO state_strings (id, value) VALUES (?, ?)", new_strings
+                )
+                self._conn.executemany(
+                    "INSERT INTO user_states (hashed_user_id, user_data) VALUES (?, ?) "
+                    "ON CONFLICT(hashed_user_id) DO UPDATE SET user_data = excluded.user_data",
+                    rows
+                )
+                if journal_seq is not None:
+                    self._set_meta('journal_seq', journal_seq)
+            self._strings.mark_saved(len(new_strings))
+
+    def get_journal_seq(self) -> int:
+        """Số thứ tự journal cuối cùng đã có trong snapshot"""
+        with self._lock:
+            return int(self._get_meta('journal_seq') or 0)
+
+    def delete_all(self):
+        """Xóa toàn bộ trạng thái"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM user_states")
+
+    def load_all(self) -> Dict[str, UserState]:
+        """Đọc trạng thái của tất cả user bằng một lần giải mã hàng loạt"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT hashed_user_id, user_data FROM user_states"
+            ).fetchall()
+
+        # Dữ liệu cũ lưu theo id đã băm vẫn là JSON text, không gửi tin được cho các id này
+        blobs = [(user_id, data) for user_id, data in rows if isinstance(data, bytes)]
+        if len(blobs) < len(rows):
+            logger.debug(f"Bỏ qua {len(rows) - len(blobs)} trạng thái cũ với id đã băm")
+        try:
+            states = decode_records(b''.join(data for _, data in blobs), self._strings)
+            if len(states) == len(blobs):
+                return states
+            logger.error(f"Snapshot giải mã ra {len(states)}/{len(blobs)} user, giải mã lại từng bản ghi")
+        except Exception as e:
+            logger.error(f"Lỗi khi giải mã snapshot trạng thái: {e}, giải mã lại từng bản ghi")
+        return self._decode_each(blobs)
+
+    def _decode_each(self, blobs) -> Dict[str, UserState]:
+        """Giải mã riêng từng bản ghi, bỏ qua (và ghi log) bản ghi hỏng"""
+        states = {}
+        for user_id, data in blobs:
+            try:
+                decoded = decode_records(data, self._strings)
+                if list(decoded) != [user_id]:
+                    raise ValueError(f"bản ghi chứa {list(decoded)}")
+            except Exception as e:
+                logger.error(f"Bỏ qua trạng thái hỏng của user {user_id}: {e}")
+                continue
+            states.update(decoded)
+        return states
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value FROM state_meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO state_meta (key, value) VALUES (?, ?)",
+            (key, str(value))
+        )
+
+    def _migrate(self):
+        """Nâng cấp dữ liệu lên FORMAT_VERSION, lần lượt từng phiên bản"""
+        version = self._get_meta('format_version')
+        if version is None:
+            has_rows = self._conn.execute("SELECT 1 FROM user_states LIMIT 1").fetchone()
+            version = 1 if has_rows else FORMAT_VERSION
+        version = int(version)
+        if version > FORMAT_VERSION:
+            raise RuntimeError(
+                f"Snapshot định dạng v{version} mới hơn phiên bản hỗ trợ v{FORMAT_VERSION}"
+            )
+
+        with self._conn:
+            while version < FORMAT_VERSION:
+                # Mỗi bước trả về phiên bản đạt được (có thể nhảy thẳng lên bản mới nhất)
+                version = _MIGRATIONS[version](self)
+                logger.info(f"Đã nâng cấp snapshot trạng thái lên v{version}")
+            self._set_meta('format_version', version)
+        # _rebuild_user_states đã ghi các chuỗi mới trong transaction vừa commit
+        self._strings.mark_saved(len(self._strings.new_rows))
+
+    def _migrate_v1(self) -> int:
+        """v1 lưu JSON text -> bản ghi nhị phân định dạng mới nhất"""
+        converted = {}
+        for user_id, user_data in self._conn.execute("SELECT hashed_user_id, user_data FROM user_states"):
+            if not user_id.lstrip('-').isdigit():
+                continue
+            try:
+                converted[user_id] = encode_record(user_id, json.loads(user_data), self._strings)
+            except Exception as e:
+                logger.error(f"Không thể chuyển trạng thái user {user_id} sang v{FORMAT_VERSION}: {e}")
+        self._rebuild_user_states(converted)
+        return FORMAT_VERSION
+
+    def _migrate_v2_to_v3(self) -> int:
+        """v2 bản ghi cố định 8 loại nghỉ -> v3 độ dài thay đổi, bảng WITHOUT ROWID"""
+        converted = {}
+        for user_id, user_data in self._conn.execute("SELECT hashed_user_id, user_data FROM user_states"):
+            if not isinstance(user_data, bytes):
+                continue
+            try:
+                state = decode_records(user_data, self._strings, version=2)[user_id]
+                converted[user_id] = encode_record(user_id, state.to_dict(), self._strings)
+            except Exception as e:
+                logger.error(f"Không thể chuyển trạng thái user {user_id} sang v3: {e}")
+        self._rebuild_user_states(converted)
+        return 3
+
+    def _rebuild_user_states(self, converted: Dict[str, bytes]):
+        """Chép user_states sang bảng mới (schema hiện tại), thay dữ liệu đã chuyển đổi"""
+        self._conn.executemany(
+            "INSERT INTO state_strings (id, value) VALUES (?, ?)",
+            self._strings.pending_rows()
+        )
+        rows = self._conn.execute("SELECT hashed_user_id, user_data FROM user_states").fetchall()
+        self._conn.execute("DROP TABLE IF EXISTS user_states_new")
+        self._conn.execute(_CREATE_USER_STATES.format(table='user_states_new'))
+        self._conn.executemany(
+            "INSERT INTO user_states_new (hashed_user_id, user_data) VALUES (?, ?)",
+            [(user_id, converted.get(user_id, user_data)) for user_id, user_data in rows]
+        )
+        self._conn.execute("DROP TABLE user_states")
+        self._conn.execute("ALTER TABLE user_states_new RENAME TO user_states")
+
+
+# Hàm nâng cấp dữ liệu từ phiên bản N, trả về phiên bản sau khi nâng cấp
+_MIGRATIONS = {
+    1: StateStore._migrate_v1,
+    2: StateStore._migrate_v2_to_v3,
+}
+
+
+_default_store: Optional[StateStore] = None
+
+
+def get_state_store() -> StateStore:
+    """Trả về StateStore dùng chung cho toàn ứng dụng"""
+    global _default_store
+    if _default_store is None:
+        _default_store = StateStore()
+    return _default_store
@@ -0,0 +1,101 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from src.utils.config import UPDATE_CACHE_SIZE, UPDATE_DEBOUNCE
+
+logger = logging.getLogger(__name__)
+
+# Một tin trả lời đã gửi: (nội dung, tham số reply_text)
+Reply = Tuple[str, Dict[str, Any]]
+
+
+class _LastAction(NamedTuple):
+    action: Hashable
+    at: float
+    replies: List[Reply]
+
+
+class UpdateGuard:
+    """Chống xử lý trùng: cùng update_id, hoặc bấm cùng một nút hai lần liền.
+
+    Mỗi update đã xử lý giữ lại các tin trả lời của nó trong một LRU có giới
+    hạn. Update trùng (Telegram gửi lại, hoặc user bấm lại cùng nút trong
+    `window` giây) được trả lời lại bằng các tin đã lưu, không chạy handler,
+    không đổi trạng thái và không báo admin lần nữa.
+    """
+
+    def __init__(self, max_size: int = UPDATE_CACHE_SIZE, window: float = UPDATE_DEBOUNCE):
+        self.max_size = max_size
+        self.window = window
+        # update_id -> các tin trả lời
+        self._updates: "OrderedDict[int, List[Reply]]" = OrderedDict()
+        # user_id -> hành động gần nhất
+        self._last: "OrderedDict[Hashable, _LastAction]" = OrderedDict()
+        self.duplicates = 0
+        self.debounced = 0
+
+    @staticmethod
+    def _put(cache: OrderedDict, key, value, max_size: int):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+
+    def seen(self, update_id: int) -> Optional[List[Reply]]:
+        """Các tin trả lời của update đã xử lý, None nếu là update mới"""
+        replies = self._updates.get(update_id)
+        if replies is not None:
+            self.duplicates += 1
+            logger.debug(f"Bỏ qua update trùng {update_id}")
+        return replies
+
+    def begin(self, update_id: int):
+        """Ghi nhận update bắt đầu được xử lý; tin trả lời sau đó được lưu vào đây"""
+        self._put(self._updates, update_id, [], self.max_size)
+
+    def debounce(self, update_id: int, user_id: Hashable, action: Hashable,
+                 at: Optional[float] = None) -> Optional[List[Reply]]:
+        """Kiểm tra thao tác lặp.
+
+        Nếu user vừa làm đúng hành động này trong cửa sổ debounce, trả về các
+        tin trả lời của lần trước và update này dùng lại các tin đó. Ngược lại
+        ghi nhận hành động và trả về None. `at` là thời điểm thao tác (epoch),
+        mặc định là bây giờ.
+        """
+        now = at if at is not None else time.time()
+        last = self._last.get(user_id)
+        if last is not None and last.action == action and now - last.at < self.window:
+            self.debounced += 1
+            self._put(self._updates, update_id, last.replies, self.max_size)
+            logger.debug(f"Bỏ qua thao tác lặp của user {user_id}")
+            return last.replies
+
+        replies = self._updates.get(update_id)
+        if replies is None:
+            replies = []
+            self._put(self._updates, update_id, replies, self.max_size)
+        self._put(self._last, user_id, _LastAction(action, now, replies), self.max_size)
+        return None
+
+    def record(self, update_id: int, text: str, **kwargs):
+        """Lưu một tin trả lời của update đang xử lý"""
+        replies = self._updates.get(update_id)
+        if replies is not None:
+            replies.append((text, kwargs))
+
+    def clear(self):
+        self._updates.clear()
+        self._last.clear()
+
+
+_default_guard: Optional[UpdateGuard] = None
+
+
+def get_update_guard() -> UpdateGuard:
+    """Trả về bộ chống xử lý trùng dùng chung cho toàn ứng dụng"""
+    global _default_guard
+    if _default_guard is None:
+        _default_guard = UpdateGuard()
+    return _default_guard
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Hashable, List, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from src.utils.config import CONCURRENT_UPDATES, MAX_PENDING_UPDATES
+
+logger = logging.getLogger(__name__)
+
+# Thao tác admin tác động lên mọi nhân viên: chạy một mình, sau các update
+# đến trước nó và trước các update đến sau nó
+GLOBAL_COMMANDS = {'as', 'ae', 'fb', 'eb', 'allstart', 'allend', 'reset'}
+GLOBAL_CALLBACKS = {'all_start_shift', 'all_end_shift', 'force_break', 'end_break', 'confirm_reset'}
+
+KEY_GLOBAL = 'global'
+
+
+def update_key(update: object) -> Optional[Hashable]:
+    """Khóa tuần tự của update: id user, KEY_GLOBAL, hoặc None nếu không cần giữ thứ tự"""
+    if not isinstance(update, Update):
+        return None
+    query = update.callback_query
+    if query is not None and query.data in GLOBAL_CALLBACKS:
+        return KEY_GLOBAL
+    message = update.effective_message
+    if message is not None and message.text and message.text.startswith('/'):
+        command = message.text.split(maxsplit=1)[0][1:].split('@', 1)[0].lower()
+        if command in GLOBAL_COMMANDS:
+            return KEY_GLOBAL
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    return None
+
+
+class _Gate:
+    """Khóa đọc/ghi: update thường chạy chung, thao tác toàn cục chạy một mình.
+
+    Thao tác toàn cục đang chờ thì chặn update thường mới để không bị đói.
+    """
+
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._waiting_exclusive = 0
+
+    async def acquire_shared(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._exclusive and not self._waiting_exclusive)
+            self._shared += 1
+
+    async def release_shared(self):
+        async with self._cond:
+            self._shared -= 1
+            self._cond.notify_all()
+
+    async def acquire_exclusive(self):
+        async with self._cond:
+            self._waiting_exclusive += 1
+            try:
+                await self._cond.wait_for(lambda: not self._exclusive and not self._shared)
+            finally:
+                self._waiting_exclusive -= 1
+            self._exclusive = True
+
+    async def release_exclusive(self):
+        async with self._cond:
+            self._exclusive = False
+            self._cond.notify_all()
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Xử lý update song song nhưng giữ thứ tự trong từng user.
+
+    Mỗi user có một khóa riêng (FIFO), nên các lần bấm nút của một người chạy
+    đúng thứ tự còn người khác không phải chờ. Tối đa `concurrent_updates`
+    handler chạy cùng lúc; update đang chờ khóa của user không chiếm chỗ.
+    Thao tác admin lên toàn bộ nhân viên (`GLOBAL_COMMANDS`,
+    `GLOBAL_CALLBACKS`) chạy một mình.
+
+    Nếu có `tracker` (UpdateOffset), update được báo `begin` khi vào bộ xử
+    lý, trước khi chờ khóa (semaphore của lớp cha giữ thứ tự nhận), và
+    `complete` khi xong, kể cả khi handler lỗi hoặc update bị bỏ qua.
+    """
+
+    def __init__(self, concurrent_updates: int = CONCURRENT_UPDATES,
+                 max_pending: int = MAX_PENDING_UPDATES, tracker: Optional[Any] = None):
+        # Semaphore của lớp cha giới hạn số update đang chờ + đang chạy
+        super().__init__(max(max_pending, concurrent_updates))
+        self.concurrent_updates = concurrent_updates
+        self._slots = asyncio.Semaphore(concurrent_updates)
+        self._gate = _Gate()
+        # khóa -> [asyncio.Lock, số update đang giữ/chờ]
+        self._locks: Dict[Hashable, List[Any]] = {}
+        self.tracker = tracker
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        if self.tracker is None or not isinstance(update, Update):
+            await self._dispatch(update, coroutine)
+            return
+        self.tracker.begin(update.update_id)
+        try:
+            await self._dispatch(update, coroutine)
+        finally:
+            self.tracker.complete(update.update_id)
+
+    async def _dispatch(self, update: object, coroutine: Awaitable[Any]):
+        key = update_key(update)
+        if key == KEY_GLOBAL:
+            await self._gate.acquire_exclusive()
+            try:
+                await coroutine
+            finally:
+                await self._gate.release_exclusive()
+            return
+
+        if key is None:
+            await self._run_shared(coroutine)
+            return
+
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._run_shared(coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def _run_shared(self, coroutine: Awaitable[Any]):
+        await self._gate.acquire_shared()
+        try:
+            async with self._slots:
+                await coroutine
+        finally:
+            await self._gate.release_shared()
+
+    async def initialize(self) -> None:
+        logger.info(f"Xử lý update song song: tối đa {self.concurrent_updates} handler, thứ tự theo user")
+
+    async def shutdown(self) -> None:
+        pass
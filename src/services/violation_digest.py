@@ -0,0 +1,121 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from telegram.ext import ContextTypes, Job, JobQueue
+
+from src.services.outbox import PRIORITY_HIGH
+from src.utils.config import ADMIN_ID, VN_TIMEZONE, DIGEST_WINDOW
+from src.utils.report_sender import queue_report
+
+logger = logging.getLogger(__name__)
+
+# Biểu tượng và tiêu đề nhóm theo loại vi phạm
+VIOLATION_LABELS = {
+    "overtime_break": ("⏰", "Nghỉ quá giờ"),
+    "exceed_break_limit": ("❌", "Vượt số lần nghỉ"),
+    "early_start": ("🌅", "Bắt đầu ca sớm"),
+    "late_end": ("🌙", "Kết thúc ca muộn"),
+    "late_arrival": ("🐢", "Đi trễ"),
+    "early_departure": ("🏃", "Về sớm"),
+}
+DEFAULT_LABEL = ("⚠️", "Khác")
+
+
+class ViolationDigest:
+    """Gom thông báo vi phạm gửi admin theo cửa sổ thời gian.
+
+    Vi phạm đầu tiên mở một cửa sổ `window` giây (một job trên JobQueue);
+    hết cửa sổ thì mỗi admin nhận một tin tổng hợp, nhóm theo nhân viên và
+    loại vi phạm. Cửa sổ chỉ có một vi phạm thì gửi như tin thường.
+    `window` bằng 0 thì gửi ngay từng vi phạm.
+
+    Khóa chống trùng của tin tổng hợp lấy theo khóa của vi phạm đầu tiên
+    trong cửa sổ: mỗi vi phạm chỉ mở được một cửa sổ nên hai cửa sổ không
+    trùng khóa, kể cả sau khi khởi động lại bot.
+
+    Tin đang gom nằm trong bộ nhớ cho tới khi vào hàng đợi gửi tin; khi tắt
+    bot `flush` được gọi để không mất các tin này.
+    """
+
+    def __init__(self, window: int = DIGEST_WINDOW):
+        self.window = window
+        self._job_queue: Optional[JobQueue] = None
+        self._job: Optional[Job] = None
+        self._opened: Optional[datetime] = None
+        self._first_key: Optional[str] = None
+        # user_name -> loại vi phạm -> các dòng chi tiết (giữ thứ tự xuất hiện)
+        self._entries: Dict[str, Dict[str, List[str]]] = {}
+        self._count = 0
+
+    def attach(self, job_queue: JobQueue):
+        """Gắn JobQueue để hẹn giờ gửi tin tổng hợp (gọi lúc khởi động)"""
+        self._job_queue = job_queue
+
+    def add(self, user_name: str, violation_type: str, details: str, key: str):
+        """Thêm một vi phạm vào cửa sổ hiện tại; `key` là khóa riêng của vi phạm"""
+        self._entries.setdefault(user_name, {}).setdefault(violation_type, []).append(details)
+        self._count += 1
+        if self._job is not None:
+            return
+        self._opened = datetime.now(VN_TIMEZONE)
+        self._first_key = key
+        if self._job_queue is None or self.window <= 0:
+            self.flush()
+            return
+        self._job = self._job_queue.run_once(self._on_window_end, when=self.window, name="violation_digest")
+
+    async def _on_window_end(self, context: ContextTypes.DEFAULT_TYPE):
+        self._job = None
+        self.flush()
+
+    def flush(self) -> int:
+        """Đưa tin tổng hợp của cửa sổ hiện tại vào hàng đợi, trả về số vi phạm đã gom"""
+        if self._job is not None:
+            self._job.schedule_removal()
+            self._job = None
+        count, entries, opened, first_key = self._count, self._entries, self._opened, self._first_key
+        self._entries, self._count, self._opened, self._first_key = {}, 0, None, None
+        if not count:
+            return 0
+
+        text = self.format(entries, count, opened)
+        key = f"digest:{first_key}"
+        for admin_id in ADMIN_ID:
+            queue_report(admin_id, text, 'tong_hop_vi_pham', key=f"{key}:{admin_id}", priority=PRIORITY_HIGH)
+        logger.info(f"Đã gửi tổng hợp {count} vi phạm của {len(entries)} nhân viên")
+        return count
+
+    @staticmethod
+    def format(entries: Dict[str, Dict[str, List[str]]], count: int, opened: datetime) -> str:
+        if count == 1:
+            user_name, by_type = next(iter(entries.items()))
+            violation_type, (details,) = next(iter(by_type.items()))
+            icon, _ = VIOLATION_LABELS.get(violation_type, DEFAULT_LABEL)
+            return f"⚠️ VI PHẠM\n {user_name}\n{icon} {details}"
+
+        now = datetime.now(VN_TIMEZONE)
+        text = (
+            f"⚠️ TỔNG HỢP VI PHẠM ({opened.strftime('%H:%M:%S')} - {now.strftime('%H:%M:%S')})\n"
+            f"{count} vi phạm, {len(entries)} nhân viên\n\n"
+        )
+        for user_name, by_type in entries.items():
+            text += f"👤 {user_name}\n"
+            for violation_type, details in by_type.items():
+                icon, title = VIOLATION_LABELS.get(violation_type, DEFAULT_LABEL)
+                text += f"  {icon} {title} ({len(details)}):\n"
+                for line in details:
+                    text += f"    • {line}\n"
+            text += "\n"
+        return text
+
+
+_default_digest: Optional[ViolationDigest] = None
+
+
+def get_violation_digest() -> ViolationDigest:
+    """Trả về bộ gom thông báo vi phạm dùng chung cho toàn ứng dụng"""
+    global _default_digest
+    if _default_digest is None:
+        _default_digest = ViolationDigest()
+    return _default_digest
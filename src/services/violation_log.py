@@ -0,0 +1,96 @@
+import logging
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from src.services.history_store import ATTENDANCE_DB
+from src.utils.config import VN_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+
+class ViolationLog:
+    """Nhật ký vi phạm chỉ ghi thêm trong SQLite, có index theo ngày.
+
+    ViolationManager ghi vào đây mỗi lần `add_violations`, lúc khởi động chỉ
+    đọc lại vài ngày gần nhất, các ngày cũ hơn được đọc khi báo cáo cần.
+    """
+
+    def __init__(self, db_path: Path = ATTENDANCE_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS violations ("
+            "id INTEGER PRIMARY KEY, date TEXT NOT NULL, user_name TEXT NOT NULL, "
+            "violation_type TEXT NOT NULL, timestamp INTEGER NOT NULL, details TEXT, "
+            "duration_seconds INTEGER)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_violations_date ON violations (date)")
+        self._conn.commit()
+
+    def append(self, violations: Iterable):
+        """Ghi thêm các vi phạm (đối tượng `Violation`)"""
+        rows = [
+            (v.timestamp.strftime('%Y-%m-%d'), v.user_name, v.violation_type,
+             int(v.timestamp.timestamp()), v.details,
+             int(v.duration.total_seconds()) if v.duration is not None else None)
+            for v in violations
+        ]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO violations "
+                "(date, user_name, violation_type, timestamp, details, duration_seconds) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def iter_range(self, start: date, end: date) -> Iterator[tuple]:
+        """Đọc các vi phạm từ ngày `start` tới `end` (tính cả hai đầu).
+
+        Trả về tuple (user_name, violation_type, timestamp, details, duration).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_name, violation_type, timestamp, details, duration_seconds "
+                "FROM violations WHERE date BETWEEN ? AND ? ORDER BY timestamp, id",
+                (start.isoformat(), end.isoformat())
+            ).fetchall()
+        for user_name, violation_type, timestamp, details, duration in rows:
+            yield (
+                user_name,
+                violation_type,
+                datetime.fromtimestamp(timestamp, VN_TIMEZONE),
+                details,
+                timedelta(seconds=duration) if duration is not None else None
+            )
+
+    def first_day(self) -> Optional[date]:
+        """Ngày cũ nhất còn trong nhật ký"""
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(date) FROM violations").fetchone()
+        return date.fromisoformat(row[0]) if row and row[0] else None
+
+    def prune(self, keep_days: int) -> int:
+        """Xóa các vi phạm cũ hơn `keep_days` ngày, trả về số dòng đã xóa"""
+        cutoff = datetime.now(VN_TIMEZONE).date() - timedelta(days=keep_days)
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM violations WHERE date < ?", (cutoff.isoformat(),))
+        if cursor.rowcount:
+            logger.info(f"Đã xóa {cursor.rowcount} vi phạm cũ hơn {cutoff.isoformat()}")
+        return cursor.rowcount
+
+    def clear(self):
+        """Xóa toàn bộ nhật ký vi phạm"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM violations")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
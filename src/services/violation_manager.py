@@ -1,130 +1,214 @@
-from dataclasses import dataclass
-from datetime import datetime, timedelta
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional
-import configparser
-from pathlib import Path
+import logging
 
-@dataclass
-class Violation:
-    user_name: str
-    violation_type: str
-    timestamp: datetime
-    details: str
-    duration: Optional[timedelta] = None
+from src.models import Violation
+from src.services.violation_log import ViolationLog
+from src.services.violation_rules import get_violation_rules
+from src.utils.config import VN_TIMEZONE, VIOLATION_MEMORY_DAYS, VIOLATION_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+VIOLATION_TYPES = ("overtime_break", "exceed_break_limit", "early_start", "late_end")
+
+def _insert(items: List[Violation], times: List[datetime], violation: Violation):
+    """Chèn vi phạm vào danh sách theo thời gian, `times` là thời điểm song song với `items`"""
+    i = bisect_right(times, violation.timestamp)
+    times.insert(i, violation.timestamp)
+    items.insert(i, violation)
 
 class ViolationManager:
-    def __init__(self, config_path: Path = Path('config/config.ini')):
+    """Lưu vi phạm theo thời gian để báo cáo theo ngày/khoảng ngày không phải duyệt toàn bộ.
+
+    - `violations`: danh sách vi phạm của từng user, sắp theo thời gian
+    - `_by_day`: vi phạm theo từng ngày, `_days` là các ngày đã sắp xếp
+    - `_user_times`, `_day_times`: thời điểm song song với hai danh sách trên,
+      để tìm khoảng bằng bisect
+    - `_type_times`: thời điểm vi phạm theo user và loại, để đếm bằng bisect
+
+    Nếu có `log`, vi phạm được ghi xuống nhật ký; bộ nhớ chỉ giữ `memory_days`
+    ngày gần nhất, các ngày cũ hơn được đọc lại khi báo cáo cần.
+    """
+
+    def __init__(self, log: Optional[ViolationLog] = None,
+                 memory_days: int = VIOLATION_MEMORY_DAYS):
         self.violations: Dict[str, List[Violation]] = {}
-        self.config = configparser.ConfigParser()
-        self.config.read(config_path)
-        
-        # Đọc cấu hình từ config.ini
-        self.break_durations = {
-            k: int(v) for k, v in self.config['break_durations'].items()
-        }
-        self.break_frequencies = {
-            k: int(v) for k, v in self.config['break_frequencies'].items()
-        }
-        self.working_hours = {
-            'start': datetime.strptime(self.config['working_hours']['start_time'], '%H:%M').time(),
-            'end': datetime.strptime(self.config['working_hours']['end_time'], '%H:%M').time()
-        }
+        self._user_times: Dict[str, List[datetime]] = {}
+        self._by_day: Dict[date, List[Violation]] = {}
+        self._day_times: Dict[date, List[datetime]] = {}
+        self._days: List[date] = []
+        self._type_times: Dict[str, Dict[str, List[datetime]]] = defaultdict(lambda: defaultdict(list))
+        self.log = log
+        self.memory_days = memory_days
+        # Ngày cũ nhất đã có trong bộ nhớ (None = chưa đọc gì từ nhật ký)
+        self._loaded_from: Optional[date] = None
+        self.rules = get_violation_rules()
 
     def check_working_hours_violation(self, user_name: str, current_time: datetime) -> Optional[Violation]:
         """Kiểm tra vi phạm giờ làm việc"""
-        current_time_only = current_time.time()
-        if current_time_only < self.working_hours['start']:
-            return Violation(
-                user_name=user_name,
-                violation_type="early_start",
-                timestamp=current_time,
-                details=f"Bắt đầu ca sớm hơn giờ quy định ({self.working_hours['start'].strftime('%H:%M')})"
-            )
-        elif current_time_only > self.working_hours['end']:
-            return Violation(
-                user_name=user_name,
-                violation_type="late_end",
-                timestamp=current_time,
-                details=f"Kết thúc ca muộn hơn giờ quy định ({self.working_hours['end'].strftime('%H:%M')})"
-            )
-        return None
+        violations = self.rules.shift_started(user_name, current_time) or self.rules.shift_ended(user_name, current_time)
+        return violations[0] if violations else None
 
     def check_break_violations(self, user_name: str, break_type: str, 
                              start_time: datetime, end_time: datetime,
                              current_count: int) -> List[Violation]:
         """Kiểm tra vi phạm giờ nghỉ"""
-        violations = []
-        
-        # Kiểm tra thời lượng nghỉ
-        actual_duration = end_time - start_time
-        allowed_duration = timedelta(minutes=self.break_durations[break_type])
-        if actual_duration > allowed_duration:
-            overtime = actual_duration - allowed_duration
-            violations.append(Violation(
-                user_name=user_name,
-                violation_type="overtime_break",
-                timestamp=end_time,
-                details=f"Nghỉ {break_type} vượt {str(overtime).split('.')[0]} (cho phép {self.break_durations[break_type]} phút)",
-                duration=overtime
-            ))
-
-        # Kiểm tra số lần nghỉ
-        max_count = self.break_frequencies[break_type]
-        if current_count > max_count:
-            violations.append(Violation(
-                user_name=user_name,
-                violation_type="exceed_break_limit",
-                timestamp=end_time,
-                details=f"Vượt số lần nghỉ {break_type} ({current_count}/{max_count} lần/ca)"
-            ))
-
-        return violations
+        return (self.rules.break_ended(user_name, break_type, end_time, end_time - start_time)
+                + self.rules.break_started(user_name, break_type, end_time, current_count))
 
     def add_violations(self, violations: List[Violation]):
-        """Thêm nhiều vi phạm cùng lúc"""
+        """Thêm nhiều vi phạm cùng lúc, giữ các chỉ mục theo thời gian"""
         for violation in violations:
-            if violation.user_name not in self.violations:
-                self.violations[violation.user_name] = []
-            self.violations[violation.user_name].append(violation)
+            self._index(violation)
+        if self.log is not None and violations:
+            try:
+                self.log.append(violations)
+            except Exception as e:
+                logger.error(f"Lỗi khi ghi nhật ký vi phạm: {e}")
+
+    def _index(self, violation: Violation):
+        _insert(self.violations.setdefault(violation.user_name, []),
+                self._user_times.setdefault(violation.user_name, []), violation)
+
+        day = violation.timestamp.date()
+        bucket = self._by_day.get(day)
+        if bucket is None:
+            bucket = self._by_day[day] = []
+            self._day_times[day] = []
+            insort(self._days, day)
+        _insert(bucket, self._day_times[day], violation)
+
+        insort(self._type_times[violation.user_name][violation.violation_type], violation.timestamp)
+
+    def _load_days(self, start: date, end: date) -> int:
+        count = 0
+        for row in self.log.iter_range(start, end):
+            self._index(Violation(*row))
+            count += 1
+        return count
+
+    def load_recent(self):
+        """Đọc `memory_days` ngày gần nhất từ nhật ký (gọi lúc khởi động)"""
+        if self.log is None:
+            return
+        today = datetime.now(VN_TIMEZONE).date()
+        start = today - timedelta(days=self.memory_days - 1)
+        count = self._load_days(start, today)
+        self._loaded_from = start
+        logger.info(f"Đã nạp {count} vi phạm từ {start.isoformat()}")
+
+    def _ensure_loaded(self, start_date: Optional[datetime]):
+        """Đọc thêm các ngày cũ hơn cửa sổ trong bộ nhớ khi báo cáo cần tới"""
+        if self.log is None or self._loaded_from is None:
+            return
+        start = start_date.date() if start_date else self.log.first_day()
+        if start is None or start >= self._loaded_from:
+            return
+        self._load_days(start, self._loaded_from - timedelta(days=1))
+        self._loaded_from = start
+
+    def prune(self, keep_days: Optional[int] = None,
+              retention_days: int = VIOLATION_RETENTION_DAYS):
+        """Bỏ khỏi bộ nhớ các ngày cũ và xóa khỏi nhật ký các ngày quá hạn giữ"""
+        keep_days = keep_days or self.memory_days
+        cutoff = datetime.now(VN_TIMEZONE).date() - timedelta(days=keep_days - 1)
+        first = bisect_left(self._days, cutoff)
+        if first:
+            for day in self._days[:first]:
+                del self._by_day[day]
+                del self._day_times[day]
+            del self._days[:first]
+            for name in list(self.violations):
+                user_violations = self.violations[name]
+                user_times = self._user_times[name]
+                # Các danh sách đều theo thời gian nên phần cần bỏ luôn ở đầu
+                old = next((i for i, t in enumerate(user_times) if t.date() >= cutoff), len(user_times))
+                del user_violations[:old]
+                del user_times[:old]
+                for times in self._type_times[name].values():
+                    del times[:next((i for i, t in enumerate(times) if t.date() >= cutoff), len(times))]
+                if not user_violations:
+                    del self.violations[name]
+                    del self._user_times[name]
+                    del self._type_times[name]
+        if self.log is not None:
+            self._loaded_from = max(self._loaded_from or cutoff, cutoff)
+            try:
+                self.log.prune(retention_days)
+            except Exception as e:
+                logger.error(f"Lỗi khi dọn nhật ký vi phạm: {e}")
+
+    def clear(self):
+        """Xóa toàn bộ vi phạm trong bộ nhớ và nhật ký"""
+        self.violations.clear()
+        self._user_times.clear()
+        self._by_day.clear()
+        self._day_times.clear()
+        self._days.clear()
+        self._type_times.clear()
+        if self.log is not None:
+            self.log.clear()
+
+    def iter_violations(self, start_date: Optional[datetime] = None,
+                        end_date: Optional[datetime] = None):
+        """Các vi phạm trong khoảng [start_date, end_date), theo thứ tự thời gian"""
+        self._ensure_loaded(start_date)
+        first = bisect_left(self._days, start_date.date()) if start_date else 0
+        for day in self._days[first:]:
+            if end_date and day > end_date.date():
+                return
+            bucket = self._by_day[day]
+            times = self._day_times[day]
+            lo = bisect_left(times, start_date) if start_date and day == start_date.date() else 0
+            hi = bisect_left(times, end_date) if end_date and day == end_date.date() else len(bucket)
+            yield from bucket[lo:hi]
 
     def generate_violation_report(self, start_date: Optional[datetime] = None,
-                                user_name: Optional[str] = None) -> str:
+                                user_name: Optional[str] = None,
+                                end_date: Optional[datetime] = None) -> str:
         """Tạo báo cáo vi phạm có lọc theo ngày và người dùng"""
-        report = "📋 BÁO CÁO VI PHẠM\n\n"
-        
-        for name, user_violations in self.violations.items():
-            if user_name and name != user_name:
-                continue
-                
-            filtered_violations = user_violations
-            if start_date:
-                filtered_violations = [v for v in user_violations 
-                                    if v.timestamp >= start_date]
-            
+        if user_name:
+            self._ensure_loaded(start_date)
+            user_violations = self.violations.get(user_name, [])
+            user_times = self._user_times.get(user_name, [])
+            lo = bisect_left(user_times, start_date) if start_date else 0
+            hi = bisect_left(user_times, end_date) if end_date else len(user_violations)
+            by_user = {user_name: user_violations[lo:hi]}
+        else:
+            by_user: Dict[str, List[Violation]] = {}
+            for violation in self.iter_violations(start_date, end_date):
+                by_user.setdefault(violation.user_name, []).append(violation)
+
+        parts = ["📋 BÁO CÁO VI PHẠM\n\n"]
+        for name, filtered_violations in by_user.items():
             if filtered_violations:
-                report += f"👤 {name}:\n"
+                parts.append(f"👤 {name}:\n")
                 for violation in filtered_violations:
-                    report += f"⚠️ {violation.timestamp.strftime('%H:%M:%S')} - {violation.details}\n"
-                report += "\n"
+                    parts.append(f"⚠️ {violation.timestamp.strftime('%H:%M:%S')} - {violation.details}\n")
+                parts.append("\n")
                 
-        return report if len(report) > 20 else "✅ Không có vi phạm nào!"
+        return ''.join(parts) if len(parts) > 1 else "✅ Không có vi phạm nào!"
 
     def get_user_violations_count(self, user_name: str, 
                                 start_date: Optional[datetime] = None) -> Dict[str, int]:
         """Lấy số lượng vi phạm theo loại của một người dùng"""
-        violations = self.violations.get(user_name, [])
-        if start_date:
-            violations = [v for v in violations if v.timestamp >= start_date]
-            
-        counts = {
-            "overtime_break": 0,
-            "exceed_break_limit": 0,
-            "early_start": 0,
-            "late_end": 0
-        }
-        
-        for violation in violations:
-            if violation.violation_type in counts:
-                counts[violation.violation_type] += 1
-                
-        return counts
\ No newline at end of file
+        self._ensure_loaded(start_date)
+        counts = {violation_type: 0 for violation_type in VIOLATION_TYPES}
+        for violation_type, times in self._type_times.get(user_name, {}).items():
+            if violation_type in counts:
+                counts[violation_type] = len(times) - (bisect_left(times, start_date) if start_date else 0)
+        return counts
+
+
+_default_manager: Optional[ViolationManager] = None
+
+
+def get_violation_manager() -> ViolationManager:
+    """Trả về ViolationManager dùng chung, có nhật ký vi phạm trong attendance.db"""
+    global _default_manager
+    if _default_manager is None:
+        _default_manager = ViolationManager(log=ViolationLog())
+        _default_manager.load_recent()
+    return _default_manager
@@ -0,0 +1,261 @@
+import logging
+from datetime import datetime, time, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from src.models import Violation
+from src.utils.config import (
+    BREAK_TYPE_KEYS,
+    BREAK_DURATIONS,
+    BREAK_FREQUENCIES,
+    WORK_START,
+    WORK_END
+)
+
+logger = logging.getLogger(__name__)
+
+# Loại sự kiện đưa vào bộ luật
+EVENT_SHIFT_START = 0
+EVENT_SHIFT_END = 1
+EVENT_BREAK_START = 2
+EVENT_BREAK_END = 3
+
+# Các kiểm tra giờ ca. Bot chính báo lên ca sớm/xuống ca muộn; bộ kiểm tra
+# giờ giấc (services/time_violation_checker.py) báo đi trễ/về sớm.
+SHIFT_CHECKS_BOT = ('early_start', 'late_end')
+SHIFT_CHECKS_PUNCTUALITY = ('late_arrival', 'early_departure')
+
+
+class RuleEvent(NamedTuple):
+    """Một sự kiện chấm công cần kiểm tra.
+
+    `break_id` là mã số loại nghỉ (xem `ViolationRules.break_id`), `count` là
+    số lần đã nghỉ loại đó trong ca tính cả lần này, `duration` là thời gian
+    của lần nghỉ vừa kết thúc.
+    """
+    kind: int
+    user_name: str
+    timestamp: datetime
+    break_id: Optional[int] = None
+    count: int = 0
+    duration: Optional[timedelta] = None
+
+
+class BreakDurationRule:
+    """Nghỉ quá thời gian cho phép"""
+    kind = EVENT_BREAK_END
+
+    def __init__(self, labels: List[str], max_minutes: List[int]):
+        self.labels = labels
+        self.max_minutes = max_minutes
+        self.allowed = [timedelta(minutes=m) for m in max_minutes]
+
+    def check(self, event: RuleEvent) -> Optional[Violation]:
+        allowed = self.allowed[event.break_id]
+        if event.duration is None or event.duration <= allowed:
+            return None
+        overtime = event.duration - allowed
+        return Violation(
+            user_name=event.user_name,
+            violation_type="overtime_break",
+            timestamp=event.timestamp,
+            details=(f"Nghỉ {self.labels[event.break_id]} vượt {str(overtime).split('.')[0]} "
+                     f"(cho phép {self.max_minutes[event.break_id]} phút)"),
+            duration=overtime
+        )
+
+
+class BreakFrequencyRule:
+    """Nghỉ quá số lần cho phép trong ca"""
+    kind = EVENT_BREAK_START
+
+    def __init__(self, labels: List[str], max_counts: List[int]):
+        self.labels = labels
+        self.max_counts = max_counts
+
+    def check(self, event: RuleEvent) -> Optional[Violation]:
+        max_count = self.max_counts[event.break_id]
+        if event.count <= max_count:
+            return None
+        return Violation(
+            user_name=event.user_name,
+            violation_type="exceed_break_limit",
+            timestamp=event.timestamp,
+            details=f"Vượt số lần nghỉ {self.labels[event.break_id]} ({event.count}/{max_count} lần/ca)"
+        )
+
+
+class EarlyStartRule:
+    """Bắt đầu ca trước giờ quy định"""
+    kind = EVENT_SHIFT_START
+
+    def __init__(self, start: time):
+        self.start = start
+
+    def check(self, event: RuleEvent) -> Optional[Violation]:
+        if event.timestamp.time() >= self.start:
+            return None
+        return Violation(
+            user_name=event.user_name,
+            violation_type="early_start",
+            timestamp=event.timestamp,
+            details=f"Bắt đầu ca sớm hơn giờ quy định ({self.start.strftime('%H:%M')})"
+        )
+
+
+class LateEndRule:
+    """Kết thúc ca sau giờ quy định"""
+    kind = EVENT_SHIFT_END
+
+    def __init__(self, end: time):
+        self.end = end
+
+    def check(self, event: RuleEvent) -> Optional[Violation]:
+        if event.timestamp.time() <= self.end:
+            return None
+        return Violation(
+            user_name=event.user_name,
+            violation_type="late_end",
+            timestamp=event.timestamp,
+            details=f"Kết thúc ca muộn hơn giờ quy định ({self.end.strftime('%H:%M')})"
+        )
+
+
+def _minutes_between(scheduled: time, actual: datetime) -> timedelta:
+    """Khoảng cách từ giờ quy định tới giờ thực tế (dương nếu thực tế muộn hơn)"""
+    return actual.replace(tzinfo=None) - datetime.combine(actual.date(), scheduled)
+
+
+class LateArrivalRule:
+    """Lên ca sau giờ quy định (đi trễ)"""
+    kind = EVENT_SHIFT_START
+
+    def __init__(self, start: time):
+        self.start = start
+
+    def check(self, event: RuleEvent) -> Optional[Violation]:
+        if event.timestamp.time() <= self.start:
+            return None
+        late = _minutes_between(self.start, event.timestamp)
+        return Violation(
+            user_name=event.user_name,
+            violation_type="late_arrival",
+            timestamp=event.timestamp,
+            details=(f"Đi trễ {int(late.total_seconds() // 60)} phút "
+                     f"(giờ quy định {self.start.strftime('%H:%M')})"),
+            duration=late
+        )
+
+
+class EarlyDepartureRule:
+    """Xuống ca trước giờ quy định (về sớm)"""
+    kind = EVENT_SHIFT_END
+
+    def __init__(self, end: time):
+        self.end = end
+
+    def check(self, event: RuleEvent) -> Optional[Violation]:
+        if event.timestamp.time() >= self.end:
+            return None
+        early = -_minutes_between(self.end, event.timestamp)
+        return Violation(
+            user_name=event.user_name,
+            violation_type="early_departure",
+            timestamp=event.timestamp,
+            details=(f"Về sớm {int(early.total_seconds() // 60)} phút "
+                     f"(giờ quy định {self.end.strftime('%H:%M')})"),
+            duration=early
+        )
+
+
+# Luật giờ ca theo loại vi phạm
+SHIFT_RULES = {
+    'early_start': EarlyStartRule,
+    'late_end': LateEndRule,
+    'late_arrival': LateArrivalRule,
+    'early_departure': EarlyDepartureRule,
+}
+
+
+class ViolationRules:
+    """Bộ luật vi phạm dựng một lần từ cấu hình.
+
+    Loại nghỉ được đánh mã số nhỏ theo thứ tự trong cấu hình; nhãn nút bấm
+    và khóa trong config.ini đều tra ra cùng một mã. Mỗi loại sự kiện có
+    sẵn danh sách luật của nó nên kiểm tra một sự kiện là O(1).
+    `shift_checks` chọn các luật giờ ca (xem `SHIFT_RULES`).
+    """
+
+    def __init__(self, break_keys: Dict[str, str] = BREAK_TYPE_KEYS,
+                 durations: Dict[str, int] = BREAK_DURATIONS,
+                 frequencies: Dict[str, int] = BREAK_FREQUENCIES,
+                 work_start: str = WORK_START, work_end: str = WORK_END,
+                 shift_checks: Sequence[str] = SHIFT_CHECKS_BOT):
+        self.labels: List[str] = list(break_keys)
+        self._ids: Dict[str, int] = {}
+        for break_id, (label, key) in enumerate(break_keys.items()):
+            self._ids[label] = break_id
+            self._ids[key] = break_id
+
+        self.work_start = work_start
+        self.work_end = work_end
+        start = datetime.strptime(work_start, '%H:%M').time()
+        end = datetime.strptime(work_end, '%H:%M').time()
+        rules = [
+            BreakDurationRule(self.labels, [durations[label] for label in self.labels]),
+            BreakFrequencyRule(self.labels, [frequencies[label] for label in self.labels]),
+        ]
+        for check in shift_checks:
+            rule = SHIFT_RULES[check]
+            rules.append(rule(start if rule.kind == EVENT_SHIFT_START else end))
+        self._table: Dict[int, list] = {}
+        for rule in rules:
+            self._table.setdefault(rule.kind, []).append(rule)
+
+    def break_id(self, break_type: str) -> Optional[int]:
+        """Mã số của loại nghỉ (nhãn nút bấm hoặc khóa cấu hình), None nếu không có"""
+        return self._ids.get(break_type)
+
+    def check(self, event: RuleEvent) -> List[Violation]:
+        """Kiểm tra một sự kiện"""
+        return self.check_many((event,))
+
+    def check_many(self, events: Iterable[RuleEvent]) -> List[Violation]:
+        """Kiểm tra một loạt sự kiện (dùng khi chạy lại lịch sử, kiểm tra cuối ngày)"""
+        table = self._table
+        violations = []
+        for event in events:
+            if event.break_id is None and event.kind in (EVENT_BREAK_START, EVENT_BREAK_END):
+                continue
+            for rule in table.get(event.kind, ()):
+                violation = rule.check(event)
+                if violation is not None:
+                    violations.append(violation)
+        return violations
+
+    # Các hàm tiện dụng cho handler
+
+    def break_started(self, user_name: str, break_type: str, when: datetime,
+                      count: int) -> List[Violation]:
+        return self.check(RuleEvent(EVENT_BREAK_START, user_name, when, self.break_id(break_type), count))
+
+    def break_ended(self, user_name: str, break_type: str, when: datetime,
+                    duration: timedelta) -> List[Violation]:
+        return self.check(RuleEvent(EVENT_BREAK_END, user_name, when, self.break_id(break_type),
+                                    duration=duration))
+
+    def shift_started(self, user_name: str, when: datetime) -> List[Violation]:
+        return self.check(RuleEvent(EVENT_SHIFT_START, user_name, when))
+
+    def shift_ended(self, user_name: str, when: datetime) -> List[Violation]:
+        return self.check(RuleEvent(EVENT_SHIFT_END, user_name, when))
+
+
+_default_rules: Optional[ViolationRules] = None
+
+
+def get_violation_rules() -> ViolationRules:
+    """Trả về bộ luật vi phạm dùng chung cho toàn ứng dụng"""
+    global _default_rules
+    if _default_rules is None:
+        _default_rules = ViolationRules()
+    return _default_rules
@@ -0,0 +1,293 @@
+import asyncio
+import hmac
+import json
+import logging
+import secrets
+import signal
+import ssl
+from http import HTTPStatus
+from typing import Dict, NamedTuple, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from src.utils.config import (
+    MAX_PENDING_UPDATES,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_URL,
+    WEBHOOK_SECRET,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_CERT,
+    WEBHOOK_KEY
+)
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+# Update lớn nhất của Telegram cỡ vài chục KB
+MAX_BODY_SIZE = 1024 * 1024
+MAX_HEADER_COUNT = 100
+# Đóng kết nối keep-alive không có request mới sau số giây này
+KEEPALIVE_TIMEOUT = 75
+
+
+class HttpRequest(NamedTuple):
+    method: str
+    path: str
+    headers: Dict[str, str]
+    body: bytes
+    keep_alive: bool
+
+
+class HttpError(Exception):
+    def __init__(self, status: HTTPStatus):
+        super().__init__(status.phrase)
+        self.status = status
+
+
+async def read_request(reader: asyncio.StreamReader, max_body: int = MAX_BODY_SIZE) -> Optional[HttpRequest]:
+    """Đọc một request HTTP/1.1 (chỉ hỗ trợ Content-Length), None nếu client đóng kết nối"""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split()
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST)
+
+    headers: Dict[str, str] = {}
+    count = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        # Đếm theo dòng: header lặp lại cùng tên cũng tính
+        count += 1
+        if count > MAX_HEADER_COUNT:
+            raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if 'transfer-encoding' in headers:
+        raise HttpError(HTTPStatus.LENGTH_REQUIRED)
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST)
+    if length < 0:
+        raise HttpError(HTTPStatus.BAD_REQUEST)
+    if length > max_body:
+        raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    body = await reader.readexactly(length) if length else b''
+
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+    return HttpRequest(method.upper(), target.split('?', 1)[0], headers, body, keep_alive)
+
+
+def write_response(writer: asyncio.StreamWriter, status: HTTPStatus, body: bytes = b'',
+                   keep_alive: bool = True, content_type: str = 'application/json',
+                   headers: Optional[Dict[str, str]] = None):
+    lines = [
+        f"HTTP/1.1 {status.value} {status.phrase}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if body:
+        lines.append(f"Content-Type: {content_type}")
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+
+
+class WebhookServer:
+    """Nhận update qua webhook bằng một HTTP server asyncio nhúng trong bot.
+
+    Telegram gửi mỗi update bằng một POST tới `path`, kèm header secret token
+    đã đăng ký ở setWebhook; request sai secret bị từ chối. Update hợp lệ được
+    đưa vào hàng đợi có giới hạn rồi trả 200 ngay, không chờ handler chạy xong.
+    Hàng đợi đầy thì trả 503 để Telegram gửi lại sau. Update được lấy khỏi
+    hàng đợi khi còn chỗ trong số update đang xử lý (`MAX_PENDING_UPDATES`)
+    và chạy qua bộ xử lý update của Application như khi polling.
+
+    Update đã nhận nhưng chưa xử lý sẽ mất nếu bot chết đột ngột, vì Telegram
+    đã nhận 200; giữ hàng đợi nhỏ để giới hạn số update có thể mất.
+    """
+
+    def __init__(self, application: Application, listen: str = WEBHOOK_LISTEN,
+                 port: int = WEBHOOK_PORT, path: str = WEBHOOK_PATH, url: str = WEBHOOK_URL,
+                 secret_token: str = WEBHOOK_SECRET, queue_size: int = WEBHOOK_QUEUE_SIZE,
+                 max_connections: int = WEBHOOK_MAX_CONNECTIONS, cert: str = WEBHOOK_CERT,
+                 key: str = WEBHOOK_KEY):
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.path = '/' + path.strip('/')
+        self.url = url.rstrip('/') + self.path if url else ''
+        # Không cấu hình thì tạo secret mới mỗi lần khởi động (đăng ký lại ở setWebhook)
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self.max_connections = max_connections
+        self.cert = cert
+        self.key = key
+        self.queue: "asyncio.Queue[Update]" = asyncio.Queue(maxsize=queue_size)
+        self._slots = asyncio.Semaphore(MAX_PENDING_UPDATES)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._pump: Optional[asyncio.Task] = None
+        self.received = 0
+        self.rejected = 0
+        self.overflowed = 0
+
+    def _ssl_context(self) -> Optional[ssl.SSLContext]:
+        if not self.cert:
+            return None
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(self.cert, self.key or None)
+        return context
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.listen, self.port, ssl=self._ssl_context()
+        )
+        # Lấy cổng thật khi cấu hình cổng 0
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._pump = asyncio.create_task(self._pump_updates())
+        logger.info(f"Webhook server đang nghe {self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._pump is not None:
+            self._pump.cancel()
+            try:
+                await self._pump
+            except asyncio.CancelledError:
+                pass
+            self._pump = None
+        if not self.queue.empty():
+            logger.warning(f"Bỏ {self.queue.qsize()} update chưa xử lý khi dừng webhook server")
+
+    async def set_webhook(self):
+        """Đăng ký URL và secret token với Telegram"""
+        if not self.url:
+            raise ValueError("Chưa cấu hình [webhook] url cho chế độ webhook")
+        certificate = open(self.cert, 'rb') if self.cert else None
+        try:
+            await self.application.bot.set_webhook(
+                url=self.url,
+                certificate=certificate,
+                max_connections=self.max_connections,
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=False,
+                secret_token=self.secret_token
+            )
+        finally:
+            if certificate is not None:
+                certificate.close()
+        logger.info(f"Đã đăng ký webhook {self.url}")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), KEEPALIVE_TIMEOUT)
+                except HttpError as e:
+                    write_response(writer, e.status, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                status, headers = self._accept(request)
+                write_response(writer, status, keep_alive=request.keep_alive, headers=headers)
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Lỗi kết nối webhook: {e}")
+        finally:
+            writer.close()
+
+    def _accept(self, request: HttpRequest):
+        """Kiểm tra request và đưa update vào hàng đợi, trả về (mã HTTP, header thêm)"""
+        if request.path != self.path:
+            return HTTPStatus.NOT_FOUND, None
+        if request.method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'Allow': 'POST'}
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            self.rejected += 1
+            logger.warning("Từ chối request webhook sai secret token")
+            return HTTPStatus.FORBIDDEN, None
+        try:
+            update = Update.de_json(json.loads(request.body), self.application.bot)
+        except Exception as e:
+            logger.error(f"Update webhook không hợp lệ: {e}")
+            return HTTPStatus.BAD_REQUEST, None
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.overflowed += 1
+            logger.warning(f"Hàng đợi webhook đầy ({self.queue.maxsize}), Telegram sẽ gửi lại update {update.update_id}")
+            return HTTPStatus.SERVICE_UNAVAILABLE, {'Retry-After': '1'}
+        self.received += 1
+        return HTTPStatus.OK, None
+
+    async def _pump_updates(self):
+        """Lấy update khỏi hàng đợi khi còn chỗ xử lý"""
+        while True:
+            update = await self.queue.get()
+            await self._slots.acquire()
+            self.application.create_task(self._process(update), update=update)
+
+    async def _process(self, update: Update):
+        try:
+            processor = self.application.update_processor
+            await processor.process_update(update, self.application.process_update(update))
+        finally:
+            self._slots.release()
+            self.queue.task_done()
+
+
+def run_webhook(application: Application, server: Optional[WebhookServer] = None):
+    """Chạy bot ở chế độ webhook cho tới khi nhận Ctrl+C/SIGTERM.
+
+    Cùng vòng đời với `run_polling`: initialize, post_init, nhận update,
+    start; khi dừng: stop, post_stop, shutdown, post_shutdown.
+    """
+    server = server or WebhookServer(application)
+    asyncio.run(_serve(application, server))
+
+
+async def _serve(application: Application, server: WebhookServer):
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: Ctrl+C vẫn dừng bot qua KeyboardInterrupt
+            pass
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await server.start()
+        await application.start()
+        await server.set_webhook()
+        await stopping.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,81 @@
+from typing import Dict, List, NamedTuple, Optional
+
+from telegram import KeyboardButton, Message, ReplyKeyboardMarkup
+from telegram.ext import filters
+
+from src.services.violation_rules import get_violation_rules
+from src.utils.config import BUTTON_LABELS, BREAK_TYPE_KEYS
+
+# Hành động của nút bấm (khác ACTION_* của lịch sử chấm công)
+ROUTE_START_SHIFT = 0
+ROUTE_END_SHIFT = 1
+ROUTE_BREAK = 2
+ROUTE_END_BREAK = 3
+
+# Số nút mỗi hàng bàn phím
+KEYBOARD_COLUMNS = 2
+
+
+class Route(NamedTuple):
+    action: int
+    break_type: Optional[str] = None
+    break_id: Optional[int] = None
+
+
+class ButtonFilter(filters.MessageFilter):
+    """Chỉ nhận tin nhắn trùng đúng nhãn một nút (tra dict, không duyệt danh sách)"""
+    __slots__ = ('routes',)
+
+    def __init__(self, routes: Dict[str, Route]):
+        self.routes = routes
+        super().__init__(name="ButtonFilter")
+
+    def filter(self, message: Message) -> bool:
+        return message.text in self.routes if message.text else False
+
+
+class ButtonRouter:
+    """Bảng nút bấm dựng một lần từ config.ini.
+
+    Nhãn nút -> (hành động, loại nghỉ, mã số loại nghỉ). Thêm loại nghỉ chỉ
+    cần thêm vào [break_types], [break_durations] và [break_frequencies].
+    Tin nhắn không phải nút bấm bị loại ngay ở filter của MessageHandler.
+    """
+
+    def __init__(self, buttons: Dict[str, str] = BUTTON_LABELS,
+                 break_keys: Dict[str, str] = BREAK_TYPE_KEYS):
+        rules = get_violation_rules()
+        self.routes: Dict[str, Route] = {
+            buttons['start_shift']: Route(ROUTE_START_SHIFT),
+            buttons['end_shift']: Route(ROUTE_END_SHIFT),
+            buttons['end_break']: Route(ROUTE_END_BREAK),
+        }
+        for label in break_keys:
+            self.routes[label] = Route(ROUTE_BREAK, label, rules.break_id(label))
+        self.filter = ButtonFilter(self.routes)
+
+        # Hàng đầu: lên ca / xuống ca, sau đó các loại nghỉ và nút trở lại
+        labels = list(break_keys) + [buttons['end_break']]
+        self._rows: List[List[str]] = [[buttons['start_shift'], buttons['end_shift']]] + [
+            labels[i:i + KEYBOARD_COLUMNS] for i in range(0, len(labels), KEYBOARD_COLUMNS)
+        ]
+
+    def route(self, text: Optional[str]) -> Optional[Route]:
+        return self.routes.get(text)
+
+    def keyboard(self) -> ReplyKeyboardMarkup:
+        return ReplyKeyboardMarkup(
+            [[KeyboardButton(label) for label in row] for row in self._rows],
+            resize_keyboard=True
+        )
+
+
+_default_router: Optional[ButtonRouter] = None
+
+
+def get_button_router() -> ButtonRouter:
+    """Trả về bảng nút bấm dùng chung cho toàn ứng dụng"""
+    global _default_router
+    if _default_router is None:
+        _default_router = ButtonRouter()
+    return _default_router
@@ -13,24 +13,104 @@ BOT_TOKEN = config['telegram']['YOUR_BOT_TOKEN']
 ADMIN_ID = [int(id.strip()) for id in config['telegram']['admin_id'].split(',')]
 MAIN_ADMIN_ID = ADMIN_ID[0] if ADMIN_ID else None
 
+# Nhãn các nút cố định: hành động -> nhãn
+BUTTON_LABELS = {
+    'start_shift': config.get('buttons', 'start_shift', fallback="🚀 Lên ca (上班)"),
+    'end_shift': config.get('buttons', 'end_shift', fallback="🏁 Xuống ca (下班)"),
+    'end_break': config.get('buttons', 'end_break', fallback="↩️ Trở lại chỗ ngồi (返回)"),
+}
+
+# Loại nghỉ: nhãn nút bấm -> khóa trong config.ini (theo thứ tự trong [break_types])
+BREAK_TYPE_KEYS = {
+    label: key for key, label in config['break_types'].items()
+} if config.has_section('break_types') else {
+    "🚽 Vệ sinh (厕所)": 've_sinh',
+    "🚬 Hút thuốc (抽烟)": 'hut_thuoc',
+    "🍚 Ăn cơm (吃饭)": 'an_com'
+}
+
 # Break durations (minutes)
 BREAK_DURATIONS = {
-    "🚽 Vệ sinh (厕所)": int(config['break_durations']['ve_sinh']),
-    "🚬 Hút thuốc (抽烟)": int(config['break_durations']['hut_thuoc']), 
-    "🍚 Ăn cơm (吃饭)": int(config['break_durations']['an_com'])
+    label: config.getint('break_durations', key) for label, key in BREAK_TYPE_KEYS.items()
 }
 
 # Break frequencies per shift
 BREAK_FREQUENCIES = {
-    "🚽 Vệ sinh (厕所)": int(config['break_frequencies']['ve_sinh']),
-    "🚬 Hút thuốc (抽烟)": int(config['break_frequencies']['hut_thuoc']),
-    "🍚 Ăn cơm (吃饭)": int(config['break_frequencies']['an_com'])
+    label: config.getint('break_frequencies', key) for label, key in BREAK_TYPE_KEYS.items()
 }
 
 # Working hours
 WORK_START = config['working_hours']['start_time']
 WORK_END = config['working_hours']['end_time']
 
+# Persistence (journal + snapshot)
+JOURNAL_SYNC_INTERVAL = config.getfloat('persistence', 'journal_sync_interval', fallback=1.0)
+JOURNAL_SYNC_BATCH = config.getint('persistence', 'journal_sync_batch', fallback=50)
+CHECKPOINT_INTERVAL = config.getint('persistence', 'checkpoint_interval', fallback=300)
+PERSISTENCE_QUEUE_SIZE = config.getint('persistence', 'queue_size', fallback=10000)
+
+# Cảnh báo nghỉ quá giờ: số phút sau khi hết giờ nghỉ cho mỗi mức
+OVERTIME_REMINDER_AFTER = config.getint('alerts', 'reminder_after', fallback=5)
+OVERTIME_ESCALATE_AFTER = config.getint('alerts', 'escalate_after', fallback=15)
+OVERTIME_FINAL_AFTER = config.getint('alerts', 'final_after', fallback=30)
+
+# Vi phạm: số ngày giữ trong bộ nhớ và số ngày giữ trong nhật ký
+VIOLATION_MEMORY_DAYS = config.getint('violations', 'memory_days', fallback=7)
+VIOLATION_RETENTION_DAYS = config.getint('violations', 'retention_days', fallback=180)
+
+# Gửi báo cáo dài
+REPORT_MESSAGE_LIMIT = min(config.getint('reports', 'message_limit', fallback=4096), 4096)
+REPORT_DOCUMENT_THRESHOLD = config.getint('reports', 'document_threshold', fallback=16000)
+
+# Giới hạn tốc độ gửi tin (tin/giây): toàn bot và từng chat
+DISPATCH_GLOBAL_RATE = config.getfloat('dispatcher', 'global_rate', fallback=30)
+DISPATCH_PER_CHAT_RATE = config.getfloat('dispatcher', 'per_chat_rate', fallback=1)
+DISPATCH_MAX_RETRIES = config.getint('dispatcher', 'max_retries', fallback=3)
+
+# Hàng đợi gửi tin: số worker, số lần thử, thời gian chờ giữa các lần thử (giây)
+OUTBOX_WORKERS = config.getint('outbox', 'workers', fallback=4)
+OUTBOX_MAX_ATTEMPTS = config.getint('outbox', 'max_attempts', fallback=8)
+OUTBOX_BACKOFF_BASE = config.getfloat('outbox', 'backoff_base', fallback=2)
+OUTBOX_BACKOFF_MAX = config.getfloat('outbox', 'backoff_max', fallback=600)
+OUTBOX_SENT_RETENTION_DAYS = config.getint('outbox', 'sent_retention_days', fallback=7)
+
+# Gom thông báo vi phạm gửi admin: độ dài cửa sổ (giây), số phút quá giờ thì gửi ngay
+DIGEST_WINDOW = config.getint('digest', 'window', fallback=60)
+DIGEST_URGENT_OVERTIME = config.getint('digest', 'urgent_overtime', fallback=15)
+
+# Pool kết nối HTTP tới Bot API dùng chung
+HTTP_POOL_SIZE = config.getint('http', 'pool_size', fallback=32)
+HTTP_KEEPALIVE_CONNECTIONS = config.getint('http', 'keepalive_connections', fallback=16)
+HTTP_KEEPALIVE_EXPIRY = config.getfloat('http', 'keepalive_expiry', fallback=30)
+HTTP_CONNECT_TIMEOUT = config.getfloat('http', 'connect_timeout', fallback=5)
+HTTP_READ_TIMEOUT = config.getfloat('http', 'read_timeout', fallback=10)
+HTTP_WRITE_TIMEOUT = config.getfloat('http', 'write_timeout', fallback=10)
+HTTP_POOL_TIMEOUT = config.getfloat('http', 'pool_timeout', fallback=5)
+
+# Xử lý update song song, giữ thứ tự theo user
+CONCURRENT_UPDATES = config.getint('updates', 'concurrent', fallback=32)
+MAX_PENDING_UPDATES = config.getint('updates', 'max_pending', fallback=1024)
+
+# Chống xử lý trùng: kích thước LRU và cửa sổ bấm trùng (giây)
+UPDATE_CACHE_SIZE = config.getint('updates', 'cache_size', fallback=10000)
+UPDATE_DEBOUNCE = config.getfloat('updates', 'debounce', fallback=3)
+
+# Xử lý bù các update dồn lại lúc bot ngừng
+CATCH_UP_BATCH = min(config.getint('updates', 'catch_up_batch', fallback=100), 100)
+CATCH_UP_MAX_AGE = config.getint('updates', 'catch_up_max_age', fallback=720)
+
+# Nhận update: polling hoặc webhook
+UPDATE_MODE = config.get('updates', 'mode', fallback='polling').strip().lower()
+WEBHOOK_URL = config.get('webhook', 'url', fallback='').strip()
+WEBHOOK_LISTEN = config.get('webhook', 'listen', fallback='0.0.0.0').strip()
+WEBHOOK_PORT = config.getint('webhook', 'port', fallback=8443)
+WEBHOOK_PATH = config.get('webhook', 'path', fallback='/telegram').strip()
+WEBHOOK_SECRET = config.get('webhook', 'secret_token', fallback='').strip()
+WEBHOOK_QUEUE_SIZE = config.getint('webhook', 'queue_size', fallback=256)
+WEBHOOK_MAX_CONNECTIONS = config.getint('webhook', 'max_connections', fallback=40)
+WEBHOOK_CERT = config.get('webhook', 'cert', fallback='').strip()
+WEBHOOK_KEY = config.get('webhook', 'key', fallback='').strip()
+
 # Action permissions
 AUTHORIZED_USERS = [int(id.strip()) for id in config['group_action_permissions']['authorized_users'].split(',')]
 ALLOWED_ACTIONS = config['group_action_permissions']['allowed_actions'].split(',')
@@ -39,11 +119,57 @@ __all__ = [
     'BOT_TOKEN',
     'ADMIN_ID',
     'MAIN_ADMIN_ID',
+    'BUTTON_LABELS',
+    'BREAK_TYPE_KEYS',
     'BREAK_DURATIONS',
     'BREAK_FREQUENCIES',
     'WORK_START',
     'WORK_END',
     'AUTHORIZED_USERS',
     'ALLOWED_ACTIONS',
-    'VN_TIMEZONE'
+    'VN_TIMEZONE',
+    'JOURNAL_SYNC_INTERVAL',
+    'JOURNAL_SYNC_BATCH',
+    'CHECKPOINT_INTERVAL',
+    'PERSISTENCE_QUEUE_SIZE',
+    'REPORT_MESSAGE_LIMIT',
+    'REPORT_DOCUMENT_THRESHOLD',
+    'DISPATCH_GLOBAL_RATE',
+    'DISPATCH_PER_CHAT_RATE',
+    'DISPATCH_MAX_RETRIES',
+    'OUTBOX_WORKERS',
+    'OUTBOX_MAX_ATTEMPTS',
+    'OUTBOX_BACKOFF_BASE',
+    'OUTBOX_BACKOFF_MAX',
+    'OUTBOX_SENT_RETENTION_DAYS',
+    'DIGEST_WINDOW',
+    'DIGEST_URGENT_OVERTIME',
+    'HTTP_POOL_SIZE',
+    'HTTP_KEEPALIVE_CONNECTIONS',
+    'HTTP_KEEPALIVE_EXPIRY',
+    'HTTP_CONNECT_TIMEOUT',
+    'HTTP_READ_TIMEOUT',
+    'HTTP_WRITE_TIMEOUT',
+    'HTTP_POOL_TIMEOUT',
+    'CONCURRENT_UPDATES',
+    'MAX_PENDING_UPDATES',
+    'UPDATE_CACHE_SIZE',
+    'UPDATE_DEBOUNCE',
+    'CATCH_UP_BATCH',
+    'CATCH_UP_MAX_AGE',
+    'UPDATE_MODE',
+    'WEBHOOK_URL',
+    'WEBHOOK_LISTEN',
+    'WEBHOOK_PORT',
+    'WEBHOOK_PATH',
+    'WEBHOOK_SECRET',
+    'WEBHOOK_QUEUE_SIZE',
+    'WEBHOOK_MAX_CONNECTIONS',
+    'WEBHOOK_CERT',
+    'WEBHOOK_KEY',
+    'OVERTIME_REMINDER_AFTER',
+    'OVERTIME_ESCALATE_AFTER',
+    'OVERTIME_FINAL_AFTER',
+    'VIOLATION_MEMORY_DAYS',
+    'VIOLATION_RETENTION_DAYS'
 ]
\ No newline at end of file
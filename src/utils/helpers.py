@@ -1,10 +1,16 @@
 import pickle
 from pathlib import Path
 import logging
-from typing import Dict
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from datetime import date, datetime, timedelta
 
 from src.models import UserState
+from src.services.persistence import get_persistence
+from src.services.history_store import get_history_store
+from src.services.shift_ledger import get_shift_ledger
+from src.services.daily_aggregates import get_daily_aggregates
+from src.services.violation_manager import get_violation_manager
+from src.services.report_cache import Segment, get_report_cache
 from src.utils.config import VN_TIMEZONE
 
 logger = logging.getLogger(__name__)
@@ -13,108 +19,272 @@ logger = logging.getLogger(__name__)
 BASE_DIR = Path(__file__).parent.parent.parent
 STATE_FILE = BASE_DIR / 'data' / 'user_states.pkl'
 
-def save_user_states(user_states: Dict[str, UserState]):
-    """Lưu trạng thái người dùng vào file"""
+def save_user_state(user_id: str, state: UserState, event: str):
+    """Ghi nhận thay đổi trạng thái của một người dùng vào journal"""
+    try:
+        get_persistence().record(event, user_id, state)
+    except Exception as e:
+        logger.error(f"Lỗi khi lưu trạng thái user {user_id}: {e}")
+
+def save_user_states(user_states: Dict[str, UserState], event: str):
+    """Ghi nhận thay đổi của các người dùng vào journal"""
     try:
         logger.debug(f"Đang lưu {len(user_states)} trạng thái người dùng")
-        for user_id, state in user_states.items():
-            logger.debug(f"Lưu trạng thái cho user {state.user_name}")
-        
-        with open(STATE_FILE, 'wb') as f:
-            pickle.dump(user_states, f)
-        logger.info("Đã lưu trạng thái người dùng thành công")
+        get_persistence().record_many(event, user_states)
     except Exception as e:
         logger.error(f"Lỗi khi lưu user states: {e}")
 
-def generate_today_stats(user_states: Dict[str, UserState]) -> str:
+def checkpoint_user_states(user_states: Dict[str, UserState]) -> int:
+    """Ghi các trạng thái thay đổi vào snapshot, trả về số user đã ghi"""
+    try:
+        return get_persistence().checkpoint(user_states)
+    except Exception as e:
+        logger.error(f"Lỗi khi tạo snapshot user states: {e}")
+        return 0
+
+def load_user_states() -> Dict[str, UserState]:
+    """Đọc snapshot + journal, chuyển dữ liệu từ file pickle cũ nếu cần"""
+    persistence = get_persistence()
+    states = persistence.load()
+    if not states and STATE_FILE.exists():
+        try:
+            with open(STATE_FILE, 'rb') as f:
+                legacy_states = pickle.load(f)
+            states = {str(k): v for k, v in legacy_states.items() if isinstance(v, UserState)}
+            for state in states.values():
+                state.mark_dirty()
+            persistence.checkpoint(states)
+            logger.info(f"Đã chuyển {len(states)} trạng thái từ {STATE_FILE.name} sang SQLite")
+        except Exception as e:
+            logger.error(f"Lỗi khi đọc user states cũ: {e}")
+    persistence.start()
+    return states
+
+def close_user_states(user_states: Dict[str, UserState]):
+    """Tạo snapshot cuối, ghi nốt hàng đợi và đóng journal (gọi khi tắt bot)"""
+    try:
+        persistence = get_persistence()
+        persistence.checkpoint(user_states)
+        persistence.close()
+        logger.info("Đã ghi toàn bộ trạng thái trước khi tắt")
+    except Exception as e:
+        logger.error(f"Lỗi khi đóng user states: {e}")
+
+def record_history(user_id, user_name: str, action: str, when: datetime,
+                   break_type: Optional[str] = None):
+    """Ghi thêm một hành động vào lịch sử chấm công"""
+    try:
+        get_history_store().append(user_id, user_name, action, when, break_type)
+    except Exception as e:
+        logger.error(f"Lỗi khi ghi lịch sử chấm công: {e}")
+
+def record_history_many(user_states: Dict[str, UserState], action: str, when: datetime,
+                        break_type: Optional[str] = None):
+    """Ghi cùng một hành động của nhiều người (thao tác admin, tự động xuống ca)"""
+    try:
+        get_history_store().append_many(
+            (user_id, state.user_name, action, when, break_type)
+            for user_id, state in user_states.items()
+        )
+    except Exception as e:
+        logger.error(f"Lỗi khi ghi lịch sử chấm công: {e}")
+
+def record_closed_shift(user_id, state: UserState):
+    """Ghi ca vừa kết thúc vào sổ ca"""
+    try:
+        get_shift_ledger().record_shift(user_id, state)
+    except Exception as e:
+        logger.error(f"Lỗi khi ghi sổ ca cho user {user_id}: {e}")
+
+def format_seconds(seconds) -> str:
+    """Định dạng số giây thành H:MM:SS"""
+    return str(timedelta(seconds=int(seconds)))
+
+def rebuild_daily_aggregates(user_states: Dict[str, UserState]):
+    """Dựng lại tổng theo ngày lúc khởi động"""
+    try:
+        get_daily_aggregates().rebuild(user_states, get_shift_ledger(), get_violation_manager().log)
+    except Exception as e:
+        logger.error(f"Lỗi khi dựng lại tổng theo ngày: {e}")
+
+def _cached_report(key, build) -> str:
+    """Lấy báo cáo từ cache, dựng lại khi trạng thái ca/nghỉ đã thay đổi"""
+    return get_report_cache().get(key, get_daily_aggregates().version, build)
+
+def _live_work(work_seconds: int, shift_start: datetime, shift_break_seconds: int):
+    """Đoạn báo cáo "đang làm", tính lại theo thời điểm render"""
+    def segment(now: datetime) -> str:
+        open_shift = int((now - shift_start).total_seconds()) - shift_break_seconds
+        return format_seconds(work_seconds + open_shift)
+    return segment
+
+def _live_break(break_start: datetime):
+    """Đoạn báo cáo "đang nghỉ", tính lại theo thời điểm render"""
+    return lambda now: str(now - break_start).split('.')[0]
+
+def generate_today_stats() -> str:
     """Tạo thống kê hôm nay"""
-    now = datetime.now(VN_TIMEZONE)
-    stats = f"📊 Thống kê ngày {now.strftime('%d/%m/%Y')}:\n\n"
+    today = datetime.now(VN_TIMEZONE).date()
+    return _cached_report(('today_stats', today), lambda: _build_today_stats(today))
+
+def _build_today_stats(today: date) -> List[Segment]:
+    segments = [f"📊 Thống kê ngày {today.strftime('%d/%m/%Y')}:\n\n"]
     
     has_data = False
-    for state in user_states.values():
-        if state.is_working or (state.start_time and state.start_time.date() == now.date()):
-            has_data = True
-            stats += f"👤 {state.user_name}:\n"
-            if state.is_working:
-                work_time = now - state.start_time
-                total_breaks = sum(state.breaks.values(), timedelta())
-                actual_work = work_time - total_breaks
-                stats += f"⏱ Đang làm: {str(actual_work).split('.')[0]}\n"
-                if state.current_break:
-                    stats += f"🚽 Đang nghỉ: {state.current_break}\n"
-            elif state.end_time:
-                work_time = state.end_time - state.start_time
-                total_breaks = sum(state.breaks.values(), timedelta())
-                actual_work = work_time - total_breaks
-                stats += f"⏱ Đã làm: {str(actual_work).split('.')[0]}\n"
-            else:
-                stats += "🔴 Đã xuống ca\n"
-            
-            stats += "🚽 Số lần nghỉ:\n"
-            for break_type, count in state.break_counts.items():
-                stats += f"- {break_type}: {count}\n"
-            stats += "\n"
+    for totals in get_daily_aggregates().day(today):
+        has_data = True
+        segments.append(f"👤 {totals.user_name}:\n")
+        if totals.is_working:
+            segments += [
+                "⏱ Đang làm: ",
+                _live_work(totals.work_seconds, totals.shift_start, totals.shift_break_seconds),
+                "\n"
+            ]
+            if totals.current_break:
+                segments.append(f"🚽 Đang nghỉ: {totals.current_break}\n")
+        else:
+            segments.append(f"⏱ Đã làm: {format_seconds(totals.work_seconds)}\n")
+        
+        segments.append("🚽 Số lần nghỉ:\n")
+        for break_type, count in totals.break_counts.items():
+            segments.append(f"- {break_type}: {count}\n")
+        segments.append("\n")
     
     if not has_data:
-        stats += "Không có dữ liệu cho ngày hôm nay"
+        segments.append("Không có dữ liệu cho ngày hôm nay")
     
-    return stats
+    return segments
+
+def generate_all_stats(user_states: Dict[str, UserState]) -> str:
+    """Tạo thống kê tổng trạng thái hiện tại của mọi nhân viên"""
+    return _cached_report(('all_stats',), lambda: _build_all_stats(user_states))
+
+def _build_all_stats(user_states: Dict[str, UserState]) -> List[Segment]:
+    segments = ["📊 Thống kê tổng:\n\n"]
+    for state in user_states.values():
+        block = f"👤 {state.user_name}:\n"
+        block += f"🟢 Trạng thái: {'Đang làm' if state.is_working else 'Không làm'}\n"
+        if state.current_break:
+            block += f"🚽 Đang nghỉ: {state.current_break}\n"
+        if state.is_working and state.start_time:
+            block += f"⏰ Bắt đầu ca: {state.start_time.strftime('%H:%M:%S')}\n"
+        segments.append(block + "\n")
+    
+    if not user_states:
+        segments.append("Chưa có dữ liệu")
+    return segments
+
+def generate_range_report(title: str, start: datetime, end: datetime,
+                          user_states: Dict[str, UserState]) -> List[Segment]:
+    """Tạo báo cáo tổng hợp từ sổ ca trong khoảng [start, end), cộng thêm các ca đang mở"""
+    totals = get_shift_ledger().aggregate(start, end)
+
+    # Ca đang mở chưa có trong sổ ca
+    open_shifts = {}
+    for user_id, state in user_states.items():
+        if state.is_working and state.start_time and start <= state.start_time < end:
+            open_shifts[int(user_id)] = state
+
+    segments = [title]
+    for user_id in sorted(set(totals) | set(open_shifts),
+                          key=lambda uid: (totals[uid].user_name if uid in totals
+                                           else open_shifts[uid].user_name) or ''):
+        row = totals.get(user_id)
+        shifts = row.shifts if row else 0
+        work_seconds = row.work_seconds if row else 0
+        break_seconds = dict(row.break_seconds_by_type) if row else {}
+        break_counts = dict(row.break_counts_by_type) if row else {}
+        user_name = row.user_name if row else open_shifts[user_id].user_name
+
+        state = open_shifts.get(user_id)
+        if state:
+            shifts += 1
+            current_breaks = 0
+            for break_type, duration in state.breaks.items():
+                seconds = int(duration.total_seconds())
+                current_breaks += seconds
+                break_seconds[break_type] = break_seconds.get(break_type, 0) + seconds
+            for break_type, count in state.break_counts.items():
+                break_counts[break_type] = break_counts.get(break_type, 0) + count
+            work = _live_work(work_seconds, state.start_time, current_breaks)
+        else:
+            work = format_seconds(work_seconds)
+
+        segments += [
+            f"👤 {user_name}:\n",
+            f"📅 Số ca: {shifts}{' (đang làm)' if state else ''}\n",
+            "⏱ Tổng thời gian làm: ", work, "\n"
+        ]
+        report = f"🚽 Tổng thời gian nghỉ: {format_seconds(sum(break_seconds.values()))}\n"
+        for break_type, seconds in break_seconds.items():
+            if seconds or break_counts.get(break_type):
+                report += f"- {break_type}: {format_seconds(seconds)} ({break_counts.get(break_type, 0)} lần)\n"
+        segments.append(report + "\n")
+
+    if not totals and not open_shifts:
+        segments.append("Không có dữ liệu")
+    return segments
 
 def generate_weekly_report(user_states: Dict[str, UserState]) -> str:
     """Tạo báo cáo tuần"""
     now = datetime.now(VN_TIMEZONE)
-    start_of_week = now - timedelta(days=now.weekday())
-    report = f"📑 Báo cáo tuần {start_of_week.strftime('%d/%m')} - {now.strftime('%d/%m/%Y')}:\n\n"
-    
-    for state in user_states.values():
-        if state.start_time and state.start_time.date() >= start_of_week.date():
-            report += f"👤 {state.user_name}:\n"
-            total_work = timedelta()
-            total_breaks = timedelta()
-            
-            if state.end_time:
-                total_work = state.end_time - state.start_time
-                total_breaks = sum(state.breaks.values(), timedelta())
-            
-            report += f"⏱ Tổng thời gian làm: {str(total_work).split('.')[0]}\n"
-            report += f"🚽 Tổng thời gian nghỉ: {str(total_breaks).split('.')[0]}\n\n"
-    return report
+    start_of_week = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    title = f"📑 Báo cáo tuần {start_of_week.strftime('%d/%m')} - {now.strftime('%d/%m/%Y')}:\n\n"
+    # Giữa hai lần đổi trạng thái sổ ca không có ca mới, nên mốc cuối chỉ cần theo ngày
+    end_of_day = start_of_week + timedelta(days=now.weekday() + 1)
+    return _cached_report(
+        ('weekly', start_of_week.date(), now.date()),
+        lambda: generate_range_report(title, start_of_week, end_of_day, user_states)
+    )
 
-def generate_daily_report(user_states: Dict[str, UserState]) -> str:
-    """Tạo báo cáo ngày"""
-    today = datetime.now(VN_TIMEZONE).date()
-    report = f"📋 Báo cáo ngày {today.strftime('%d/%m/%Y')}:\n\n"
+def generate_monthly_report(user_states: Dict[str, UserState]) -> str:
+    """Tạo báo cáo tháng"""
+    now = datetime.now(VN_TIMEZONE)
+    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    title = f"🗓 Báo cáo tháng {now.strftime('%m/%Y')}:\n\n"
+    end_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return _cached_report(
+        ('monthly', start_of_month.date(), now.date()),
+        lambda: generate_range_report(title, start_of_month, end_of_day, user_states)
+    )
+
+def generate_daily_report(day: Optional[date] = None) -> str:
+    """Tạo báo cáo ngày (mặc định hôm nay)"""
+    day = day or datetime.now(VN_TIMEZONE).date()
+    return _cached_report(('daily', day), lambda: _build_daily_report(day))
+
+def _build_daily_report(day: date) -> List[Segment]:
+    segments = [f"📋 Báo cáo ngày {day.strftime('%d/%m/%Y')}:\n\n"]
     
     has_data = False
-    for state in user_states.values():
-        if state.is_working or (state.start_time and state.start_time.date() == today):
-            has_data = True
-            report += f"👤 {state.user_name}:\n"
-            
-            if state.is_working:
-                current_time = datetime.now(VN_TIMEZONE)
-                work_duration = current_time - state.start_time
-                total_breaks = sum(state.breaks.values(), timedelta())
-                actual_work = work_duration - total_breaks
-                report += f"⏱ Đang làm: {str(actual_work).split('.')[0]}\n"
-                report += f"⏰ Bắt đầu: {state.start_time.strftime('%H:%M:%S')}\n"
-                
-                if state.current_break:
-                    break_duration = current_time - state.break_start_time
-                    report += f"🚽 Đang nghỉ: {state.current_break} ({str(break_duration).split('.')[0]})\n"
-            
-            elif state.end_time:
-                work_duration = state.end_time - state.start_time
-                total_breaks = sum(state.breaks.values(), timedelta())
-                actual_work = work_duration - total_breaks
-                report += f"✅ Đã xong ca\n"
-                report += f"⏰ Thời gian làm thực tế: {str(actual_work).split('.')[0]}\n"
+    for totals in get_daily_aggregates().day(day):
+        has_data = True
+        segments.append(f"👤 {totals.user_name}:\n")
+        
+        if totals.is_working:
+            segments += [
+                "⏱ Đang làm: ",
+                _live_work(totals.work_seconds, totals.shift_start, totals.shift_break_seconds),
+                f"\n⏰ Bắt đầu: {totals.shift_start.strftime('%H:%M:%S')}\n"
+            ]
             
-            report += f"🚽 Tổng thời gian nghỉ: {str(sum(state.breaks.values(), timedelta())).split('.')[0]}\n"
-            report += f"📊 Số lần nghỉ: {sum(state.break_counts.values())}\n\n"
+            if totals.current_break:
+                segments += [
+                    f"🚽 Đang nghỉ: {totals.current_break} (",
+                    _live_break(totals.break_start),
+                    ")\n"
+                ]
+        else:
+            segments.append(f"✅ Đã xong ca\n"
+                            f"⏰ Thời gian làm thực tế: {format_seconds(totals.work_seconds)}\n")
+        
+        report = f"🚽 Tổng thời gian nghỉ: {format_seconds(totals.total_break_seconds)}\n"
+        report += f"📊 Số lần nghỉ: {totals.total_break_count}\n"
+        if totals.violation_count:
+            report += f"⚠️ Số lần vi phạm: {totals.violation_count}\n"
+        segments.append(report + "\n")
     
     if not has_data:
-        report += "Không có dữ liệu cho ngày hôm nay"
+        segments.append("Không có dữ liệu cho ngày này")
     
-    return report
\ No newline at end of file
+    return segments
@@ -0,0 +1,139 @@
+import logging
+from datetime import datetime
+from typing import Iterable, Iterator, List
+
+from telegram import Update
+
+from src.utils.config import (
+    VN_TIMEZONE,
+    REPORT_MESSAGE_LIMIT,
+    REPORT_DOCUMENT_THRESHOLD
+)
+from src.services.dispatcher import get_dispatcher
+from src.services.outbox import get_outbox, PRIORITY_LOW
+
+logger = logging.getLogger(__name__)
+
+# Giới hạn chú thích file của Telegram
+CAPTION_LIMIT = 1024
+
+# Trả lời khi báo cáo không có nội dung (Telegram không gửi được tin rỗng)
+EMPTY_REPORT = "📭 Chưa có dữ liệu"
+
+
+def iter_blocks(text: str) -> Iterator[str]:
+    """Tách báo cáo thành các khối (tiêu đề, từng nhân viên) theo dòng trống"""
+    start = 0
+    while True:
+        end = text.find("\n\n", start)
+        if end < 0:
+            if start < len(text):
+                yield text[start:]
+            return
+        yield text[start:end + 2]
+        start = end + 2
+
+
+def _split_long(block: str, limit: int) -> Iterator[str]:
+    """Chia một khối dài hơn giới hạn theo dòng, cắt cứng nếu một dòng quá dài"""
+    for line in block.splitlines(keepends=True):
+        for i in range(0, len(line), limit):
+            yield line[i:i + limit]
+
+
+def pack_chunks(blocks: Iterable[str], limit: int = REPORT_MESSAGE_LIMIT) -> Iterator[str]:
+    """Gom các khối thành các tin nhắn không vượt quá `limit` ký tự"""
+    parts: List[str] = []
+    size = 0
+    for block in blocks:
+        pieces = _split_long(block, limit) if len(block) > limit else (block,)
+        for piece in pieces:
+            if size + len(piece) > limit:
+                yield ''.join(parts)
+                parts, size = [], 0
+            parts.append(piece)
+            size += len(piece)
+    if parts:
+        yield ''.join(parts)
+
+
+def split_report(text: str, limit: int = REPORT_MESSAGE_LIMIT) -> List[str]:
+    """Các tin nhắn cần gửi cho một báo cáo (bỏ các đoạn rỗng)"""
+    return [chunk.strip() for chunk in pack_chunks(iter_blocks(text), limit) if chunk.strip()]
+
+
+def _document_name(title: str) -> str:
+    return f"{title}_{datetime.now(VN_TIMEZONE).strftime('%Y%m%d_%H%M')}.txt"
+
+
+async def send_report(bot, chat_id: int, text: str, title: str = 'bao_cao'):
+    """Gửi báo cáo theo từng phần vừa một tin nhắn, hoặc dạng file nếu quá dài.
+
+    Các phần được gửi tuần tự qua dispatcher, nhịp gửi theo giới hạn của từng chat.
+    """
+    dispatcher = get_dispatcher()
+    if len(text) > REPORT_DOCUMENT_THRESHOLD:
+        caption = text.split("\n", 1)[0][:CAPTION_LIMIT]
+        await dispatcher.call(
+            chat_id,
+            bot.send_document,
+            chat_id=chat_id,
+            document=text.encode('utf-8'),
+            filename=_document_name(title),
+            caption=caption
+        )
+        return
+
+    for chunk in split_report(text):
+        await dispatcher.send_message(bot, chat_id, chunk)
+
+
+def queue_report(chat_id: int, text: str, title: str = 'bao_cao', key: str = None,
+                 priority: int = PRIORITY_LOW) -> int:
+    """Đưa báo cáo vào hàng đợi gửi tin (dùng cho job chạy nền).
+
+    Chia phần giống `send_report`; `key` chống gửi trùng khi job chạy lại.
+    Trả về số tin đã đưa vào hàng đợi.
+    """
+    outbox = get_outbox()
+    if len(text) > REPORT_DOCUMENT_THRESHOLD:
+        return int(outbox.enqueue(
+            chat_id,
+            method='send_document',
+            priority=priority,
+            key=key,
+            document=text,
+            filename=_document_name(title),
+            caption=text.split("\n", 1)[0][:CAPTION_LIMIT]
+        ))
+
+    return sum(
+        outbox.enqueue(chat_id, chunk, priority=priority, key=f"{key}:{i}" if key else None)
+        for i, chunk in enumerate(split_report(text))
+    )
+
+
+async def reply_report(update: Update, text: str, title: str = 'bao_cao'):
+    """Trả lời lệnh/nút bấm bằng báo cáo, tự chia nhỏ hoặc gửi file khi cần.
+
+    Gửi thẳng (không qua outbox) vì người dùng đang chờ; lỗi gửi không được thử lại.
+    """
+    if not text.strip():
+        text = EMPTY_REPORT
+    bot = update.get_bot()
+    chat_id = update.effective_chat.id
+    query = update.callback_query
+    if query is None:
+        await send_report(bot, chat_id, text, title)
+        return
+
+    # Nút bấm: sửa tin nhắn menu thành phần đầu, phần còn lại gửi tiếp
+    if len(text) > REPORT_DOCUMENT_THRESHOLD:
+        await query.edit_message_text("📎 Báo cáo dài, đã gửi dưới dạng file")
+        await send_report(bot, chat_id, text, title)
+        return
+
+    chunks = split_report(text)
+    await query.edit_message_text(chunks[0])
+    for chunk in chunks[1:]:
+        await get_dispatcher().send_message(bot, chat_id, chunk)
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+from src.models import UserState, Violation
+from src.services.daily_aggregates import DailyAggregates
+from src.services.shift_ledger import ShiftLedger
+from src.services.violation_log import ViolationLog
+from src.utils.config import VN_TIMEZONE
+
+
+def midnight(days_ago: int) -> datetime:
+    today = datetime.now(VN_TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+    return VN_TIMEZONE.normalize(today - timedelta(days=days_ago))
+
+
+def closed_shift(start: datetime, hours: int, break_minutes: int = 0) -> UserState:
+    return UserState(
+        user_name='An',
+        start_time=start,
+        end_time=start + timedelta(hours=hours),
+        breaks={'🚬 Hút thuốc (抽烟)': timedelta(minutes=break_minutes)},
+        break_counts={'🚬 Hút thuốc (抽烟)': 1 if break_minutes else 0},
+    )
+
+
+def violation(when: datetime, user_name: str = 'An') -> Violation:
+    return Violation(user_name, 'overtime_break', when, 'Nghỉ quá giờ')
+
+
+def test_event_updates_are_incremental():
+    aggregates = DailyAggregates()
+    start = midnight(0) + timedelta(hours=8)
+    aggregates.on_shift_start('1', 'An', start)
+    aggregates.on_break_start('1', 've_sinh', start + timedelta(hours=1))
+    aggregates.on_break_end('1', 've_sinh', timedelta(minutes=10))
+    aggregates.on_violation('1', 'An', start + timedelta(hours=2))
+    aggregates.on_shift_end('1', start + timedelta(hours=4))
+
+    totals, = aggregates.day(start.date())
+    assert totals.work_seconds == 4 * 3600 - 600
+    assert totals.break_counts == {'ve_sinh': 1}
+    assert totals.violation_count == 1
+    assert not totals.is_working
+
+
+def test_rebuild_restores_yesterday_and_violations(tmp_path):
+    ledger = ShiftLedger(tmp_path / 'attendance.db')
+    log = ViolationLog(tmp_path / 'attendance.db')
+    yesterday = midnight(1) + timedelta(hours=15)
+    ledger.record_shift('1', closed_shift(yesterday, 10, break_minutes=20))
+    # Vi phạm sau nửa đêm vẫn thuộc ca bắt đầu hôm qua
+    log.append([violation(yesterday + timedelta(hours=2)), violation(yesterday + timedelta(hours=9, minutes=30))])
+    old = midnight(30) + timedelta(hours=8)
+    ledger.record_shift('1', closed_shift(old, 8))
+
+    working = UserState(user_name='An', is_working=True, start_time=midnight(0) + timedelta(hours=8))
+    log.append([violation(working.start_time + timedelta(minutes=5))])
+
+    aggregates = DailyAggregates()
+    aggregates.rebuild({'1': working}, ledger, log)
+
+    totals, = aggregates.day(yesterday.date())
+    assert totals.work_seconds == 10 * 3600 - 20 * 60
+    assert totals.break_counts == {'🚬 Hút thuốc (抽烟)': 1}
+    assert totals.violation_count == 2
+    today, = aggregates.day(working.start_time.date())
+    assert today.is_working and today.violation_count == 1
+    assert aggregates.day(old.date()) == []
+    ledger.close()
+    log.close()
+
+
+def test_prune_keeps_open_shift_day():
+    aggregates = DailyAggregates()
+    old = midnight(10) + timedelta(hours=8)
+    aggregates.on_shift_start('1', 'An', old)
+    aggregates.on_shift_start('2', 'Bình', midnight(9))
+    aggregates.on_shift_end('2', midnight(9) + timedelta(hours=8))
+
+    aggregates.prune(keep_days=7)
+
+    assert [t.user_id for t in aggregates.day(old.date())] == ['1']
+    assert aggregates.day(midnight(9).date()) == []
@@ -0,0 +1,44 @@
+from datetime import date, datetime
+
+from src.services.history_store import (
+    ACTION_BREAK_START,
+    ACTION_END_SHIFT,
+    ACTION_START_SHIFT,
+    HistoryEntry,
+    HistoryStore
+)
+from src.utils.config import VN_TIMEZONE
+
+
+def at(day: int, hour: int, minute: int = 0) -> datetime:
+    return VN_TIMEZONE.localize(datetime(2026, 10, day, hour, minute))
+
+
+def test_append_and_read_day(tmp_path):
+    store = HistoryStore(tmp_path / 'attendance.db')
+    store.append(1001, 'An', ACTION_START_SHIFT, at(17, 8))
+    store.append(1001, 'An', ACTION_BREAK_START, at(17, 10), '🚬 Hút thuốc (抽烟)')
+    store.append(1002, 'Bình', ACTION_START_SHIFT, at(18, 8))
+
+    assert list(store.iter_day(date(2026, 10, 17))) == [
+        HistoryEntry('2026-10-17', 1001, 'An', ACTION_START_SHIFT, '08:00:00', None),
+        HistoryEntry('2026-10-17', 1001, 'An', ACTION_BREAK_START, '10:00:00', '🚬 Hút thuốc (抽烟)'),
+    ]
+    assert store.days() == ['2026-10-17', '2026-10-18']
+    store.close()
+
+
+def test_append_many_writes_every_user(tmp_path):
+    store = HistoryStore(tmp_path / 'attendance.db')
+    store.append_many([
+        ('1001', 'An', ACTION_END_SHIFT, at(18, 1), None),
+        ('1002', 'Bình', ACTION_END_SHIFT, at(18, 1), None),
+    ])
+    store.append_many([])
+
+    entries = list(store.iter_range(date(2026, 10, 18), date(2026, 10, 18)))
+    assert [(e.user_id, e.action, e.timestamp) for e in entries] == [
+        (1001, ACTION_END_SHIFT, '01:00:00'), (1002, ACTION_END_SHIFT, '01:00:00')
+    ]
+    assert [e.user_id for e in store.iter_day(date(2026, 10, 18), user_id=1002)] == [1002]
+    store.close()
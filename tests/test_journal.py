@@ -0,0 +1,62 @@
+import json
+
+from src.models import UserState
+from src.services.journal import EVENT_BREAK_START, EVENT_START_SHIFT, EventJournal
+
+
+def make_journal(tmp_path):
+    return EventJournal(tmp_path / 'journal.jsonl', sync_interval=0, sync_batch=1)
+
+
+def test_replay_returns_records_after_seq(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.append(EVENT_START_SHIFT, '1', UserState(user_name='An'))
+    journal.append_many(EVENT_BREAK_START, [('2', UserState(user_name='Bình')),
+                                            ('3', UserState(user_name='Chi'))])
+
+    records = list(journal.replay(after_seq=1))
+
+    assert [(seq, event, user_id) for seq, event, user_id, _ in records] == [
+        (2, EVENT_BREAK_START, '2'), (3, EVENT_BREAK_START, '3')
+    ]
+    assert records[0][3]['user_name'] == 'Bình'
+    journal.close()
+
+
+def test_replay_skips_torn_last_line(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.append(EVENT_START_SHIFT, '1', UserState(user_name='An'))
+    journal.close()
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"seq": 2, "eve')
+
+    reopened = make_journal(tmp_path)
+    assert reopened.last_seq == 1
+    assert reopened.append(EVENT_START_SHIFT, '2', UserState(user_name='Bình')) == 2
+    assert [seq for seq, _, _, _ in reopened.replay()] == [1, 2]
+    reopened.close()
+
+
+def test_truncate_keeps_tail_lines_unchanged(tmp_path):
+    journal = make_journal(tmp_path)
+    for user_id in ('1', '2', '3'):
+        journal.append(EVENT_START_SHIFT, user_id, UserState(user_name=f"NV {user_id}"))
+    before = journal.path.read_text(encoding='utf-8').splitlines(keepends=True)
+
+    journal.truncate(upto_seq=1)
+
+    after = journal.path.read_text(encoding='utf-8').splitlines(keepends=True)
+    assert after == before[1:]
+    assert all('ts' in json.loads(line) for line in after)
+    assert journal.append(EVENT_START_SHIFT, '4', UserState(user_name='NV 4')) == 4
+    journal.close()
+
+
+def test_truncate_all_empties_file(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.append(EVENT_START_SHIFT, '1', UserState(user_name='An'))
+
+    journal.truncate(upto_seq=journal.last_seq)
+
+    assert list(journal.replay()) == []
+    journal.close()
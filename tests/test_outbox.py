@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import Forbidden, NetworkError
+
+from src.services import outbox as outbox_module
+from src.services.outbox import STATUS_SENT, Outbox
+
+
+class FakeDispatcher:
+    async def call(self, target, method, /, *args, **kwargs):
+        return await method(*args, **kwargs)
+
+
+class FakeBot:
+    """Bot giả: ném lần lượt các lỗi trong `errors`, sau đó gửi thành công"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(outbox_module, 'get_dispatcher', FakeDispatcher)
+    box = Outbox(tmp_path / 'outbox.db', workers=1, max_attempts=3, backoff_base=10, backoff_max=60)
+    yield box
+    box._conn.close()
+
+
+def deliver_next(box: Outbox, bot: FakeBot):
+    box._bot = bot
+    row = box._claim()
+    assert row is not None
+    try:
+        asyncio.run(box._deliver(row))
+    finally:
+        box._busy_chats.discard(row[1])
+
+
+def status_of(box: Outbox, message_id: int):
+    return box._conn.execute(
+        "SELECT status, attempts, next_attempt FROM outbox WHERE id = ?", (message_id,)
+    ).fetchone()
+
+
+def test_duplicate_key_is_ignored(outbox):
+    assert outbox.enqueue(1, "a", key='k')
+    assert not outbox.enqueue(1, "b", key='k')
+    assert outbox.pending_count() == 1
+
+
+def test_transient_error_backs_off_and_blocks_chat(outbox):
+    outbox.enqueue(1, "đầu")
+    outbox.enqueue(1, "sau")
+    outbox.enqueue(2, "chat khác")
+
+    before = time.time()
+    deliver_next(outbox, FakeBot([NetworkError("mất mạng")]))
+
+    status, attempts, next_attempt = status_of(outbox, 1)
+    assert (status, attempts) == ('pending', 1)
+    assert before + 10 <= next_attempt <= time.time() + 10
+    # Tin đang chờ gửi lại chặn tin sau của cùng chat, chat khác vẫn gửi được
+    assert outbox._claim()[1] == 2
+    assert outbox._next_due == next_attempt
+
+
+def test_backoff_doubles_and_is_capped(outbox):
+    outbox.max_attempts = 10
+    outbox.enqueue(1, "a")
+    delays = []
+    for _ in range(4):
+        outbox._conn.execute("UPDATE outbox SET next_attempt = 0")
+        before = time.time()
+        deliver_next(outbox, FakeBot([NetworkError("lỗi")]))
+        delays.append(round(status_of(outbox, 1)[2] - before))
+    assert delays == [10, 20, 40, 60]
+
+
+def test_too_many_attempts_move_to_dead_letter(outbox):
+    outbox.enqueue(1, "a", key='bao_cao')
+    for _ in range(3):
+        outbox._conn.execute("UPDATE outbox SET next_attempt = 0")
+        deliver_next(outbox, FakeBot([NetworkError("lỗi")]))
+
+    assert outbox.pending_count() == 0
+    [letter] = outbox.dead_letters()
+    assert (letter['key'], letter['text'], letter['attempts']) == ('bao_cao', 'a', 3)
+
+    assert outbox.requeue_dead() == 1
+    assert outbox.dead_count() == 0
+    bot = FakeBot()
+    deliver_next(outbox, bot)
+    assert bot.sent == [(1, 'a')]
+
+
+def test_permanent_error_goes_straight_to_dead_letter(outbox):
+    outbox.enqueue(1, "a")
+    deliver_next(outbox, FakeBot([Forbidden("bị chặn")]))
+
+    assert outbox.pending_count() == 0
+    assert outbox.dead_letters()[0]['attempts'] == 1
+
+
+def test_worker_retries_until_sent(outbox):
+    outbox.backoff_base = 0.01
+    bot = FakeBot([NetworkError("lỗi")])
+
+    async def run():
+        outbox.start(bot)
+        outbox.enqueue(1, "a")
+        outbox.enqueue(1, "b")
+        for _ in range(200):
+            if len(bot.sent) == 2:
+                break
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+
+    asyncio.run(run())
+
+    assert bot.sent == [(1, 'a'), (1, 'b')]
+    assert status_of(outbox, 1)[:2] == (STATUS_SENT, 2)
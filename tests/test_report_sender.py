@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.utils import report_sender
+from src.utils.report_sender import EMPTY_REPORT, reply_report, split_report
+
+
+def test_split_report_keeps_blocks_under_limit():
+    blocks = [f"👤 Nhân viên {i}:\n⏱ 1:00:00\n\n" for i in range(10)]
+
+    chunks = split_report("📋 Báo cáo\n\n" + ''.join(blocks), limit=60)
+
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    assert chunks[0].startswith("📋 Báo cáo")
+    assert sum(chunk.count("👤") for chunk in chunks) == 10
+
+
+def test_split_report_cuts_overlong_line():
+    chunks = split_report("x" * 25, limit=10)
+    assert chunks == ["x" * 10, "x" * 10, "x" * 5]
+
+
+def test_split_report_empty():
+    assert split_report("") == []
+    assert split_report(" \n\n \n") == []
+
+
+class FakeQuery:
+    def __init__(self):
+        self.edited = []
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edited.append(text)
+
+
+class FakeDispatcher:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, bot, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+def make_update(query=None):
+    return SimpleNamespace(get_bot=lambda: None, effective_chat=SimpleNamespace(id=42),
+                           callback_query=query)
+
+
+def test_reply_report_empty_callback_edits_placeholder():
+    query = FakeQuery()
+
+    asyncio.run(reply_report(make_update(query), "  \n\n"))
+
+    assert query.edited == [EMPTY_REPORT]
+
+
+def test_reply_report_empty_command_sends_placeholder(monkeypatch):
+    dispatcher = FakeDispatcher()
+    monkeypatch.setattr(report_sender, 'get_dispatcher', lambda: dispatcher)
+
+    asyncio.run(reply_report(make_update(), ""))
+
+    assert dispatcher.sent == [(42, EMPTY_REPORT)]
+
+
+def test_reply_report_callback_sends_remaining_chunks(monkeypatch):
+    dispatcher = FakeDispatcher()
+    monkeypatch.setattr(report_sender, 'get_dispatcher', lambda: dispatcher)
+    query = FakeQuery()
+    text = "Tiêu đề\n\n" + "".join(f"👤 Nhân viên {i}: {'x' * 100}\n\n" for i in range(80))
+
+    asyncio.run(reply_report(make_update(query), text))
+
+    assert len(query.edited) == 1 and dispatcher.sent
+    assert query.edited + [t for _, t in dispatcher.sent] == split_report(text)
@@ -0,0 +1,196 @@
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+from src.models import UserState
+from src.services import snapshot_codec
+from src.services.snapshot_codec import NO_CODE, NO_TIME, StringTable, decode_records, encode_record
+from src.services.state_store import StateStore
+from src.utils.config import VN_TIMEZONE
+
+NOW = VN_TIMEZONE.localize(datetime(2026, 10, 18, 9, 30))
+
+
+def make_state(**kwargs) -> UserState:
+    values = dict(
+        user_name='Nguyễn Văn An',
+        is_working=True,
+        start_time=NOW - timedelta(hours=2),
+        current_break='🚬 Hút thuốc (抽烟)',
+        break_start_time=NOW - timedelta(minutes=3),
+        breaks={'🚬 Hút thuốc (抽烟)': timedelta(minutes=12), '🍚 Ăn cơm (吃饭)': timedelta(minutes=30)},
+        break_counts={'🚬 Hút thuốc (抽烟)': 2, '🍚 Ăn cơm (吃饭)': 1},
+    )
+    values.update(kwargs)
+    return UserState(**values)
+
+
+def assert_same_state(actual: UserState, expected: UserState):
+    assert actual.to_dict() == expected.to_dict()
+
+
+def test_round_trip_variable_slots():
+    strings = StringTable()
+    states = {
+        '1001': make_state(),
+        '1002': make_state(user_name='Bình', is_working=False, current_break=None,
+                           break_start_time=None, breaks={}, break_counts={}),
+        '-1003': make_state(user_name='Chi', end_time=NOW),
+    }
+    buffer = b''.join(encode_record(user_id, state.to_dict(), strings)
+                      for user_id, state in states.items())
+
+    decoded = decode_records(buffer, strings)
+
+    assert set(decoded) == set(states)
+    for user_id, state in states.items():
+        assert_same_state(decoded[user_id], state)
+
+
+def test_record_size_grows_with_break_count():
+    strings = StringTable()
+    empty = encode_record('1', make_state(breaks={}, break_counts={}).to_dict(), strings)
+    two = encode_record('1', make_state().to_dict(), strings)
+    assert len(two) - len(empty) == 2 * 8
+
+
+def test_negative_duration_is_kept():
+    strings = StringTable()
+    state = make_state(breaks={'🚬 Hút thuốc (抽烟)': timedelta(seconds=-90)},
+                       break_counts={'🚬 Hút thuốc (抽烟)': 1})
+
+    decoded = decode_records(encode_record('1', state.to_dict(), strings), strings)
+
+    assert decoded['1'].breaks['🚬 Hút thuốc (抽烟)'] == timedelta(seconds=-90)
+
+
+def test_out_of_range_values_are_clamped():
+    strings = StringTable()
+    data = make_state().to_dict()
+    data['breaks'] = {'x': 2.0 ** 40}
+    data['break_counts'] = {'x': -1}
+
+    decoded = decode_records(encode_record('1', data, strings), strings)
+
+    assert decoded['1'].breaks['x'] == timedelta(seconds=snapshot_codec.SECONDS_MAX)
+    assert decoded['1'].break_counts['x'] == 0
+
+
+def test_store_round_trip(tmp_path):
+    store = StateStore(tmp_path / 'states.db')
+    store.save_many([('1001', make_state()), ('1002', make_state(user_name='Bình'))], journal_seq=7)
+    store.close()
+
+    reopened = StateStore(tmp_path / 'states.db')
+    loaded = reopened.load_all()
+    assert reopened.get_journal_seq() == 7
+    reopened.close()
+
+    assert_same_state(loaded['1001'], make_state())
+    assert loaded['1002'].user_name == 'Bình'
+
+
+def test_migrates_v1_json(tmp_path):
+    path = tmp_path / 'states.db'
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE user_states (hashed_user_id TEXT PRIMARY KEY, user_data TEXT)")
+    conn.execute("INSERT INTO user_states VALUES (?, ?)", ('1001', json.dumps(make_state().to_dict())))
+    conn.execute("INSERT INTO user_states VALUES (?, ?)", ('a1b2c3', '{}'))
+    conn.commit()
+    conn.close()
+
+    store = StateStore(path)
+    loaded = store.load_all()
+    store.close()
+
+    assert list(loaded) == ['1001']
+    assert_same_state(loaded['1001'], make_state())
+
+
+def test_migrates_v2_fixed_records(tmp_path):
+    path = tmp_path / 'states.db'
+    state = make_state()
+    strings = ['Nguyễn Văn An', '🚬 Hút thuốc (抽烟)', '🍚 Ăn cơm (吃饭)']
+    slots = [1, 2, 720, 2, 1, 1800] + [NO_CODE, 0, 0] * 6
+    record = snapshot_codec._RECORD_V2.pack(
+        1001, 1, 0, int(state.start_time.timestamp()), NO_TIME,
+        int(state.break_start_time.timestamp()), 1, *slots
+    )
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE user_states (hashed_user_id TEXT PRIMARY KEY, user_data TEXT)")
+    conn.execute("CREATE TABLE state_meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("CREATE TABLE state_strings (id INTEGER PRIMARY KEY, value TEXT UNIQUE)")
+    conn.executemany("INSERT INTO state_strings VALUES (?, ?)", list(enumerate(strings)))
+    conn.execute("INSERT INTO state_meta VALUES ('format_version', '2')")
+    conn.execute("INSERT INTO user_states VALUES (?, ?)", ('1001', record))
+    conn.commit()
+    conn.close()
+
+    store = StateStore(path)
+    loaded = store.load_all()
+    store.close()
+
+    assert_same_state(loaded['1001'], state)
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT value FROM state_meta WHERE key = 'format_version'").fetchone() == ('3',)
+    assert 'WITHOUT ROWID' in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'user_states'").fetchone()[0]
+    conn.close()
+
+
+class FailingConnection:
+    """Kết nối giả: lệnh ghi user_states lỗi để transaction bị rollback"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def executemany(self, sql, rows):
+        if 'user_states' in sql:
+            raise sqlite3.OperationalError("disk I/O error")
+        return self._conn.executemany(sql, rows)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def test_strings_of_rolled_back_save_are_written_later(tmp_path):
+    path = tmp_path / 'states.db'
+    store = StateStore(path)
+    real_conn = store._conn
+    store._conn = FailingConnection(real_conn)
+    try:
+        store.save('1001', make_state())
+    except sqlite3.OperationalError:
+        pass
+    store._conn = real_conn
+
+    # Lần lưu sau dùng lại các mã đã cấp, nên chuỗi của chúng phải được ghi lúc này
+    other = make_state(user_name='Bình', current_break='🍚 Ăn cơm (吃饭)')
+    store.save('1002', other)
+    store.close()
+
+    reopened = StateStore(path)
+    loaded = reopened.load_all()
+    reopened.close()
+    assert list(loaded) == ['1002']
+    assert_same_state(loaded['1002'], other)
+
+
+def test_corrupt_record_is_skipped(tmp_path):
+    path = tmp_path / 'states.db'
+    store = StateStore(path)
+    store.save_many([('1001', make_state()), ('1002', make_state(user_name='Bình'))])
+    store._conn.execute("INSERT INTO user_states VALUES ('1003', ?)", (b'\x01\x02\x03',))
+    store._conn.commit()
+
+    loaded = store.load_all()
+    store.close()
+
+    assert sorted(loaded) == ['1001', '1002']
+    assert_same_state(loaded['1001'], make_state())
@@ -0,0 +1,70 @@
+from src.services.update_guard import UpdateGuard
+
+
+def test_new_update_is_not_seen():
+    guard = UpdateGuard(max_size=10, window=2)
+    assert guard.seen(1) is None
+    assert guard.duplicates == 0
+
+
+def test_duplicate_update_replays_recorded_replies():
+    guard = UpdateGuard(max_size=10, window=2)
+    guard.begin(1)
+    guard.record(1, "✅ Bắt đầu ca", parse_mode='HTML')
+
+    assert guard.seen(1) == [("✅ Bắt đầu ca", {'parse_mode': 'HTML'})]
+    assert guard.duplicates == 1
+
+
+def test_record_ignores_unknown_update():
+    guard = UpdateGuard(max_size=10, window=2)
+    guard.record(5, "x")
+    assert guard.seen(5) is None
+
+
+def test_cache_is_bounded_lru():
+    guard = UpdateGuard(max_size=2, window=2)
+    for update_id in (1, 2, 3):
+        guard.begin(update_id)
+
+    assert guard.seen(1) is None
+    assert guard.seen(2) == []
+    assert guard.seen(3) == []
+
+
+def test_same_action_within_window_is_debounced():
+    guard = UpdateGuard(max_size=10, window=2)
+    guard.begin(1)
+    assert guard.debounce(1, 'u1', 'start', at=100.0) is None
+    guard.record(1, "✅ Bắt đầu ca")
+
+    guard.begin(2)
+    assert guard.debounce(2, 'u1', 'start', at=101.5) == [("✅ Bắt đầu ca", {})]
+    assert guard.debounced == 1
+    # Update bị debounce cũng được coi là đã xử lý nếu Telegram gửi lại
+    assert guard.seen(2) == [("✅ Bắt đầu ca", {})]
+
+
+def test_debounce_ignores_other_actions_users_and_old_taps():
+    guard = UpdateGuard(max_size=10, window=2)
+    guard.begin(1)
+    assert guard.debounce(1, 'u1', 'start', at=100.0) is None
+
+    guard.begin(2)
+    assert guard.debounce(2, 'u1', 'break', at=100.5) is None
+    guard.begin(3)
+    assert guard.debounce(3, 'u2', 'break', at=100.5) is None
+    guard.begin(4)
+    assert guard.debounce(4, 'u1', 'break', at=103.0) is None
+    assert guard.debounced == 0
+
+
+def test_clear_forgets_everything():
+    guard = UpdateGuard(max_size=10, window=2)
+    guard.begin(1)
+    guard.debounce(1, 'u1', 'start', at=100.0)
+    guard.clear()
+
+    assert guard.seen(1) is None
+    guard.begin(2)
+    assert guard.debounce(2, 'u1', 'start', at=100.5) is None
@@ -0,0 +1,121 @@
+import asyncio
+import sqlite3
+
+from telegram import Update
+
+from src.services.catch_up import UpdateOffset
+from src.services.update_processor import UserOrderedUpdateProcessor
+
+
+def saved_offset(path):
+    conn = sqlite3.connect(path)
+    row = conn.execute("SELECT update_id FROM update_offset WHERE id = 0").fetchone()
+    conn.close()
+    return row[0] if row else None
+
+
+def test_out_of_order_completion_waits_for_lower_ids(tmp_path):
+    offset = UpdateOffset(tmp_path / 'offset.db')
+    for update_id in (10, 11, 12):
+        offset.begin(update_id)
+
+    offset.complete(12)
+    assert offset.last is None
+    offset.complete(10)
+    assert offset.last == 10
+    offset.complete(11)
+    assert offset.last == 12
+
+
+def test_gaps_in_update_ids_do_not_block(tmp_path):
+    offset = UpdateOffset(tmp_path / 'offset.db')
+    offset.begin(5)
+    offset.begin(9)
+
+    offset.complete(9)
+    offset.complete(5)
+
+    assert offset.last == 9
+
+
+def test_completing_without_begin_and_stale_ids(tmp_path):
+    offset = UpdateOffset(tmp_path / 'offset.db')
+    offset.begin(3)
+    # Update bị bỏ qua khi xử lý bù không qua begin
+    offset.complete(4)
+    assert offset.last is None
+    offset.complete(3)
+    assert offset.last == 4
+
+    offset.begin(2)
+    offset.complete(2)
+    assert offset.last == 4
+    assert not offset._in_flight
+
+
+def test_flush_writes_only_when_changed(tmp_path):
+    path = tmp_path / 'offset.db'
+    offset = UpdateOffset(path)
+    offset.begin(1)
+    offset.complete(1)
+
+    assert saved_offset(path) is None
+    assert offset.flush()
+    assert not offset.flush()
+    assert saved_offset(path) == 1
+
+    offset.complete(2)
+    offset.flush()
+    assert UpdateOffset(path).last == 2
+
+
+def make_update(update_id: int, user_id: int) -> Update:
+    return Update.de_json({'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0, 'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'NV'}, 'text': 'x',
+    }}, None)
+
+
+def test_processor_tracks_updates_finishing_out_of_order(tmp_path):
+    offset = UpdateOffset(tmp_path / 'offset.db')
+    processor = UserOrderedUpdateProcessor(concurrent_updates=4, max_pending=8, tracker=offset)
+    release_first = asyncio.Event()
+    seen = []
+
+    async def handler(update_id, wait=None):
+        if wait is not None:
+            await wait.wait()
+        seen.append((update_id, offset.last))
+
+    async def run():
+        first = asyncio.create_task(processor.process_update(make_update(1, 100), handler(1, release_first)))
+        second = asyncio.create_task(processor.process_update(make_update(2, 200), handler(2)))
+        await second
+        # Update 2 xong trước nhưng update 1 còn chạy nên offset chưa được tiến
+        assert offset.last is None
+        release_first.set()
+        await first
+
+    asyncio.run(run())
+
+    assert seen == [(2, None), (1, None)]
+    assert offset.last == 2
+    assert not offset._in_flight
+
+
+def test_processor_completes_failed_updates(tmp_path):
+    offset = UpdateOffset(tmp_path / 'offset.db')
+    processor = UserOrderedUpdateProcessor(concurrent_updates=2, max_pending=2, tracker=offset)
+
+    async def failing():
+        raise RuntimeError("lỗi handler")
+
+    async def run():
+        try:
+            await processor.process_update(make_update(7, 100), failing())
+        except RuntimeError:
+            pass
+
+    asyncio.run(run())
+
+    assert offset.last == 7
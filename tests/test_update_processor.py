@@ -0,0 +1,114 @@
+import asyncio
+
+from telegram import Update
+
+from src.services.update_processor import KEY_GLOBAL, UserOrderedUpdateProcessor, update_key
+
+
+def make_update(update_id: int, user_id: int, text: str = 'x') -> Update:
+    return Update.de_json({'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0, 'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'NV'}, 'text': text,
+    }}, None)
+
+
+def test_update_key():
+    assert update_key(make_update(1, 100)) == 100
+    assert update_key(make_update(2, 100, '/allend')) == KEY_GLOBAL
+    assert update_key(make_update(3, 100, '/ae@attendance_bot now')) == KEY_GLOBAL
+    assert update_key(make_update(4, 100, '/help')) == 100
+    assert update_key(object()) is None
+
+
+class Recorder:
+    """Ghi lại thứ tự bắt đầu/kết thúc của các handler giả"""
+
+    def __init__(self):
+        self.events = []
+        self.running = 0
+        self.peak = 0
+
+    async def handler(self, name: str, delay: float = 0.01):
+        self.events.append(('start', name))
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(delay)
+        self.running -= 1
+        self.events.append(('end', name))
+
+    def order(self, kind: str):
+        return [name for event, name in self.events if event == kind]
+
+
+async def process_all(processor, items):
+    await asyncio.gather(*(processor.process_update(update, coroutine) for update, coroutine in items))
+
+
+def test_same_user_runs_in_order_other_users_run_concurrently():
+    processor = UserOrderedUpdateProcessor(concurrent_updates=8, max_pending=16)
+    recorder = Recorder()
+
+    asyncio.run(process_all(processor, [
+        (make_update(1, 100), recorder.handler('a1', 0.03)),
+        (make_update(2, 100), recorder.handler('a2', 0.0)),
+        (make_update(3, 200), recorder.handler('b1', 0.0)),
+    ]))
+
+    ends = recorder.order('end')
+    assert ends.index('a1') < ends.index('a2')
+    # b1 không phải chờ a1 của user khác
+    assert ends.index('b1') < ends.index('a1')
+    assert not processor._locks
+
+
+def test_concurrency_is_limited():
+    processor = UserOrderedUpdateProcessor(concurrent_updates=2, max_pending=16)
+    recorder = Recorder()
+
+    asyncio.run(process_all(processor, [
+        (make_update(i, 100 + i), recorder.handler(f"u{i}")) for i in range(6)
+    ]))
+
+    assert recorder.peak == 2
+
+
+def test_global_command_runs_alone_between_earlier_and_later_updates():
+    processor = UserOrderedUpdateProcessor(concurrent_updates=8, max_pending=16)
+    recorder = Recorder()
+
+    asyncio.run(process_all(processor, [
+        (make_update(1, 100), recorder.handler('before1', 0.02)),
+        (make_update(2, 200), recorder.handler('before2', 0.01)),
+        (make_update(3, 999, '/allend'), recorder.handler('global', 0.01)),
+        (make_update(4, 300), recorder.handler('after', 0.0)),
+    ]))
+
+    events = recorder.events
+    global_start = events.index(('start', 'global'))
+    global_end = events.index(('end', 'global'))
+    # Không handler nào khác chạy trong lúc thao tác toàn cục chạy
+    assert global_end == global_start + 1
+    assert events.index(('end', 'before1')) < global_start
+    assert events.index(('end', 'before2')) < global_start
+    assert events.index(('start', 'after')) > global_end
+
+
+def test_failed_update_releases_user_lock():
+    processor = UserOrderedUpdateProcessor(concurrent_updates=2, max_pending=4)
+    recorder = Recorder()
+
+    async def failing():
+        raise RuntimeError("lỗi handler")
+
+    async def run():
+        results = await asyncio.gather(
+            processor.process_update(make_update(1, 100), failing()),
+            processor.process_update(make_update(2, 100), recorder.handler('next')),
+            return_exceptions=True
+        )
+        assert isinstance(results[0], RuntimeError)
+
+    asyncio.run(run())
+
+    assert recorder.order('end') == ['next']
+    assert not processor._locks
@@ -0,0 +1,54 @@
+from src.services import violation_digest
+from src.services.violation_digest import ViolationDigest
+
+
+def capture_reports(monkeypatch):
+    sent = []
+    monkeypatch.setattr(violation_digest, 'ADMIN_ID', [7])
+    monkeypatch.setattr(violation_digest, 'queue_report',
+                        lambda chat_id, text, title, key, priority: sent.append((chat_id, key, text)))
+    return sent
+
+
+def test_windows_opened_in_same_instant_get_distinct_keys(monkeypatch):
+    sent = capture_reports(monkeypatch)
+    digest = ViolationDigest(window=0)
+
+    digest.add('An', 'overtime_break', 'Nghỉ quá 3 phút', 'violation:1:overtime_break:100')
+    digest.add('Bình', 'overtime_break', 'Nghỉ quá 4 phút', 'violation:2:overtime_break:100')
+
+    assert [key for _, key, _ in sent] == [
+        'digest:violation:1:overtime_break:100:7',
+        'digest:violation:2:overtime_break:100:7',
+    ]
+
+
+class FakeJob:
+    def schedule_removal(self):
+        pass
+
+
+class FakeJobQueue:
+    def __init__(self):
+        self.scheduled = 0
+
+    def run_once(self, callback, when, name=None):
+        self.scheduled += 1
+        return FakeJob()
+
+
+def test_window_is_keyed_by_first_violation(monkeypatch):
+    sent = capture_reports(monkeypatch)
+    digest = ViolationDigest(window=60)
+    job_queue = FakeJobQueue()
+    digest.attach(job_queue)
+
+    digest.add('An', 'overtime_break', 'Nghỉ quá 3 phút', 'violation:1:overtime_break:100')
+    digest.add('Bình', 'exceed_break_limit', 'Nghỉ 4 lần', 'violation:2:exceed_break_limit:130')
+
+    assert job_queue.scheduled == 1
+    assert digest.flush() == 2
+    [(_, key, text)] = sent
+    assert key == 'digest:violation:1:overtime_break:100:7'
+    assert '2 vi phạm, 2 nhân viên' in text
+    assert digest.flush() == 0
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from src.models import Violation
+from src.services.violation_manager import ViolationManager
+from src.utils.config import VN_TIMEZONE
+
+TODAY = datetime.now(VN_TIMEZONE).replace(hour=10, minute=0, second=0, microsecond=0)
+
+
+def make_violation(user_name: str, at: datetime, violation_type: str = 'overtime_break') -> Violation:
+    return Violation(user_name=user_name, violation_type=violation_type, timestamp=at,
+                     details=f"{user_name} {at.strftime('%d/%m %H:%M')}")
+
+
+def test_out_of_order_adds_are_kept_sorted():
+    manager = ViolationManager()
+    times = [TODAY + timedelta(minutes=m) for m in (30, 10, 20)]
+    manager.add_violations([make_violation('An', t) for t in times])
+    manager.add_violations([make_violation('Bình', TODAY + timedelta(minutes=15))])
+
+    assert [v.timestamp for v in manager.violations['An']] == sorted(times)
+    assert [v.user_name for v in manager.iter_violations()] == ['An', 'Bình', 'An', 'An']
+
+
+def test_range_queries_use_half_open_interval():
+    manager = ViolationManager()
+    manager.add_violations([make_violation('An', TODAY + timedelta(minutes=m)) for m in (0, 10, 20)])
+
+    found = manager.iter_violations(TODAY + timedelta(minutes=10), TODAY + timedelta(minutes=20))
+    assert [v.timestamp for v in found] == [TODAY + timedelta(minutes=10)]
+
+    report = manager.generate_violation_report(TODAY + timedelta(minutes=5), user_name='An')
+    assert report.count('⚠️') == 2
+    assert manager.get_user_violations_count('An', TODAY + timedelta(minutes=5))['overtime_break'] == 2
+
+
+def test_prune_drops_old_days():
+    manager = ViolationManager(memory_days=2)
+    old = TODAY - timedelta(days=5)
+    manager.add_violations([make_violation('An', old), make_violation('An', TODAY),
+                            make_violation('Bình', old)])
+
+    manager.prune()
+
+    assert [v.timestamp for v in manager.iter_violations()] == [TODAY]
+    assert 'Bình' not in manager.violations
+    assert manager.generate_violation_report(old, user_name='An').count('⚠️') == 1
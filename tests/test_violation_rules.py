@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from services.time_violation_checker import TimeViolationChecker
+from src.services.violation_rules import SHIFT_CHECKS_PUNCTUALITY, ViolationRules
+
+BREAK_KEYS = {'🚬 Hút thuốc (抽烟)': 'hut_thuoc'}
+DAY = datetime(2026, 10, 18)
+
+
+def make_rules(**kwargs) -> ViolationRules:
+    return ViolationRules(break_keys=BREAK_KEYS, durations={'🚬 Hút thuốc (抽烟)': 10},
+                          frequencies={'🚬 Hút thuốc (抽烟)': 3},
+                          work_start='08:00', work_end='17:00', **kwargs)
+
+
+def test_default_rules_report_early_start_and_late_end():
+    rules = make_rules()
+
+    assert [v.violation_type for v in rules.shift_started('An', DAY.replace(hour=7, minute=30))] == ['early_start']
+    assert rules.shift_started('An', DAY.replace(hour=8, minute=20)) == []
+    assert [v.violation_type for v in rules.shift_ended('An', DAY.replace(hour=18))] == ['late_end']
+    assert rules.shift_ended('An', DAY.replace(hour=16)) == []
+
+
+def test_punctuality_rules_report_late_arrival_and_early_departure():
+    rules = make_rules(shift_checks=SHIFT_CHECKS_PUNCTUALITY)
+
+    late = rules.shift_started('An', DAY.replace(hour=8, minute=25))
+    early = rules.shift_ended('An', DAY.replace(hour=16, minute=45))
+
+    assert [(v.violation_type, v.duration) for v in late] == [('late_arrival', timedelta(minutes=25))]
+    assert [(v.violation_type, v.duration) for v in early] == [('early_departure', timedelta(minutes=15))]
+    assert rules.shift_started('An', DAY.replace(hour=7, minute=30)) == []
+    assert rules.shift_ended('An', DAY.replace(hour=18)) == []
+
+
+def test_checker_keeps_baseline_checks_and_message():
+    checker = TimeViolationChecker(bot=object())
+    checker.rules = make_rules(shift_checks=SHIFT_CHECKS_PUNCTUALITY)
+
+    violations = asyncio.run(checker.check_violation(42, 'start_shift', DAY.replace(hour=8, minute=10)))
+
+    assert [v.violation_type for v in violations] == ['late_arrival']
+    message = checker._format_violation_message(42, violations[0])
+    assert "VI PHẠM: ĐI TRỄ" in message
+    assert "Giờ quy định: 08:00" in message
+    assert "Giờ thực tế: 08:10" in message
+    assert "<b>10</b> phút" in message
+
+
+def test_checker_break_overtime():
+    checker = TimeViolationChecker(bot=object())
+    checker.rules = make_rules(shift_checks=SHIFT_CHECKS_PUNCTUALITY)
+
+    violations = asyncio.run(checker.check_violation(
+        42, 'hut_thuoc', DAY.replace(hour=10), user_name='An', duration=timedelta(minutes=15)
+    ))
+
+    assert [v.violation_type for v in violations] == ['overtime_break']
+    assert "NGHỈ QUÁ GIỜ" in checker._format_violation_message(42, violations[0])
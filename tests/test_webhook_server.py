@@ -0,0 +1,112 @@
+import asyncio
+import json
+from http import HTTPStatus
+from types import SimpleNamespace
+
+import pytest
+
+from src.services.webhook_server import HttpError, HttpRequest, WebhookServer, read_request
+
+SECRET = 'bi-mat'
+
+
+def parse(raw: bytes, **kwargs):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await read_request(reader, **kwargs)
+    return asyncio.run(run())
+
+
+def test_read_request_with_body():
+    request = parse(b"POST /hook?x=1 HTTP/1.1\r\nHost: a\r\nContent-Length: 2\r\n"
+                    b"X-Telegram-Bot-Api-Secret-Token: abc\r\n\r\n{}")
+
+    assert request.method == 'POST'
+    assert request.path == '/hook'
+    assert request.headers['x-telegram-bot-api-secret-token'] == 'abc'
+    assert request.body == b'{}'
+    assert request.keep_alive
+
+
+def test_read_request_connection_handling():
+    assert not parse(b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n").keep_alive
+    assert not parse(b"GET / HTTP/1.0\r\n\r\n").keep_alive
+    assert parse(b"GET / HTTP/1.0\r\nConnection: keep-alive\r\n\r\n").keep_alive
+
+
+def test_read_request_returns_none_on_eof():
+    assert parse(b"") is None
+
+
+@pytest.mark.parametrize('raw, status', [
+    (b"GARBAGE\r\n\r\n", HTTPStatus.BAD_REQUEST),
+    (b"POST / HTTP/1.1\r\nContent-Length: abc\r\n\r\n", HTTPStatus.BAD_REQUEST),
+    (b"POST / HTTP/1.1\r\nContent-Length: -1\r\n\r\n", HTTPStatus.BAD_REQUEST),
+    (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n", HTTPStatus.LENGTH_REQUIRED),
+    (b"POST / HTTP/1.1\r\nContent-Length: 11\r\n\r\n", HTTPStatus.REQUEST_ENTITY_TOO_LARGE),
+    (b"GET / HTTP/1.1\r\n" + b"X-A: 1\r\n" * 101 + b"\r\n", HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE),
+])
+def test_read_request_rejects_bad_requests(raw, status):
+    with pytest.raises(HttpError) as error:
+        parse(raw, max_body=10)
+    assert error.value.status == status
+
+
+def test_read_request_truncated_body():
+    with pytest.raises(asyncio.IncompleteReadError):
+        parse(b"POST / HTTP/1.1\r\nContent-Length: 10\r\n\r\n{}")
+
+
+def make_server(queue_size: int = 2) -> WebhookServer:
+    application = SimpleNamespace(bot=None)
+    return WebhookServer(application, path='hook', url='https://example.com',
+                         secret_token=SECRET, queue_size=queue_size)
+
+
+def post(body, token: str = SECRET, path: str = '/hook', method: str = 'POST') -> HttpRequest:
+    headers = {'x-telegram-bot-api-secret-token': token} if token is not None else {}
+    data = json.dumps(body).encode() if isinstance(body, dict) else body
+    return HttpRequest(method, path, headers, data, True)
+
+
+def update_body(update_id: int) -> dict:
+    return {'update_id': update_id, 'message': {
+        'message_id': 1, 'date': 0, 'chat': {'id': 1, 'type': 'private'}, 'text': 'x',
+    }}
+
+
+def test_accept_queues_valid_update():
+    server = make_server()
+
+    assert server._accept(post(update_body(5))) == (HTTPStatus.OK, None)
+    assert server.queue.get_nowait().update_id == 5
+    assert server.received == 1
+    assert server.url == 'https://example.com/hook'
+
+
+def test_accept_checks_path_method_and_secret():
+    server = make_server()
+
+    assert server._accept(post(update_body(1), path='/other'))[0] == HTTPStatus.NOT_FOUND
+    assert server._accept(post(update_body(1), method='GET')) == (HTTPStatus.METHOD_NOT_ALLOWED, {'Allow': 'POST'})
+    assert server._accept(post(update_body(1), token='sai'))[0] == HTTPStatus.FORBIDDEN
+    assert server._accept(post(update_body(1), token=None))[0] == HTTPStatus.FORBIDDEN
+    assert server.rejected == 2
+    assert server.queue.empty()
+
+
+def test_accept_rejects_invalid_json():
+    server = make_server()
+    assert server._accept(post(b'{not json'))[0] == HTTPStatus.BAD_REQUEST
+    assert server.queue.empty()
+
+
+def test_accept_full_queue_asks_telegram_to_retry():
+    server = make_server(queue_size=1)
+    server._accept(post(update_body(1)))
+
+    assert server._accept(post(update_body(2))) == (HTTPStatus.SERVICE_UNAVAILABLE, {'Retry-After': '1'})
+    assert server.overflowed == 1
+    assert server.queue.qsize() == 1